@@ -1,15 +1,35 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import time
 from datetime import datetime
 
 
+# Violation.VIOLATION_TYPES value recorded for each distraction label
+VIOLATION_TYPE_BY_LABEL = {
+    "Looking Away": "Distraction",
+    "Looking Up/Down": "Distraction",
+    "Head Movement": "Distraction",
+    "Eyes Closed": "Distraction",
+}
+
+
 class DistractionDetector:
     """
     Enhanced distraction detection using iris tracking and head pose.
+
+    An optional evidence_recorder (see EvidenceRecorderModule) buffers recent frames
+    and is flushed to disk whenever a distraction is counted. violation_handler, if
+    given, is called with the Violation type of the distraction (see
+    VIOLATION_TYPE_BY_LABEL) and may return the ID of the stored Violation so the
+    evidence can be linked to it. An optional telemetry_writer
+    (see TelemetryModule) receives the metrics computed for every frame, and an
+    optional secondary_stage (see SecondaryDetectorModule) is offered every frame
+    under stream_id and decides itself which ones to run object detection on.
     """
     
-    def __init__(self):
+    def __init__(self, evidence_recorder=None, violation_handler=None, telemetry_writer=None,
+                 secondary_stage=None, stream_id=None):
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
             max_num_faces=1,
@@ -33,6 +53,12 @@ class DistractionDetector:
         self.last_distraction_time = None
         self.consecutive_distractions = 0
         
+        self.evidence_recorder = evidence_recorder
+        self.violation_handler = violation_handler
+        self.telemetry_writer = telemetry_writer
+        self.secondary_stage = secondary_stage
+        self.stream_id = stream_id
+        
     def calculate_eye_aspect_ratio(self, eye_landmarks, frame_width, frame_height):
         """Calculate the eye aspect ratio to detect blinks"""
         points = np.array([[int(point.x * frame_width), int(point.y * frame_height)] for point in eye_landmarks])
@@ -51,6 +77,12 @@ class DistractionDetector:
         frame_center_x = frame_width / 2
         frame_center_y = frame_height / 2
         
+        # Buffer the raw frame before any annotations are drawn on it
+        if self.evidence_recorder is not None:
+            self.evidence_recorder.add_frame(frame)
+        if self.secondary_stage is not None:
+            self.secondary_stage.offer(self.stream_id, frame)
+        
         # Convert to RGB for MediaPipe
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         results = self.face_mesh.process(rgb_frame)
@@ -131,10 +163,22 @@ class DistractionDetector:
                 if self.consecutive_distractions >= 3:  # Three consecutive detections
                     self.distraction_count += 1
                     self.consecutive_distractions = 0
+                    self.record_violation(distraction_type)
             else:
                 self.consecutive_distractions = 0
                 self.last_distraction_time = None
             
+            if self.telemetry_writer is not None:
+                self.telemetry_writer.append(
+                    current_time.timestamp(), distraction_type, is_distracted,
+                    left_eye_offset=left_eye_offset,
+                    right_eye_offset=right_eye_offset,
+                    vertical_offset=vertical_offset,
+                    head_offset=head_offset,
+                    left_ear=left_eye_ratio,
+                    right_ear=right_eye_ratio
+                )
+            
             # Display information on frame
             status_color = (0, 0, 255) if is_distracted else (0, 255, 0)
             cv2.putText(frame, f"Status: {distraction_type}", (10, 30),
@@ -145,9 +189,19 @@ class DistractionDetector:
             # Display eye tracking info
             cv2.putText(frame, f"Left offset: {int(left_eye_offset)}, Right offset: {int(right_eye_offset)}",
                        (10, frame_height - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        elif self.telemetry_writer is not None:
+            self.telemetry_writer.append(time.time(), "No Face")
         
         return frame, is_distracted, distraction_type, self.distraction_count
         
+    def record_violation(self, distraction_type):
+        """Report a counted distraction and save the pre-roll evidence for it"""
+        violation_id = None
+        if self.violation_handler is not None:
+            violation_id = self.violation_handler(VIOLATION_TYPE_BY_LABEL[distraction_type])
+        if self.evidence_recorder is not None:
+            self.evidence_recorder.trigger(violation_id=violation_id, label=distraction_type)
+        
     def reset_distraction_count(self):
         self.distraction_count = 0
         self.consecutive_distractions = 0
@@ -0,0 +1,182 @@
+"""
+Pre-roll evidence recorder for proctoring streams.
+
+Keeps the last few seconds of every stream in a small in-memory ring buffer of
+downscaled frames. When a violation is flagged the buffered frames are encoded
+into a JPEG strip on a background thread and appended to segment files on disk,
+so the capture loop never waits on encoding or disk I/O.
+
+On-disk layout per stream::
+
+    <storage_dir>/<stream_id>/segment_00001.seg   append-only clip records
+    <storage_dir>/<stream_id>/index.jsonl         one line per clip
+
+Each clip record is a RECORD_HEADER followed by ``frame_count`` frames, each a
+FRAME_HEADER followed by the JPEG bytes. Index lines hold the violation ID, the
+segment name and the byte offset/length of the record.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+RECORD_MAGIC = b'SFPE'
+RECORD_HEADER = struct.Struct('<4sIdd')  # magic, frame count, first/last timestamp
+FRAME_HEADER = struct.Struct('<dI')  # timestamp, JPEG length
+INDEX_FILENAME = 'index.jsonl'
+
+# A single writer thread serialises all appends, so segment files and indexes
+# never see interleaved writes even when many streams trigger at once.
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='evidence-writer')
+        return _writer
+
+
+class EvidenceRecorder:
+    """
+    Per-stream ring buffer of recent frames that can be flushed to disk as evidence.
+    """
+
+    def __init__(self, storage_dir, stream_id, seconds=10, fps=5, scale=0.5,
+                 jpeg_quality=70, segment_max_bytes=64 * 1024 * 1024):
+        self.stream_dir = os.path.join(str(storage_dir), str(stream_id))
+        self.stream_id = str(stream_id)
+        self.scale = scale
+        self.jpeg_quality = jpeg_quality
+        self.segment_max_bytes = segment_max_bytes
+        self.frame_interval = 1.0 / fps
+
+        self.frames = deque(maxlen=max(1, int(seconds * fps)))
+        self._last_capture_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_frame(self, frame, timestamp=None):
+        """Buffer a downscaled copy of the frame, sampled at the configured fps"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp - self._last_capture_time < self.frame_interval:
+            return False
+
+        if self.scale != 1:
+            small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = frame.copy()
+
+        with self._lock:
+            self.frames.append((timestamp, small))
+            self._last_capture_time = timestamp
+        return True
+
+    def trigger(self, violation_id=None, label=''):
+        """
+        Snapshot the buffer and write it to disk in the background.
+        Returns a Future resolving to the index entry, or None if nothing is buffered.
+        """
+        with self._lock:
+            frames = list(self.frames)
+        if not frames:
+            return None
+        return _get_writer().submit(self._write_clip, frames, violation_id, label)
+
+    def _write_clip(self, frames, violation_id, label):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        chunks = []
+        for timestamp, image in frames:
+            ok, buffer = cv2.imencode('.jpg', image, params)
+            if not ok:
+                continue
+            data = buffer.tobytes()
+            chunks.append(FRAME_HEADER.pack(timestamp, len(data)))
+            chunks.append(data)
+
+        frame_count = len(chunks) // 2
+        if not frame_count:
+            return None
+
+        record = RECORD_HEADER.pack(RECORD_MAGIC, frame_count, frames[0][0], frames[-1][0]) + b''.join(chunks)
+
+        os.makedirs(self.stream_dir, exist_ok=True)
+        segment = self._current_segment(len(record))
+        segment_path = os.path.join(self.stream_dir, segment)
+        with open(segment_path, 'ab') as f:
+            offset = f.tell()
+            f.write(record)
+
+        entry = {
+            'violation_id': violation_id,
+            'label': label,
+            'segment': segment,
+            'offset': offset,
+            'length': len(record),
+            'frame_count': frame_count,
+            'start': frames[0][0],
+            'end': frames[-1][0],
+        }
+        with open(os.path.join(self.stream_dir, INDEX_FILENAME), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        return entry
+
+    def _current_segment(self, record_size):
+        """Return the segment to append to, rolling over once it grows too large"""
+        segments = sorted(name for name in os.listdir(self.stream_dir) if name.endswith('.seg'))
+        if segments:
+            latest = segments[-1]
+            size = os.path.getsize(os.path.join(self.stream_dir, latest))
+            if size + record_size <= self.segment_max_bytes:
+                return latest
+            number = int(latest[len('segment_'):-len('.seg')]) + 1
+        else:
+            number = 1
+        return f"segment_{number:05d}.seg"
+
+
+def read_evidence_index(storage_dir, stream_id, violation_id=None):
+    """List the index entries of a stream, optionally only those of one violation"""
+    index_path = os.path.join(str(storage_dir), str(stream_id), INDEX_FILENAME)
+    if not os.path.exists(index_path):
+        return []
+
+    entries = []
+    with open(index_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if violation_id is None or entry.get('violation_id') == violation_id:
+                entries.append(entry)
+    return entries
+
+
+def load_evidence_frames(storage_dir, stream_id, entry):
+    """Read a clip back as a list of (timestamp, JPEG bytes) tuples"""
+    segment_path = os.path.join(str(storage_dir), str(stream_id), entry['segment'])
+    with open(segment_path, 'rb') as f:
+        f.seek(entry['offset'])
+        record = f.read(entry['length'])
+
+    magic, frame_count, _, _ = RECORD_HEADER.unpack_from(record, 0)
+    if magic != RECORD_MAGIC:
+        raise ValueError(f"Corrupt evidence record in {entry['segment']} at offset {entry['offset']}")
+
+    frames = []
+    position = RECORD_HEADER.size
+    for _ in range(frame_count):
+        timestamp, length = FRAME_HEADER.unpack_from(record, position)
+        position += FRAME_HEADER.size
+        frames.append((timestamp, record[position:position + length]))
+        position += length
+    return frames
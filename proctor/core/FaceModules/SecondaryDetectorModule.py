@@ -0,0 +1,211 @@
+"""
+Low-frequency secondary detection stage (phones, books, extra people...).
+
+Object detectors such as YOLO are far too slow to run on every frame of every
+examinee on a CPU. This stage runs a pluggable SecondaryDetector on a sampled
+subset of frames instead: the hot path only calls SecondaryDetectionStage.offer(),
+which is a cheap scheduling check, and the chosen frames are processed on
+background worker threads.
+
+The SecondaryDetectionScheduler enforces a global CPU budget (detector seconds
+per wall-clock second across all streams) and shares it fairly: every active
+stream gets the same interval, stretched beyond min_interval only when the
+budget cannot cover all streams at that rate.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SecondaryDetector:
+    """
+    Interface for secondary detectors.
+    detect() receives a BGR frame and returns a list of dicts with
+    'label', 'confidence' and 'box' (x, y, width, height) keys.
+    """
+
+    def detect(self, frame):
+        raise NotImplementedError
+
+
+class DnnObjectDetector(SecondaryDetector):
+    """
+    Object detector backed by any model cv2.dnn can load (ONNX, Darknet, Caffe...).
+    Understands the YOLOv5 (N x 5+C) and YOLOv8 (4+C x N) output layouts.
+    """
+
+    def __init__(self, model_path, labels=None, input_size=(640, 640), confidence_threshold=0.4,
+                 nms_threshold=0.45, watched_labels=None):
+        self.net = cv2.dnn.readNet(str(model_path))
+        self.labels = labels or []
+        self.input_size = input_size
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.watched_labels = set(watched_labels) if watched_labels else None
+
+    def detect(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, self.input_size, swapRB=True, crop=False)
+        self.net.setInput(blob)
+        output = np.squeeze(self.net.forward())
+
+        # YOLOv8 exports are (4 + classes, N); YOLOv5 exports are (N, 5 + classes)
+        if output.shape[0] < output.shape[1]:
+            output = output.T
+            boxes, class_scores = output[:, :4], output[:, 4:]
+        else:
+            boxes, class_scores = output[:, :4], output[:, 5:] * output[:, 4:5]
+
+        class_ids = np.argmax(class_scores, axis=1)
+        confidences = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = confidences >= self.confidence_threshold
+        boxes, class_ids, confidences = boxes[keep], class_ids[keep], confidences[keep]
+
+        x_scale = frame_width / self.input_size[0]
+        y_scale = frame_height / self.input_size[1]
+        rects = []
+        for cx, cy, w, h in boxes:
+            rects.append([int((cx - w / 2) * x_scale), int((cy - h / 2) * y_scale),
+                          int(w * x_scale), int(h * y_scale)])
+
+        detections = []
+        indices = cv2.dnn.NMSBoxes(rects, confidences.tolist(), self.confidence_threshold, self.nms_threshold)
+        for i in np.array(indices).flatten():
+            class_id = int(class_ids[i])
+            label = self.labels[class_id] if class_id < len(self.labels) else str(class_id)
+            if self.watched_labels is not None and label not in self.watched_labels:
+                continue
+            detections.append({
+                'label': label,
+                'confidence': float(confidences[i]),
+                'box': tuple(rects[i]),
+            })
+        return detections
+
+
+class SecondaryDetectionScheduler:
+    """
+    Decides which stream may run the secondary detector next under a global CPU budget.
+    cpu_budget is the detector time allowed per wall-clock second across all streams,
+    e.g. 0.5 means the detector may keep half of one core busy.
+    """
+
+    def __init__(self, cpu_budget=0.5, min_interval=2.0, max_interval=5.0,
+                 initial_cost=0.2, stale_after=10.0, clock=time.monotonic):
+        self.cpu_budget = cpu_budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stale_after = stale_after
+        self.clock = clock
+
+        self.avg_cost = initial_cost
+        self.last_run = {}
+        self.last_seen = {}
+        # Token bucket holding detector seconds; capacity covers one max_interval
+        self.capacity = cpu_budget * max_interval
+        self.tokens = self.capacity
+        self._last_refill = clock()
+        self._over_budget = False
+        self._lock = threading.Lock()
+
+    def active_streams(self):
+        now = self.clock()
+        return [s for s, seen in self.last_seen.items() if now - seen <= self.stale_after]
+
+    def interval(self):
+        """Fair per-stream interval for the current number of active streams"""
+        streams = max(1, len(self.active_streams()))
+        return max(self.min_interval, streams * self.avg_cost / self.cpu_budget)
+
+    def should_run(self, stream_id):
+        """Return True and reserve budget if this stream is due for a detection"""
+        with self._lock:
+            now = self.clock()
+            self.last_seen[stream_id] = now
+            # A new stream is due straight away but starts behind the others
+            last = self.last_run.setdefault(stream_id, now - self.min_interval)
+
+            interval = self.interval()
+            if interval > self.max_interval and not self._over_budget:
+                logger.warning(f"Secondary detection budget exceeded: every stream now runs every {interval:.1f}s")
+            self._over_budget = interval > self.max_interval
+
+            if now - last < interval:
+                return False
+
+            self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.cpu_budget)
+            self._last_refill = now
+            if self.tokens < self.avg_cost:
+                return False
+
+            self.tokens -= self.avg_cost
+            self.last_run[stream_id] = now
+            return True
+
+    def record_cost(self, seconds):
+        """Settle the reservation against the measured cost and update the estimate"""
+        with self._lock:
+            self.tokens += self.avg_cost - seconds
+            self.avg_cost = 0.8 * self.avg_cost + 0.2 * seconds
+
+    def remove_stream(self, stream_id):
+        with self._lock:
+            self.last_run.pop(stream_id, None)
+            self.last_seen.pop(stream_id, None)
+
+
+class SecondaryDetectionStage:
+    """
+    Runs a SecondaryDetector on the frames picked by the scheduler, off the hot path.
+    on_result(stream_id, detections) is called from a worker thread.
+    """
+
+    def __init__(self, detector, scheduler=None, on_result=None, workers=1):
+        self.detector = detector
+        self.scheduler = scheduler or SecondaryDetectionScheduler()
+        self.on_result = on_result
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='secondary-detector')
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def offer(self, stream_id, frame):
+        """
+        Offer a frame from the capture loop. Returns a Future when the frame was
+        scheduled for detection, otherwise None.
+        """
+        with self._lock:
+            if stream_id in self._in_flight:
+                return None
+            if not self.scheduler.should_run(stream_id):
+                return None
+            self._in_flight.add(stream_id)
+        return self.executor.submit(self._run, stream_id, frame.copy())
+
+    def _run(self, stream_id, frame):
+        start = time.perf_counter()
+        try:
+            detections = self.detector.detect(frame)
+        except Exception as e:
+            logger.error(f"Secondary detector failed for stream {stream_id}: {e}")
+            detections = []
+        finally:
+            self.scheduler.record_cost(time.perf_counter() - start)
+            with self._lock:
+                self._in_flight.discard(stream_id)
+
+        if self.on_result is not None and detections:
+            self.on_result(stream_id, detections)
+        return detections
+
+    def remove_stream(self, stream_id):
+        self.scheduler.remove_stream(stream_id)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
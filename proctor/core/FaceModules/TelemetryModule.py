@@ -0,0 +1,211 @@
+"""
+Compact on-disk time series of per-frame proctoring metrics.
+
+Each (exam, student) pair gets one append-only file of fixed-width records laid
+out as TELEMETRY_DTYPE behind a 16 byte header, so the whole file can be
+memory-mapped and sliced with NumPy without parsing. The detector appends
+through a TelemetryWriter, which buffers records and writes them in chunks;
+TelemetryReader returns zero-copy views over a time range.
+"""
+
+import os
+import struct
+import time
+
+import numpy as np
+
+
+TELEMETRY_MAGIC = b'SFPT'
+TELEMETRY_VERSION = 1
+FILE_HEADER = struct.Struct('<4sHH8x')  # magic, version, record size, reserved
+
+TELEMETRY_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('left_eye_offset', '<f4'),
+    ('right_eye_offset', '<f4'),
+    ('vertical_offset', '<f4'),
+    ('head_offset', '<f4'),
+    ('left_ear', '<f4'),
+    ('right_ear', '<f4'),
+    ('status', 'u1'),
+    ('distracted', 'u1'),
+    ('reserved', 'V6'),
+])
+
+METRIC_FIELDS = (
+    'left_eye_offset', 'right_eye_offset', 'vertical_offset',
+    'head_offset', 'left_ear', 'right_ear',
+)
+
+# Status codes stored in the 'status' field; the index is the code
+STATUS_LABELS = (
+    'No Face',
+    'Focused',
+    'Looking Away',
+    'Looking Up/Down',
+    'Head Movement',
+    'Eyes Closed',
+)
+STATUS_CODES = {label: code for code, label in enumerate(STATUS_LABELS)}
+
+
+def telemetry_path(root, exam_id, student_id):
+    """Path of the telemetry file for one student in one exam"""
+    return os.path.join(str(root), str(exam_id), f"{student_id}.tlm")
+
+
+class TelemetryWriter:
+    """
+    Buffers per-frame metrics and appends them to a telemetry file in chunks,
+    at the latest flush_interval seconds (on the monotonic clock, whatever the
+    frame timestamps) after the previous flush.
+    """
+
+    def __init__(self, path, chunk_size=256, flush_interval=5.0):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.buffer = np.zeros(chunk_size, dtype=TELEMETRY_DTYPE)
+        self.count = 0
+        self._last_flush = time.monotonic()
+
+    def append(self, timestamp, status, distracted=False, left_eye_offset=np.nan,
+               right_eye_offset=np.nan, vertical_offset=np.nan, head_offset=np.nan,
+               left_ear=np.nan, right_ear=np.nan):
+        """Add one frame's metrics; metrics default to NaN when no face was found"""
+        record = self.buffer[self.count]
+        record['timestamp'] = timestamp
+        record['left_eye_offset'] = left_eye_offset
+        record['right_eye_offset'] = right_eye_offset
+        record['vertical_offset'] = vertical_offset
+        record['head_offset'] = head_offset
+        record['left_ear'] = left_ear
+        record['right_ear'] = right_ear
+        record['status'] = STATUS_CODES.get(status, 0)
+        record['distracted'] = 1 if distracted else 0
+        self.count += 1
+
+        if self.count == len(self.buffer) or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Append buffered records to disk"""
+        self._last_flush = time.monotonic()
+        if not self.count:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(FILE_HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, TELEMETRY_DTYPE.itemsize))
+            f.write(self.buffer[:self.count].tobytes())
+        self.count = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TelemetryReader:
+    """
+    Memory-mapped, read-only view of a telemetry file.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        size = os.path.getsize(self.path)
+        if size < FILE_HEADER.size:
+            self.records = np.zeros(0, dtype=TELEMETRY_DTYPE)
+            return
+
+        with open(self.path, 'rb') as f:
+            magic, version, record_size = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != TELEMETRY_MAGIC or record_size != TELEMETRY_DTYPE.itemsize:
+            raise ValueError(f"{self.path} is not a version {TELEMETRY_VERSION} telemetry file")
+
+        # Ignore a trailing partial record left by a writer that is mid-append
+        count = (size - FILE_HEADER.size) // TELEMETRY_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(self.path, dtype=TELEMETRY_DTYPE, mode='r',
+                                     offset=FILE_HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=TELEMETRY_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def read_range(self, start=None, end=None):
+        """Return a view of the records with start <= timestamp < end"""
+        timestamps = self.records['timestamp']
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return self.records[lo:hi]
+
+    @staticmethod
+    def status_labels(codes):
+        """Map an array of status codes back to their labels"""
+        return [STATUS_LABELS[code] if code < len(STATUS_LABELS) else 'Unknown' for code in codes]
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of at most `threshold` points that preserve the visual
+    shape of the (x, y) series; the first and last points are always kept.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets over the interior points [1, n - 1)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    buckets = threshold - 2
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < buckets:
+            next_x, next_y = avg_x[i + 1], avg_y[i + 1]
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        ax, ay = x[a], y[a]
+        areas = np.abs((ax - next_x) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y - ay))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_metrics(records, fields=METRIC_FIELDS, points=1000):
+    """
+    Downsample each metric of a record array to at most `points` samples.
+    Frames without a face (NaN metrics) are left out of the series.
+    """
+    series = {}
+    timestamps = records['timestamp']
+    for field in fields:
+        values = records[field]
+        mask = ~np.isnan(values)
+        t = timestamps[mask]
+        v = values[mask].astype(np.float64)
+        keep = lttb_indices(t, v, points)
+        series[field] = {
+            't': np.round(t[keep], 3).tolist(),
+            'v': np.round(v[keep], 4).tolist(),
+        }
+    return series
@@ -0,0 +1,168 @@
+"""
+Concurrent delivery of many emails through the pooled SMTP connections.
+
+A thread pool sends messages in parallel while a token bucket per SMTP host
+keeps the overall rate under the provider's limit. Temporary failures
+(dropped connections, 4xx replies) are retried with exponential backoff;
+permanent ones (5xx, bad addresses) fail straight away. Every run ends with a
+DeliveryReport. The outbox worker (OutboxModule.deliver_batch) sends its
+batches through here without the retry loop, as it reschedules failures itself.
+
+Rate limits are set per SMTP host in settings, in messages per second::
+
+    PROCTOR_SMTP_RATE_LIMITS = {'smtp.gmail.com': 5, 'default': 10}
+"""
+
+import logging
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .SMTPPoolModule import get_smtp_pool, is_connection_error
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMIT = 10
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second, in bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1.0, self.rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(host):
+    """Process-wide limiter for an SMTP host, shared by every bulk send to it"""
+    limits = getattr(settings, 'PROCTOR_SMTP_RATE_LIMITS', {})
+    rate = limits.get(host, limits.get('default', DEFAULT_RATE_LIMIT))
+    if not rate:
+        return None
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None or limiter.rate != rate:
+            limiter = RateLimiter(rate)
+            _rate_limiters[host] = limiter
+        return limiter
+
+
+def is_retryable(error):
+    if is_connection_error(error):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # Retry only if every refusal was temporary
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return False
+
+
+class DeliveryReport:
+    """Outcome of a bulk send: who got their message, who did not and why"""
+
+    def __init__(self):
+        self.sent = []
+        self.failed = {}
+        self.attempts = 0
+        self.retries = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, recipient, error, attempts):
+        with self._lock:
+            self.attempts += attempts
+            self.retries += attempts - 1
+            if error is None:
+                self.sent.append(recipient)
+            else:
+                self.failed[recipient] = str(error)
+
+    @property
+    def total(self):
+        return len(self.sent) + len(self.failed)
+
+    def summary(self):
+        rate = self.total / self.elapsed if self.elapsed else 0
+        text = (f'{len(self.sent)} of {self.total} email(s) sent in {self.elapsed:.1f}s '
+                f'({rate:.1f}/s, {self.retries} retr{"y" if self.retries == 1 else "ies"})')
+        if self.failed:
+            text += f'; {len(self.failed)} failed'
+        return text
+
+
+class BulkMailer:
+    """
+    Sends EmailMessages concurrently with the credentials dict of
+    SmartFaceProctorMailer (SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_API_KEY).
+    The pool never opens more than `workers` connections.
+    """
+
+    def __init__(self, smtp_creds, workers=4, rate_limit=None, max_retries=3, base_delay=1.0, pool=None):
+        self.workers = max(1, workers)
+        self.pool = pool or get_smtp_pool(smtp_creds, max_size=self.workers)
+        if rate_limit is not None:
+            self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        else:
+            self.rate_limiter = get_rate_limiter(smtp_creds['SMTP_HOST'])
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+    def _deliver(self, msg):
+        """Send one message; returns (error or None, attempts)"""
+        attempts = 0
+        error = None
+        for attempt in range(self.max_retries + 1):
+            attempts += 1
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                # The pool's own reconnect is left to the backoff loop, if there is one
+                self.pool.send_message(msg, retries=0 if self.max_retries else 1)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt == self.max_retries or not is_retryable(e):
+                    break
+                time.sleep(random.uniform(0, self.base_delay * (2 ** attempt)))
+        if error is not None:
+            logger.warning('Failed to send email to %s after %d attempt(s): %s', msg['To'], attempts, error)
+        return error, attempts
+
+    def send_each(self, messages):
+        """Send every message; returns [(error or None, attempts)] in the order of messages"""
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bulk-mail') as executor:
+            return list(executor.map(self._deliver, messages))
+
+    def send_all(self, messages):
+        """Send every message; returns a DeliveryReport"""
+        report = DeliveryReport()
+        start = time.perf_counter()
+        for msg, (error, attempts) in zip(messages, self.send_each(messages)):
+            report.record(msg['To'], error, attempts)
+        report.elapsed = time.perf_counter() - start
+        return report
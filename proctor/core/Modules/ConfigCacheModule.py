@@ -0,0 +1,109 @@
+"""
+Process-wide cache of configuration files such as SMTP_credentials.json and
+the Google service account key.
+
+Files are parsed once and served from memory. Whether a file changed on disk
+is checked by its mtime and size, and at most once per check interval, so
+most lookups do no file I/O at all while rotated credentials are still picked
+up within a few seconds and without a restart.
+
+The interval is settings.PROCTOR_CONFIG_CHECK_INTERVAL (seconds, default 5).
+"""
+
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_CHECK_INTERVAL = 5.0
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class _Entry:
+    def __init__(self, value, signature, checked_at):
+        self.value = value
+        self.signature = signature
+        self.checked_at = checked_at
+
+
+class ConfigCache:
+    """Parsed files keyed by path, reloaded when their mtime or size changes"""
+
+    def __init__(self, check_interval=None):
+        self._check_interval = check_interval
+        self._entries = {}
+        self._signatures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def check_interval(self):
+        if self._check_interval is not None:
+            return self._check_interval
+        return getattr(settings, 'PROCTOR_CONFIG_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+
+    def signature(self, path):
+        """(mtime_ns, size) of path, or None if missing; stat()ed at most once per check interval"""
+        path = os.path.abspath(path)
+        now = time.monotonic()
+        cached = self._signatures.get(path)
+        if cached is not None and now - cached[1] < self.check_interval:
+            return cached[0]
+        signature = _signature(path)
+        self._signatures[path] = (signature, now)
+        return signature
+
+    def get(self, path, loader=_read_json):
+        """The parsed content of path; loader(path) parses it on first use and after changes"""
+        path = os.path.abspath(path)
+        key = (path, loader)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.check_interval:
+            return entry.value
+
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                return entry.value
+            signature = _signature(path)
+            self._signatures[path] = (signature, now)
+            if entry is not None and signature == entry.signature:
+                entry.checked_at = now
+                return entry.value
+            value = loader(path)
+            self._entries[key] = _Entry(value, signature, now)
+            return value
+
+    def invalidate(self, path=None):
+        """Forget one file, or everything"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._signatures.clear()
+                return
+            path = os.path.abspath(path)
+            self._signatures.pop(path, None)
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+
+config_cache = ConfigCache()
+
+
+def load_json_config(path):
+    """Parsed JSON file, shared by every caller; treat it as read-only"""
+    return config_cache.get(path)
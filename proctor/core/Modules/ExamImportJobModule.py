@@ -0,0 +1,148 @@
+"""
+Background execution of ExamImportJob rows.
+
+schedule_exam only records a job; the run_exam_import_jobs worker claims queued
+jobs and streams the sheet into a new exam with stream_exam_questions. Chunks
+are committed as they are imported, so progress written to the job is visible
+to the status endpoint while the import is still in flight.
+
+A running job holds a lease that the worker renews with every progress
+update; jobs whose lease has lapsed belonged to a worker that died and are
+put back in the queue.
+
+A job that carries the content hash of the previewed rows imports exactly
+those rows instead, taken from the shared question bank cache when the
+preview is still there, and fails if the sheet was edited after the preview.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.models import Exam, ExamImportJob
+from .QuestionImportModule import QuestionImportError, import_exam_questions, stream_exam_questions
+from .SheetManagerModule import SheetRowStream, fetch_question_bank
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE = timedelta(minutes=5)
+
+
+def enqueue_exam_import(user, title, date, duration_minutes, warning_limit, sheet_url, content_hash=''):
+    """
+    Record an exam import for the worker and return the job.
+    content_hash pins the rows that were previewed.
+    """
+    return ExamImportJob.objects.create(
+        created_by=user,
+        title=title,
+        date=date,
+        duration_minutes=duration_minutes,
+        warning_limit=warning_limit or '',
+        sheet_url=sheet_url,
+        content_hash=content_hash or '',
+    )
+
+
+def claim_next_job(lease=DEFAULT_LEASE):
+    """
+    Atomically move the oldest queued job to running and return it, or None.
+    The conditional UPDATE makes sure two workers never run the same job.
+    """
+    while True:
+        job = ExamImportJob.objects.filter(status='queued').order_by('created_at').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = ExamImportJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', stage='validating', started_at=now, lease_expires_at=now + lease
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def requeue_stale_jobs():
+    """Put back running jobs whose lease lapsed because their worker died"""
+    return ExamImportJob.objects.filter(
+        status='running', lease_expires_at__lt=timezone.now()
+    ).update(status='queued', stage='queued', rows_processed=0, rows_total=0, lease_expires_at=None)
+
+
+def run_exam_import_job(job, chunk_rows=500, lease=DEFAULT_LEASE):
+    """Run one claimed job to completion, recording the outcome on the job"""
+    def heartbeat(**fields):
+        """Write progress to the job and renew its lease"""
+        ExamImportJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() + lease, **fields)
+
+    if job.exam_id:
+        # Left over from an attempt whose worker died mid-import
+        Exam.all_objects.filter(pk=job.exam_id).delete()
+        job.exam = None
+    exam_fields = {
+        'title': job.title,
+        'date': job.date,
+        'duration_minutes': job.duration_minutes,
+        'created_by': job.created_by,
+        'sheet_url': job.sheet_url,
+        'description': f"Warning Limit: {job.warning_limit}",
+    }
+    try:
+        job.stage = 'fetching'
+        heartbeat(stage=job.stage, exam=job.exam)
+        if job.content_hash:
+            exam, count = _import_previewed_rows(job, exam_fields, heartbeat)
+        else:
+            exam, count = _stream_rows(job, exam_fields, chunk_rows, heartbeat)
+    except QuestionImportError as e:
+        _finish(job, 'failed', errors=e.errors)
+    except Exception as e:
+        logger.exception(f"Exam import job {job.pk} failed")
+        _finish(job, 'failed', errors=[f"Error scheduling exam: {e}"])
+    else:
+        _finish(job, 'succeeded', exam=exam, questions_imported=count)
+    return job
+
+
+def _import_previewed_rows(job, exam_fields, heartbeat):
+    """Import exactly the rows the faculty previewed, in one transaction"""
+    bank = fetch_question_bank(job.sheet_url, content_hash=job.content_hash)
+    if bank.content_hash != job.content_hash:
+        raise QuestionImportError(["The sheet was changed after it was previewed. "
+                                   "Preview the exam again to import the current questions."])
+
+    job.stage = 'importing'
+    job.rows_total = len(bank.rows)
+    heartbeat(stage=job.stage, rows_total=job.rows_total)
+    exam, count = import_exam_questions(dict(exam_fields, sheet_content_hash=bank.content_hash), bank.questions)
+    heartbeat(rows_processed=len(bank.rows))
+    return exam, count
+
+
+def _stream_rows(job, exam_fields, chunk_rows, heartbeat):
+    stream = SheetRowStream(job.sheet_url, chunk_rows=chunk_rows)
+
+    job.stage = 'importing'
+    job.rows_total = stream.total_rows
+    heartbeat(stage=job.stage, rows_total=job.rows_total)
+
+    def created(exam):
+        heartbeat(exam=exam)
+
+    def progress(processed, total):
+        heartbeat(rows_processed=processed, rows_total=total)
+
+    return stream_exam_questions(exam_fields, stream, progress=progress, created=created)
+
+
+def _finish(job, status, errors=(), **fields):
+    job.refresh_from_db(fields=['rows_processed', 'rows_total', 'exam'])
+    job.status = status
+    job.stage = 'done'
+    job.errors = '\n'.join(errors)
+    job.finished_at = timezone.now()
+    job.lease_expires_at = None
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save()
@@ -1,43 +1,39 @@
-import re
-import requests
-from urllib.parse import urlparse
-from .SheetManagerModule import get_questions_from_sheet, extract_sheet_id
-import gspread
-from google.oauth2.service_account import Credentials
-import os
-from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from .QuestionImportModule import check_header, check_question_row
+from .SheetManagerModule import fetch_question_bank, extract_sheet_id
+
+# Sheet fetches run here so they overlap with the local checks
+_fetch_executor = None
+_fetch_executor_lock = threading.Lock()
+
+
+def _get_fetch_executor():
+    global _fetch_executor
+    with _fetch_executor_lock:
+        if _fetch_executor is None:
+            _fetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sheet-validation')
+        return _fetch_executor
 
 class ExamValidator:
     def __init__(self):
         self.errors = []
         self.warnings = []
+        self.question_bank = None
         
-    def validate_sheet_url(self, sheet_url):
-        """Validate Google Sheets URL format and accessibility"""
+    def validate_sheet_url(self, sheet_url, content_hash=None):
+        """
+        Validate Google Sheets URL format and accessibility.
+        The accessibility check fetches the question rows once and keeps them in
+        self.question_bank; with content_hash an already fetched bank is reused.
+        """
         try:
-            # Check URL format
-            if not sheet_url.startswith('https://docs.google.com/spreadsheets/'):
-                self.errors.append("Invalid Google Sheets URL format")
-                return False
-                
-            # Extract sheet ID
-            sheet_id = extract_sheet_id(sheet_url)
-            if not sheet_id:
-                self.errors.append("Could not extract sheet ID from URL")
+            if not self.validate_sheet_url_format(sheet_url):
                 return False
                 
             # Check if sheet is accessible
             try:
-                credentials_path = os.path.join(settings.BASE_DIR, 'core', 'config', 'credentials.json')
-                scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-                creds = Credentials.from_service_account_file(credentials_path, scopes=scopes)
-                client = gspread.authorize(creds)
-                sheet = client.open_by_key(sheet_id)
-                # Try to access the first worksheet
-                worksheet = sheet.get_worksheet(0)
-                if not worksheet:
-                    self.errors.append("No worksheets found in the Google Sheet")
-                    return False
+                self.question_bank = fetch_question_bank(sheet_url, content_hash=content_hash)
                 return True
             except Exception as e:
                 self.errors.append(f"Cannot access Google Sheet: {str(e)}")
@@ -47,38 +43,46 @@ class ExamValidator:
             self.errors.append(f"URL validation error: {str(e)}")
             return False
     
-    def validate_question_format(self, questions):
-        """Validate question format and required fields"""
+    def validate_sheet_url_format(self, sheet_url):
+        """Check that the URL looks like a Google Sheet, without contacting Google"""
+        if not sheet_url or not sheet_url.startswith('https://docs.google.com/spreadsheets/'):
+            self.errors.append("Invalid Google Sheets URL format")
+            return False
+            
+        # Extract sheet ID
+        try:
+            extract_sheet_id(sheet_url)
+        except ValueError:
+            self.errors.append("Could not extract sheet ID from URL")
+            return False
+        return True
+    
+    def validate_question_format(self, questions, headers=None):
+        """
+        Check every question row in one pass and record all errors and warnings
+        with their sheet row numbers (the header is row 1).
+        Columns are checked once against the header; headers defaults to the
+        keys of the first question.
+        """
         if not questions:
             self.errors.append("No questions found in the sheet")
             return False
-            
-        required_fields = ['Questions', 'Option A', 'Option B', 'Option C', 'Option D', 'Answer']
-        valid_answers = ['A', 'B', 'C', 'D']
         
-        for i, question in enumerate(questions, 1):
-            # Check required fields
-            for field in required_fields:
-                if field not in question or not question[field].strip():
-                    self.errors.append(f"Question {i}: Missing or empty '{field}' field")
-                    return False
-            
-            # Validate answer format
-            answer = question['Answer'].strip().upper()
-            if answer not in valid_answers:
-                self.errors.append(f"Question {i}: Invalid answer '{answer}'. Must be A, B, C, or D")
-                return False
-            
-            # Check question length
-            if len(question['Questions'].strip()) < 10:
-                self.warnings.append(f"Question {i}: Question text seems too short")
-            
-            # Check option lengths
-            for option in ['Option A', 'Option B', 'Option C', 'Option D']:
-                if len(question[option].strip()) < 2:
-                    self.warnings.append(f"Question {i}: {option} seems too short")
+        if headers is None:
+            headers = list(questions[0].keys())
+        header_errors = check_header(headers)
+        if header_errors:
+            self.errors.extend(header_errors)
+            return False
         
-        return True
+        # The same row checks the import applies, so the preview and the save agree
+        error_count = len(self.errors)
+        for row_number, question in enumerate(questions, 2):
+            _, row_errors, row_warnings = check_question_row(question, row_number)
+            self.errors.extend(row_errors)
+            self.warnings.extend(row_warnings)
+        
+        return len(self.errors) == error_count
     
     def validate_exam_duration(self, duration_minutes):
         """Validate exam duration"""
@@ -135,34 +139,55 @@ class ExamValidator:
             
         return True
     
-    def validate_complete_exam(self, title, exam_date, exam_time, duration_minutes, sheet_url):
-        """Validate all exam parameters"""
+    def validate_complete_exam(self, title, exam_date, exam_time, duration_minutes, sheet_url, content_hash=None,
+                               question_bank=None):
+        """
+        Validate all exam parameters and report every problem at once.
+        The sheet fetch is the only remote call; it runs in the background while
+        the local fields are checked. An uploaded question_bank replaces the sheet.
+        """
         self.errors = []
         self.warnings = []
+        self.question_bank = question_bank
         
-        # Validate basic fields
-        if not self.validate_exam_title(title):
-            return False
-            
-        if not self.validate_exam_date(exam_date, exam_time):
-            return False
-            
-        if not self.validate_exam_duration(duration_minutes):
-            return False
-            
-        if not self.validate_sheet_url(sheet_url):
-            return False
+        fetch = None
+        if question_bank is None and self.validate_sheet_url_format(sheet_url):
+            fetch = _get_fetch_executor().submit(fetch_question_bank, sheet_url, content_hash=content_hash)
+        
+        # Local checks, all of them, while the sheet is being fetched
+        self.validate_exam_title(title)
+        self.validate_exam_date(exam_date, exam_time)
+        self.validate_exam_duration(duration_minutes)
+        
+        if fetch is not None:
+            try:
+                self.question_bank = fetch.result()
+            except Exception as e:
+                self.errors.append(f"Cannot access Google Sheet: {str(e)}")
         
         # Validate questions
-        try:
-            questions = get_questions_from_sheet(sheet_url)
-            if not self.validate_question_format(questions):
-                return False
-        except Exception as e:
-            self.errors.append(f"Error extracting questions: {str(e)}")
-            return False
+        if self.question_bank is not None:
+            try:
+                self.validate_question_format(self.question_bank.questions, self.question_bank.headers)
+            except Exception as e:
+                self.errors.append(f"Error extracting questions: {str(e)}")
         
-        return True
+        return not self.errors
+    
+    def validate_exam_details(self, title, exam_date, exam_time, duration_minutes, sheet_url=None):
+        """
+        Validate everything except the question rows and report every problem
+        at once; makes no remote calls. Without sheet_url (uploaded question
+        files) the URL is not checked.
+        """
+        self.errors = []
+        self.warnings = []
+        self.validate_exam_title(title)
+        self.validate_exam_date(exam_date, exam_time)
+        self.validate_exam_duration(duration_minutes)
+        if sheet_url is not None:
+            self.validate_sheet_url_format(sheet_url)
+        return not self.errors
     
     def get_validation_summary(self):
         """Get validation summary with errors and warnings"""
@@ -171,11 +196,18 @@ class ExamValidator:
             'errors': self.errors,
             'warnings': self.warnings,
             'error_count': len(self.errors),
-            'warning_count': len(self.warnings)
+            'warning_count': len(self.warnings),
+            'question_bank': self.question_bank
         }
 
-def validate_exam_data(title, exam_date, exam_time, duration_minutes, sheet_url):
-    """Convenience function to validate exam data"""
+def validate_exam_data(title, exam_date, exam_time, duration_minutes, sheet_url, content_hash=None,
+                       question_bank=None):
+    """
+    Convenience function to validate exam data.
+    The summary's 'question_bank' holds the validated rows, so callers can
+    preview or save them without fetching the sheet again.
+    """
     validator = ExamValidator()
-    is_valid = validator.validate_complete_exam(title, exam_date, exam_time, duration_minutes, sheet_url)
+    validator.validate_complete_exam(title, exam_date, exam_time, duration_minutes, sheet_url, content_hash,
+                                     question_bank)
     return validator.get_validation_summary() 
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Database-backed outbox for transactional email.
+
+Views call enqueue_email() and return at once; the send_queued_emails worker
+claims due rows in batches and sends them concurrently over the pooled SMTP
+connections, under the host's PROCTOR_SMTP_RATE_LIMITS (see BulkMailerModule).
+Temporary failures are rescheduled with exponential backoff until
+max_attempts, after which (or on a permanent failure, or once expires_at has
+passed) the row becomes a dead letter kept for inspection. Bodies carry OTPs
+and passwords, so they are blanked as soon as a row is sent or dead, and
+purge_old_emails() deletes finished rows after a retention period.
+"""
+
+import logging
+import random
+import uuid
+
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import OutboundEmail
+from .BulkMailerModule import BulkMailer, is_retryable
+from .SMTPPoolModule import get_smtp_pool
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+
+
+def enqueue_email(recipient, subject, body, kind='other', expires_in=None, max_attempts=5):
+    """Queue an email for the worker; expires_in is a timedelta after which it is not sent"""
+    return OutboundEmail.objects.create(
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        kind=kind,
+        max_attempts=max_attempts,
+        expires_at=timezone.now() + expires_in if expires_in else None,
+    )
+
+
+def cancel_queued_emails(recipient, kind, reason='Superseded by a newer email'):
+    """
+    Turn the still-queued emails of one kind to recipient into dead letters,
+    e.g. an OTP that a newer OTP replaces. Emails already being sent are left alone.
+    """
+    return OutboundEmail.objects.filter(recipient__iexact=recipient, kind=kind, status='queued').update(
+        status='dead', last_error=reason, body=''
+    )
+
+
+def enqueue_emails(emails, kind='other', max_attempts=5):
+    """Queue many (recipient, subject, body) emails with one INSERT per 500"""
+    return OutboundEmail.objects.bulk_create(
+        [OutboundEmail(recipient=recipient, subject=subject, body=body, kind=kind, max_attempts=max_attempts)
+         for recipient, subject, body in emails],
+        batch_size=500,
+    )
+
+
+def claim_batch(batch_size=50):
+    """
+    Move up to batch_size due emails to sending and return them. The
+    conditional UPDATE plus a per-claim token keeps two workers from taking
+    the same row.
+    """
+    now = timezone.now()
+    ids = list(
+        OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=now)
+        .order_by('next_attempt_at').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(pk__in=ids, status='queued').update(
+        status='sending', claim_token=token, claimed_at=now
+    )
+    return list(OutboundEmail.objects.filter(claim_token=token, status='sending').order_by('next_attempt_at'))
+
+
+def requeue_stale_emails(older_than):
+    """Put back emails claimed by a worker that died; they may be sent twice"""
+    return OutboundEmail.objects.filter(
+        status='sending', claimed_at__lt=timezone.now() - older_than
+    ).update(status='queued', claim_token='')
+
+
+def purge_old_emails(older_than):
+    """Delete sent and dead emails created more than older_than ago; returns how many"""
+    deleted, _ = OutboundEmail.objects.filter(
+        status__in=('sent', 'dead'), created_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
+
+
+def _retry_delay(attempts):
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempts - 1)))
+    return timezone.timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def deliver_batch(emails, mailer, workers=4):
+    """
+    Send claimed emails with a SmartFaceProctorMailer's credentials, on up to
+    `workers` connections at once, and record the outcome of each. Returns a
+    dict of sent / retried / dead counts.
+    """
+    now = timezone.now()
+    sent_ids = []
+    counts = {'sent': 0, 'retried': 0, 'dead': 0}
+
+    due = []
+    for email in emails:
+        if email.expires_at and email.expires_at <= now:
+            OutboundEmail.objects.filter(pk=email.pk).update(status='dead', last_error='Expired before sending',
+                                                             body='')
+            counts['dead'] += 1
+        else:
+            due.append(email)
+    if not due:
+        return counts
+
+    # Failures are rescheduled below rather than retried in place
+    bulk = BulkMailer(mailer.smtp_creds, workers=workers, max_retries=0,
+                      pool=get_smtp_pool(mailer.smtp_creds, max_size=workers))
+    outcomes = bulk.send_each([mailer.build_message(email.recipient, email.subject, email.body) for email in due])
+
+    for email, (error, _) in zip(due, outcomes):
+        if error is None:
+            sent_ids.append(email.pk)
+            counts['sent'] += 1
+            continue
+        email.attempts += 1
+        email.last_error = str(error)
+        if is_retryable(error) and email.attempts < email.max_attempts:
+            email.status = 'queued'
+            email.next_attempt_at = timezone.now() + _retry_delay(email.attempts)
+            counts['retried'] += 1
+        else:
+            email.status = 'dead'
+            email.body = ''
+            counts['dead'] += 1
+            logger.warning(f"Giving up on email {email.pk} to {email.recipient}: {error}")
+        email.claim_token = ''
+        email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'claim_token', 'body'])
+
+    if sent_ids:
+        OutboundEmail.objects.filter(pk__in=sent_ids).update(
+            status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1, claim_token='', last_error='',
+            body=''
+        )
+    return counts
@@ -0,0 +1,217 @@
+"""
+Question banks uploaded as CSV or XLSX files instead of read from Google Sheets.
+
+Both formats are parsed straight from the uploaded stream with the standard
+library: csv for CSV, and zipfile plus an incremental ElementTree parse for
+XLSX, so no spreadsheet package is needed. The result is a regular
+QuestionBank, which the preview and scheduling views validate and import
+through the same pipeline as a Google Sheet. Between the preview and the
+confirmation the parsed rows are kept in UploadedQuestionBank.
+"""
+
+import csv
+import functools
+import io
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.models import UploadedQuestionBank
+from .SheetManagerModule import QuestionBank, hash_values
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# Guard against zip bombs: uncompressed size allowed for any one XLSX part
+MAX_XLSX_PART_BYTES = 200 * 1024 * 1024
+
+UPLOAD_SHEET_PREFIX = 'upload:'
+# How long a previewed upload can still be confirmed
+UPLOAD_RETENTION = timedelta(hours=24)
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def parse_csv(stream):
+    """Read rows from a binary CSV stream (UTF-8, with or without BOM)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        return [row for row in csv.reader(text)]
+    except csv.Error as e:
+        raise ValueError(f'The uploaded CSV file cannot be read: {e}')
+    finally:
+        # Leave the underlying upload open for Django to clean up
+        text.detach()
+
+
+def _column_index(cell_ref):
+    """'C7' -> 2"""
+    return _letters_index(cell_ref.rstrip('0123456789'))
+
+
+@functools.lru_cache(maxsize=1024)
+def _letters_index(letters):
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+
+def _open_part(archive, name):
+    info = archive.getinfo(name)
+    if info.file_size > MAX_XLSX_PART_BYTES:
+        raise ValueError(f"XLSX part {name} is too large")
+    return archive.open(info)
+
+
+def _first_sheet_path(archive):
+    """Resolve the first worksheet of the workbook through its relationships"""
+    with _open_part(archive, 'xl/workbook.xml') as f:
+        workbook = ET.parse(f).getroot()
+    sheet = workbook.find(f'{_MAIN_NS}sheets/{_MAIN_NS}sheet')
+    if sheet is None:
+        raise ValueError('No worksheets found in the uploaded file')
+    rel_id = sheet.get(f'{_REL_NS}id')
+
+    with _open_part(archive, 'xl/_rels/workbook.xml.rels') as f:
+        rels = ET.parse(f).getroot()
+    for rel in rels.iter(f'{_PKG_REL_NS}Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError('No worksheets found in the uploaded file')
+
+
+def _shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with _open_part(archive, 'xl/sharedStrings.xml') as f:
+        for _, element in ET.iterparse(f):
+            if element.tag == f'{_MAIN_NS}si':
+                if len(element) == 1 and element[0].tag == f'{_MAIN_NS}t':
+                    strings.append(element[0].text or '')
+                else:
+                    # Rich text is split over several runs; phonetic hints (rPh) are not part of the value
+                    parts = []
+                    for child in element:
+                        if child.tag == f'{_MAIN_NS}t':
+                            parts.append(child.text or '')
+                        elif child.tag == f'{_MAIN_NS}r':
+                            parts.extend(t.text or '' for t in child if t.tag == f'{_MAIN_NS}t')
+                    strings.append(''.join(parts))
+                element.clear()
+    return strings
+
+
+def parse_xlsx(stream):
+    """Read the rows of the first worksheet of an XLSX file"""
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise ValueError('The uploaded file is not a valid XLSX workbook')
+
+    with archive:
+        try:
+            return _read_first_sheet(archive)
+        except KeyError as e:
+            raise ValueError(f'The uploaded workbook is missing {e}')
+        except (ET.ParseError, IndexError, zipfile.BadZipFile) as e:
+            raise ValueError(f'The uploaded workbook is damaged: {e}')
+
+
+def _read_first_sheet(archive):
+    strings = _shared_strings(archive)
+    sheet_path = _first_sheet_path(archive)
+
+    row_tag = f'{_MAIN_NS}row'
+    value_tag = f'{_MAIN_NS}v'
+    text_tag = f'{_MAIN_NS}t'
+    rows = []
+    with _open_part(archive, sheet_path) as f:
+        for _, element in ET.iterparse(f):
+            if element.tag != row_tag:
+                continue
+            row_number = int(element.get('r', len(rows) + 1))
+            # Rows that hold no values are omitted from the file
+            while len(rows) < row_number - 1:
+                rows.append([])
+
+            row = []
+            for cell in element:
+                ref = cell.get('r')
+                column = _column_index(ref) if ref else len(row)
+                cell_type = cell.get('t')
+                if cell_type == 'inlineStr':
+                    value = ''.join(t.text or '' for t in cell.iter(text_tag))
+                else:
+                    v = cell.find(value_tag)
+                    value = v.text or '' if v is not None else ''
+                    if cell_type == 's' and value:
+                        value = strings[int(value)]
+                    elif cell_type == 'b':
+                        value = 'TRUE' if value == '1' else 'FALSE'
+                if value == '':
+                    continue
+                row.extend([''] * (column - len(row)))
+                row.append(value)
+            rows.append(row)
+            element.clear()
+    return rows
+
+
+def _normalise(rows):
+    """Pad rows to the header width and drop trailing empty rows, like the Sheets API"""
+    while rows and not any(cell.strip() for cell in rows[-1]):
+        rows.pop()
+    if not rows:
+        return rows
+    width = len(rows[0])
+    return [row[:width] + [''] * (width - len(row)) for row in rows]
+
+
+def parse_question_file(uploaded_file, user):
+    """
+    Parse an uploaded .csv or .xlsx question file into a QuestionBank and store
+    it for user, so the scheduling step can import it by its content hash.
+    Raises ValueError for unsupported, oversized or unreadable files.
+    """
+    name = (uploaded_file.name or '').lower()
+    if uploaded_file.size > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Question files are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
+    uploaded_file.seek(0)
+    if name.endswith('.csv'):
+        try:
+            rows = parse_csv(uploaded_file.file)
+        except UnicodeDecodeError:
+            raise ValueError('CSV files must be UTF-8 encoded')
+    elif name.endswith('.xlsx'):
+        rows = parse_xlsx(uploaded_file.file)
+    else:
+        raise ValueError('Upload a .csv or .xlsx file')
+
+    rows = _normalise(rows)
+    content_hash = hash_values(rows)
+    now = timezone.now()
+    UploadedQuestionBank.objects.filter(uploaded_at__lt=now - UPLOAD_RETENTION).delete()
+    UploadedQuestionBank.objects.update_or_create(
+        created_by=user, content_hash=content_hash,
+        defaults={'file_name': (uploaded_file.name or '')[:255], 'rows': rows, 'uploaded_at': now},
+    )
+    return QuestionBank(UPLOAD_SHEET_PREFIX + content_hash, 0, rows, content_hash=content_hash)
+
+
+def get_uploaded_bank(user, content_hash):
+    """The bank of a file user uploaded earlier in the scheduling flow, or None once it has expired"""
+    upload = UploadedQuestionBank.objects.filter(
+        created_by=user, content_hash=content_hash, uploaded_at__gte=timezone.now() - UPLOAD_RETENTION
+    ).first()
+    if upload is None:
+        return None
+    return QuestionBank(UPLOAD_SHEET_PREFIX + content_hash, 0, upload.rows, content_hash=content_hash)
@@ -0,0 +1,266 @@
+"""
+Bulk, all-or-nothing import of an exam and its questions.
+
+Every row is validated and turned into an unsaved Question in memory first.
+Only when all rows are valid are the exam and its questions written, inside a
+single transaction and with bulk_create, so a bad row can never leave a
+half-imported exam behind.
+
+check_question_row() is the only place question rows are checked; the
+preview (ExamValidator) uses it too, so a sheet that passes the preview is
+accepted by the import.
+"""
+
+import difflib
+import functools
+import hashlib
+
+from django.db import transaction
+
+from core.models import Exam, Question
+
+# Sheet header -> Question field
+QUESTION_COLUMNS = {
+    'Questions': 'text',
+    'Option A': 'option_a',
+    'Option B': 'option_b',
+    'Option C': 'option_c',
+    'Option D': 'option_d',
+    'Answer': 'answer',
+}
+OPTION_COLUMNS = ('Option A', 'Option B', 'Option C', 'Option D')
+VALID_ANSWERS = ('A', 'B', 'C', 'D')
+
+# Rows per INSERT. Large enough to keep round trips low, small enough that a
+# batch of long questions stays well under MySQL's max_allowed_packet.
+DEFAULT_BATCH_SIZE = 500
+
+# Streaming imports stop collecting errors after this many
+MAX_REPORTED_ERRORS = 100
+
+
+class QuestionImportError(Exception):
+    """Raised with every row error when a question bank cannot be imported"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid question row(s)")
+
+
+def check_header(header):
+    """Return an error for every question column missing from the header row"""
+    missing = [column for column in QUESTION_COLUMNS if column not in header]
+    if missing:
+        return [f"Sheet header is missing column(s): {', '.join(missing)}"]
+    return []
+
+
+@functools.cache
+def _max_lengths():
+    return {field: Question._meta.get_field(field).max_length for field in QUESTION_COLUMNS.values()}
+
+
+def check_question_row(row, row_number):
+    """
+    Check one question dict (as returned by QuestionBank.questions).
+    Returns (values, errors, warnings); values maps Question fields to the
+    cleaned cell values, errors and warnings name the sheet row.
+    """
+    max_lengths = _max_lengths()
+    values = {}
+    errors = []
+    warnings = []
+    for column, field in QUESTION_COLUMNS.items():
+        value = str(row.get(column) or '').strip()
+        if not value:
+            errors.append(f"Row {row_number}: Missing or empty '{column}' field")
+        elif max_lengths[field] and len(value) > max_lengths[field]:
+            errors.append(f"Row {row_number}: '{column}' is longer than {max_lengths[field]} characters")
+        values[field] = value
+
+    answer = values['answer'].upper()
+    if answer and answer not in VALID_ANSWERS:
+        errors.append(f"Row {row_number}: Invalid answer '{answer}'. Must be A, B, C, or D")
+    values['answer'] = answer
+
+    if values['text'] and len(values['text']) < 10:
+        warnings.append(f"Row {row_number}: Question text seems too short")
+    for column in OPTION_COLUMNS:
+        value = values[QUESTION_COLUMNS[column]]
+        if value and len(value) < 2:
+            warnings.append(f"Row {row_number}: {column} seems too short")
+    return values, errors, warnings
+
+
+def build_questions(rows, first_row_number=2):
+    """
+    Validate question dicts (as returned by QuestionBank.questions) and build
+    unsaved Question objects. Returns (questions, errors); errors name the
+    sheet row, counting the header as row 1, and each question's position is
+    its row index below the header.
+    """
+    questions = []
+    errors = []
+    for row_number, row in enumerate(rows, first_row_number):
+        values, row_errors, _ = check_question_row(row, row_number)
+        if row_errors:
+            errors.extend(row_errors)
+        else:
+            questions.append(Question(position=row_number - 2, **values))
+
+    if not rows:
+        errors.append("No questions found in the sheet")
+    return questions, errors
+
+
+def import_exam_questions(exam_fields, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create an exam and all of its questions in one transaction.
+    exam_fields are passed to Exam.objects.create. Raises QuestionImportError
+    before touching the database if any row is invalid.
+    Returns (exam, question_count).
+    """
+    questions, errors = build_questions(rows)
+    if errors:
+        raise QuestionImportError(errors)
+
+    with transaction.atomic():
+        exam = Exam.objects.create(**exam_fields)
+        for question in questions:
+            question.exam = exam
+        Question.objects.bulk_create(questions, batch_size=batch_size)
+    return exam, len(questions)
+
+
+def stream_exam_questions(exam_fields, stream, batch_size=DEFAULT_BATCH_SIZE, progress=None, created=None):
+    """
+    Create an exam and import its questions chunk by chunk from a SheetRowStream.
+    Each chunk is validated and inserted as it arrives, so memory use does not
+    grow with the size of the sheet. The header is checked before the exam is
+    created. Chunks are committed one at a time, so no transaction stays open
+    while the next chunk is fetched from Google; the exam stays unpublished,
+    and so hidden from Exam.objects, until the last chunk is in. Row errors
+    stop further inserts and, once the remaining rows have been checked, the
+    exam and the questions inserted so far are deleted again.
+    progress(rows_processed, total_rows) is called after every chunk, and
+    created(exam) once the exam exists.
+    Returns (exam, question_count).
+    """
+    errors = check_header(stream.header)
+    if errors:
+        raise QuestionImportError(errors)
+
+    exam = Exam.objects.create(**exam_fields, is_published=False)
+    if created is not None:
+        created(exam)
+    processed = 0
+    imported = 0
+    try:
+        for first_row_number, rows in stream:
+            questions, chunk_errors = build_questions(rows, first_row_number)
+            processed += len(rows)
+            if chunk_errors:
+                errors.extend(chunk_errors[:max(0, MAX_REPORTED_ERRORS - len(errors))])
+            elif not errors:
+                for question in questions:
+                    question.exam = exam
+                with transaction.atomic():
+                    Question.objects.bulk_create(questions, batch_size=batch_size)
+                imported += len(questions)
+            if progress is not None:
+                progress(processed, max(processed, stream.total_rows))
+
+        if not processed:
+            errors.append("No questions found in the sheet")
+        if errors:
+            raise QuestionImportError(errors)
+        Exam.all_objects.filter(pk=exam.pk).update(is_published=True)
+        exam.is_published = True
+    except BaseException:
+        # Deleting the exam cascades to the chunks already committed
+        exam.delete()
+        raise
+    return exam, imported
+
+
+def question_fingerprint(values):
+    """Hash of a question's field values, in QUESTION_COLUMNS order"""
+    return hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+
+def resync_exam_questions(exam, rows, batch_size=DEFAULT_BATCH_SIZE, content_hash=''):
+    """
+    Bring an exam's questions in line with the current sheet rows, touching
+    only the rows that changed. The stored questions and the sheet rows are
+    matched by fingerprint with difflib, so a row inserted or removed mid-sheet
+    is one insert or delete and the questions after it keep their ids; rows
+    edited in place are updated. Questions that only moved are counted as
+    moved and get their new position, with no other column written.
+    Everything runs in one transaction, which also records content_hash (the
+    QuestionBank's) as the exam's sheet_content_hash.
+    Raises QuestionImportError, changing nothing, if any row is invalid.
+    Returns counts of inserted, updated, moved, deleted and unchanged questions.
+    """
+    questions, errors = build_questions(rows)
+    if errors:
+        raise QuestionImportError(errors)
+
+    fields = list(QUESTION_COLUMNS.values())
+    with transaction.atomic():
+        # Lock the exam so two re-syncs of the same exam cannot interleave
+        Exam.objects.select_for_update().get(pk=exam.pk)
+        existing = list(Question.objects.filter(exam=exam).order_by('position', 'id')
+                        .values_list('id', 'position', *fields))
+
+        old_fingerprints = [question_fingerprint(stored[2:]) for stored in existing]
+        new_fingerprints = [question_fingerprint([getattr(question, field) for field in fields])
+                            for question in questions]
+        matcher = difflib.SequenceMatcher(None, old_fingerprints, new_fingerprints, autojunk=False)
+
+        to_update = []
+        to_move = []
+        to_insert = []
+        to_delete = []
+        updated = unchanged = 0
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if tag == 'equal':
+                for stored, question in zip(existing[old_start:old_end], questions[new_start:new_end]):
+                    if stored[1] != question.position:
+                        question.pk = stored[0]
+                        to_move.append(question)
+                    else:
+                        unchanged += 1
+                continue
+            # A replaced block pairs edited rows with the questions they replace;
+            # whatever is left over on either side is inserted or deleted
+            paired = min(old_end - old_start, new_end - new_start)
+            for stored, question in zip(existing[old_start:old_start + paired],
+                                        questions[new_start:new_start + paired]):
+                updated += 1
+                question.pk = stored[0]
+                to_update.append(question)
+            to_insert.extend(questions[new_start + paired:new_end])
+            to_delete.extend(stored[0] for stored in existing[old_start + paired:old_end])
+
+        for question in to_update + to_insert:
+            question.exam = exam
+
+        if to_update:
+            Question.objects.bulk_update(to_update, fields + ['position'], batch_size=batch_size)
+        if to_move:
+            Question.objects.bulk_update(to_move, ['position'], batch_size=batch_size)
+        if to_insert:
+            Question.objects.bulk_create(to_insert, batch_size=batch_size)
+        if to_delete:
+            Question.objects.filter(pk__in=to_delete).delete()
+        if content_hash:
+            Exam.objects.filter(pk=exam.pk).update(sheet_content_hash=content_hash)
+            exam.sheet_content_hash = content_hash
+
+    return {
+        'inserted': len(to_insert),
+        'updated': updated,
+        'moved': len(to_move),
+        'deleted': len(to_delete),
+        'unchanged': unchanged,
+    }
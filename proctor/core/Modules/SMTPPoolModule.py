@@ -0,0 +1,184 @@
+"""
+Pool of authenticated SMTP connections shared by every mailer in the process.
+
+Opening smtplib.SMTP_SSL and logging in costs a TCP connect, a TLS handshake
+and several round trips, which used to be paid for every message. The pool
+keeps logged-in connections open between messages, replaces connections that
+the server dropped, and retires each connection after max_messages so that
+provider per-session limits are never hit.
+"""
+
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+
+def is_connection_error(error):
+    """True for errors after which a connection cannot be trusted any more"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: the server is closing the session
+        return error.smtp_code == 421
+    # Socket and TLS errors; other SMTPExceptions (also OSErrors) are per-message failures
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class _PooledConnection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    Thread-safe pool of up to max_size logged-in SMTP connections.
+    Use send_message() for one message, or connection() to hold one connection
+    for a batch.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=True, max_size=4,
+                 max_messages=100, idle_timeout=60.0, timeout=30.0):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.max_size = max_size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+        self.connections_opened = 0
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connections_opened += 1
+        return _PooledConnection(smtp)
+
+    def _acquire(self):
+        with self._condition:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    # Servers drop idle sessions; do not hand out one that has sat too long
+                    if time.monotonic() - conn.last_used <= self.idle_timeout:
+                        return conn
+                    self._open -= 1
+                    self._quit(conn)
+                if self._open < self.max_size:
+                    self._open += 1
+                    break
+                self._condition.wait()
+        try:
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, conn, broken=False):
+        retire = broken or conn.messages_sent >= self.max_messages
+        with self._condition:
+            if retire:
+                self._open -= 1
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            self._condition.notify()
+        if retire:
+            self._quit(conn, polite=not broken)
+
+    def _quit(self, conn, polite=True):
+        try:
+            if polite:
+                conn.smtp.quit()
+            else:
+                conn.smtp.close()
+        except Exception:
+            conn.smtp.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a logged-in connection; it goes back to the pool unless it broke"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException as e:
+            self._release(conn, broken=is_connection_error(e))
+            raise
+        else:
+            self._release(conn)
+
+    def send_message(self, msg, retries=1):
+        """
+        Send one email.message.EmailMessage. If the connection turns out to be
+        dead (e.g. closed by the server while idle) it is replaced and the send
+        retried up to `retries` times.
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as conn:
+                    conn.smtp.send_message(msg)
+                    conn.messages_sent += 1
+                    return
+            except Exception as e:
+                if attempt == retries or not is_connection_error(e):
+                    raise
+
+    def close(self):
+        """Close all idle connections"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for conn in idle:
+            self._quit(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(smtp_creds, **options):
+    """
+    Process-wide pool for an SMTP credentials dict as stored in
+    config/SMTP_credentials.json (SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_API_KEY).
+    """
+    key = (smtp_creds['SMTP_HOST'], int(smtp_creds['SMTP_PORT']), smtp_creds.get('SMTP_USER'),
+           smtp_creds.get('SMTP_API_KEY'))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # Credentials for this account were rotated; let the old connections go
+            stale = [other for other in _pools if other[:3] == key[:3]]
+            for other in stale:
+                _pools.pop(other).close()
+            pool = SMTPConnectionPool(key[0], key[1], key[2], key[3], **options)
+            _pools[key] = pool
+        elif options.get('max_size', 0) > pool.max_size:
+            # A bulk send asked for more concurrent connections than the pool was created with
+            with pool._condition:
+                pool.max_size = options['max_size']
+                pool._condition.notify_all()
+        return pool
+
+
+def close_smtp_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
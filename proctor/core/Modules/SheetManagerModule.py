@@ -1,9 +1,106 @@
 import gspread
+from gspread.utils import fill_gaps, rowcol_to_a1
 from google.oauth2.service_account import Credentials
 from urllib.parse import urlparse
+from collections import OrderedDict
+import hashlib
+import json
 import re
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .ConfigCacheModule import config_cache, load_json_config
+
+SHEETS_SCOPES = ("https://www.googleapis.com/auth/spreadsheets",)
+
+
+def load_service_account_credentials(credentials_path, scopes):
+    """Service account credentials from a key file, parsed once via the config cache"""
+    return Credentials.from_service_account_info(load_json_config(credentials_path), scopes=scopes)
+
+
+class SheetsClientManager:
+    """
+    Process-wide cache of authorized gspread clients, one per credentials file and scope set.
+
+    Credentials are read once and the client (with its pooled HTTP session) is
+    reused by every caller. The OAuth token is refreshed under a lock only when
+    it is missing or about to expire, so concurrent requests never trigger
+    duplicate token exchanges. A new client is built when the credentials file
+    changes on disk (see ConfigCacheModule).
+    """
+
+    def __init__(self, load_credentials=None, authorize=gspread.authorize):
+        self.load_credentials = load_credentials or load_service_account_credentials
+        self.authorize = authorize
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._refresh_request = None
+
+    def get_client(self, credentials_path, scopes=SHEETS_SCOPES):
+        key = (str(credentials_path), tuple(scopes))
+        with self._lock:
+            signature = config_cache.signature(str(credentials_path))
+            entry = self._clients.get(key)
+            if entry is None or entry[2] != signature:
+                creds = self.load_credentials(str(credentials_path), scopes=list(scopes))
+                entry = (creds, self.authorize(creds), signature)
+                self._clients[key] = entry
+
+            creds, client, _ = entry
+            if not creds.valid:
+                try:
+                    creds.refresh(self._get_refresh_request())
+                except Exception:
+                    # Re-read the credentials file on the next call, it may have been rotated
+                    self._clients.pop(key, None)
+                    raise
+            return client
+
+    def _get_refresh_request(self):
+        if self._refresh_request is None:
+            from google.auth.transport.requests import Request
+            self._refresh_request = Request()
+        return self._refresh_request
+
+    def reset(self):
+        with self._lock:
+            self._clients.clear()
+
+
+# The sheet source in use; built from settings.PROCTOR_SHEET_SOURCE on first use
+sheets_clients = None
+_sheet_source_lock = threading.Lock()
+
+
+def get_sheet_source():
+    """
+    The configured sheet source (see SheetSourceModule). Defaults to the
+    Google-backed SheetsClientManager.
+    """
+    global sheets_clients
+    with _sheet_source_lock:
+        if sheets_clients is None:
+            source_path = getattr(settings, 'PROCTOR_SHEET_SOURCE', None)
+            if source_path:
+                source_class = import_string(source_path)
+                sheets_clients = source_class(**getattr(settings, 'PROCTOR_SHEET_SOURCE_OPTIONS', {}))
+            else:
+                sheets_clients = SheetsClientManager()
+        return sheets_clients
+
+
+def get_sheets_client(credentials_path='config/credentials.json', scopes=SHEETS_SCOPES):
+    """Shared authorized gspread client; credentials_path is relative to the core app"""
+    abs_credentials_path = os.path.join(settings.BASE_DIR, 'core', credentials_path)
+    return get_sheet_source().get_client(abs_credentials_path, scopes)
+
 
 def extract_sheet_id(sheet_url):
     """Extract the sheet ID from a Google Sheets URL."""
@@ -13,21 +110,220 @@ def extract_sheet_id(sheet_url):
     raise ValueError('Invalid Google Sheet URL')
 
 
-def get_questions_from_sheet(sheet_url, credentials_path='config/credentials.json', worksheet_index=0):
-    # Make the path absolute relative to the Django BASE_DIR
-    abs_credentials_path = os.path.join(settings.BASE_DIR, 'core', credentials_path)
-    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds = Credentials.from_service_account_file(abs_credentials_path, scopes=scopes)
-    client = gspread.authorize(creds)
+def hash_values(values):
+    """Content hash of a worksheet's rows"""
+    return hashlib.sha256(json.dumps(values).encode('utf-8')).hexdigest()
+
+
+class QuestionBank:
+    """Rows of one question worksheet as fetched, identified by a hash of their content"""
+
+    def __init__(self, sheet_id, worksheet_index, values, content_hash=None):
+        self.sheet_id = sheet_id
+        self.worksheet_index = worksheet_index
+        self.headers = values[0] if values else []
+        self.rows = values[1:] if values else []
+        self.content_hash = content_hash or hash_values(values)
+
+    @property
+    def questions(self):
+        return [dict(zip(self.headers, row)) for row in self.rows]
+
+
+class QuestionBankCache:
+    """
+    Thread-safe LRU cache of fetched question banks with a TTL.
+    Entries are keyed by sheet ID and worksheet; a lookup may also pin the
+    content hash, so a step can ask for exactly the rows an earlier step saw.
+    Banks are also kept by content hash in the shared Django cache, so a pinned
+    lookup from another process (e.g. the import worker after a preview in a
+    web process) finds them too; clear() only empties this process's copy.
+    """
+
+    def __init__(self, max_entries=64, ttl_seconds=900):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sheet_id, worksheet_index=0, content_hash=None):
+        key = (sheet_id, worksheet_index)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, bank = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            if content_hash is not None and bank.content_hash != content_hash:
+                return None
+            self._entries.move_to_end(key)
+            return bank
+
+    def get_shared(self, sheet_id, worksheet_index, content_hash):
+        """The bank with this content hash as stored by any process, or None"""
+        values = cache.get(self._shared_key(sheet_id, worksheet_index, content_hash))
+        if values is None:
+            return None
+        bank = QuestionBank(sheet_id, worksheet_index, values, content_hash)
+        self.put(bank, shared=False)
+        return bank
+
+    def put(self, bank, shared=True):
+        key = (bank.sheet_id, bank.worksheet_index)
+        if shared:
+            cache.set(self._shared_key(bank.sheet_id, bank.worksheet_index, bank.content_hash),
+                      [bank.headers] + bank.rows, self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), bank)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _shared_key(sheet_id, worksheet_index, content_hash):
+        return f'question_bank:{sheet_id}:{worksheet_index}:{content_hash}'
+
+
+question_bank_cache = QuestionBankCache()
+
+
+def fetch_question_bank(sheet_url, credentials_path='config/credentials.json', worksheet_index=0,
+                        content_hash=None):
+    """
+    Fetch a question worksheet as a QuestionBank.
+    Without content_hash the sheet is always read from Google and the cache is
+    refreshed. With content_hash the cached bank is reused if its content still
+    matches, so follow-up steps of one scheduling flow need no remote calls,
+    even when they run in another process.
+    """
     sheet_id = extract_sheet_id(sheet_url)
+    if content_hash:
+        bank = (question_bank_cache.get(sheet_id, worksheet_index, content_hash)
+                or question_bank_cache.get_shared(sheet_id, worksheet_index, content_hash))
+        if bank is not None:
+            return bank
+
+    client = get_sheets_client(credentials_path)
     sheet = client.open_by_key(sheet_id)
     worksheet = sheet.get_worksheet(worksheet_index)
-    all_data = worksheet.get_all_values()
-    if not all_data:
-        return []
-    headers = all_data[0]
-    questions = [dict(zip(headers, row)) for row in all_data[1:]]
-    return questions
+    if worksheet is None:
+        raise ValueError('No worksheets found in the Google Sheet')
+    bank = QuestionBank(sheet_id, worksheet_index, worksheet.get_all_values())
+    question_bank_cache.put(bank)
+    return bank
+
+
+class SheetRowStream:
+    """
+    Reads a question worksheet in row-range chunks instead of all at once.
+    The header row is fetched on its own first, so a malformed sheet can be
+    rejected before any data rows are downloaded.
+    """
+
+    def __init__(self, sheet_url, credentials_path='config/credentials.json', worksheet_index=0,
+                 chunk_rows=500):
+        client = get_sheets_client(credentials_path)
+        worksheet = client.open_by_key(extract_sheet_id(sheet_url)).get_worksheet(worksheet_index)
+        if worksheet is None:
+            raise ValueError('No worksheets found in the Google Sheet')
+        self.worksheet = worksheet
+        self.chunk_rows = chunk_rows
+        self.header = worksheet.row_values(1)
+        # Size of the grid, so an upper bound on the data rows; used for progress
+        self.total_rows = max(0, worksheet.row_count - 1)
+
+    def __iter__(self):
+        """Yield (sheet row number of the first row, list of row dicts) per chunk"""
+        width = len(self.header)
+        last_row = self.worksheet.row_count
+        start = 2
+        while width and start <= last_row:
+            end = min(start + self.chunk_rows - 1, last_row)
+            # The API drops trailing empty rows, so a short chunk is not necessarily the last one
+            values = self.worksheet.get_values(f"A{start}:{rowcol_to_a1(end, width)}")
+            if values:
+                yield start, [dict(zip(self.header, row)) for row in values]
+            start = end + 1
+
+
+def get_questions_from_sheet(sheet_url, credentials_path='config/credentials.json', worksheet_index=0,
+                             content_hash=None):
+    return fetch_question_bank(sheet_url, credentials_path, worksheet_index, content_hash).questions
+
+# A1 range without a sheet name, so it reads the first sheet like get_worksheet(0)
+QUESTION_RANGE = 'A:Z'
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class BatchFetchResult:
+    """Outcome of reading one spreadsheet in a batch fetch"""
+
+    def __init__(self, sheet_id):
+        self.sheet_id = sheet_id
+        self.banks = {}
+        self.error = None
+        self.api_calls = 0
+        self.elapsed = 0.0
+
+
+def _is_retryable(error):
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    # Dropped connections and timeouts from requests
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+
+def _batch_fetch_one(client, sheet_id, ranges, max_retries, base_delay):
+    result = BatchFetchResult(sheet_id)
+    start = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        result.api_calls += 1
+        try:
+            response = client.http_client.values_batch_get(sheet_id, list(ranges))
+            break
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                result.error = e
+                result.elapsed = time.perf_counter() - start
+                return result
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+
+    for range_name, value_range in zip(ranges, response.get('valueRanges', [])):
+        values = fill_gaps(value_range.get('values', []))
+        result.banks[range_name] = QuestionBank(sheet_id, 0, values)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def batch_fetch_question_banks(sheet_ranges, credentials_path='config/credentials.json', concurrency=4,
+                               max_retries=5, base_delay=1.0):
+    """
+    Read many spreadsheets with one values:batchGet call each instead of the
+    open/get_worksheet/get_all_values round trips of fetch_question_bank.
+    sheet_ranges maps sheet ID -> A1 ranges to read. Spreadsheets are fetched
+    concurrently, at most `concurrency` at a time; rate limits and server
+    errors are retried with exponential backoff.
+    Returns {sheet_id: BatchFetchResult}. Successful banks are also cached.
+    """
+    client = get_sheets_client(credentials_path)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='sheet-batch') as executor:
+        futures = {
+            sheet_id: executor.submit(_batch_fetch_one, client, sheet_id, ranges, max_retries, base_delay)
+            for sheet_id, ranges in sheet_ranges.items()
+        }
+        results = {sheet_id: future.result() for sheet_id, future in futures.items()}
+
+    for result in results.values():
+        if result.error is None and QUESTION_RANGE in result.banks:
+            question_bank_cache.put(result.banks[QUESTION_RANGE])
+    return results
 
 # if __name__ == "__main__":
 #     #extract_sheet_id('https://docs.google.com/spreadsheets/d/1USlaahbuzmbDO9FKAdRHC-TJ7Ll1YH3i2gv0C0gznG8/edit?gid=0#gid=0')
@@ -0,0 +1,240 @@
+"""
+Pluggable sources for question sheets.
+
+Everything that reads a sheet goes through SheetManagerModule.get_sheets_client(),
+which asks the configured sheet source for a gspread-compatible client. The
+default source is SheetsClientManager, which talks to Google. FakeSheetSource
+serves worksheets from memory or fixture files instead, with configurable
+latency and injected errors, so scheduling can be load-tested offline.
+
+Select a source in settings::
+
+    PROCTOR_SHEET_SOURCE = 'core.Modules.SheetSourceModule.FakeSheetSource'
+    PROCTOR_SHEET_SOURCE_OPTIONS = {'fixture_dir': BASE_DIR / 'sheet_fixtures', 'latency': 0.2}
+"""
+
+import csv
+import json
+import os
+import random
+import threading
+import time
+
+import gspread
+from gspread.utils import a1_range_to_grid_range, fill_gaps
+
+
+class SheetSource:
+    """
+    Interface for sheet sources. get_client() returns an object implementing
+    the part of gspread.Client the app uses: open_by_key(), the returned
+    spreadsheet's get_worksheet(), the worksheet's get_all_values(),
+    row_values(), get_values() and row_count, and http_client.values_batch_get().
+    """
+
+    def get_client(self, credentials_path, scopes=None):
+        raise NotImplementedError
+
+
+class _FakeResponse:
+    """Just enough of requests.Response for gspread.exceptions.APIError"""
+
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.text = message
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text, 'status': 'FAKE_ERROR'}}
+
+
+class FakeSheetSource(SheetSource):
+    """
+    Offline sheet source serving worksheets from memory or fixture files.
+
+    sheets maps a sheet ID to its rows (one worksheet) or to a list of
+    worksheets. Sheets not registered are looked up in fixture_dir as
+    <sheet_id>.csv, .xlsx (first worksheet) or .json (rows, or a list of
+    worksheets).
+
+    Every API call sleeps latency seconds plus up to jitter seconds. With
+    error_rate a call fails with a gspread APIError of error_status at that
+    probability; fail_next() queues deterministic failures.
+    """
+
+    def __init__(self, sheets=None, fixture_dir=None, latency=0.0, jitter=0.0, auth_latency=0.0,
+                 error_rate=0.0, error_status=503, seed=None):
+        self.sheets = {}
+        self.fixture_dir = str(fixture_dir) if fixture_dir else None
+        self.latency = latency
+        self.jitter = jitter
+        self.auth_latency = auth_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = {}
+        self._random = random.Random(seed)
+        self._queued_errors = []
+        self._authorized = False
+        self._lock = threading.Lock()
+        for sheet_id, rows in (sheets or {}).items():
+            self.add_sheet(sheet_id, rows)
+
+    def add_sheet(self, sheet_id, rows, worksheet_index=None):
+        """Register rows as a sheet's only worksheet, or as one worksheet of it"""
+        with self._lock:
+            if worksheet_index is None:
+                # A list of worksheets is a list of lists of rows
+                is_multi = rows and isinstance(rows[0], list) and rows[0] and isinstance(rows[0][0], list)
+                self.sheets[sheet_id] = [list(ws) for ws in rows] if is_multi else [list(rows)]
+            else:
+                worksheets = self.sheets.setdefault(sheet_id, [])
+                while len(worksheets) <= worksheet_index:
+                    worksheets.append([])
+                worksheets[worksheet_index] = list(rows)
+
+    def fail_next(self, count=1, status=None):
+        """Make the next `count` API calls fail with the given HTTP status"""
+        with self._lock:
+            self._queued_errors.extend([status or self.error_status] * count)
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = {}
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def get_client(self, credentials_path, scopes=None):
+        with self._lock:
+            first = not self._authorized
+            self._authorized = True
+        if first and self.auth_latency:
+            time.sleep(self.auth_latency)
+        return _FakeClient(self)
+
+    def _call(self, name):
+        """Account for one API call: latency, then maybe an injected error"""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            status = self._queued_errors.pop(0) if self._queued_errors else None
+            if status is None and self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if status is not None:
+            raise gspread.exceptions.APIError(_FakeResponse(status, f'Injected error on {name}'))
+
+    def _worksheets(self, sheet_id):
+        with self._lock:
+            worksheets = self.sheets.get(sheet_id)
+        if worksheets is None:
+            worksheets = self._load_fixture(sheet_id)
+        if worksheets is None:
+            raise gspread.exceptions.APIError(_FakeResponse(404, f'Requested entity was not found: {sheet_id}'))
+        return worksheets
+
+    def _load_fixture(self, sheet_id):
+        if not self.fixture_dir:
+            return None
+        base = os.path.join(self.fixture_dir, sheet_id)
+        if os.path.exists(base + '.csv'):
+            with open(base + '.csv', newline='', encoding='utf-8-sig') as f:
+                worksheets = [list(csv.reader(f))]
+        elif os.path.exists(base + '.xlsx'):
+            from .QuestionFileModule import parse_xlsx
+            with open(base + '.xlsx', 'rb') as f:
+                worksheets = [parse_xlsx(f)]
+        elif os.path.exists(base + '.json'):
+            with open(base + '.json', encoding='utf-8') as f:
+                data = json.load(f)
+            is_multi = data and isinstance(data[0], list) and data[0] and isinstance(data[0][0], list)
+            worksheets = data if is_multi else [data]
+        else:
+            return None
+        with self._lock:
+            self.sheets[sheet_id] = worksheets
+        return worksheets
+
+
+def _trim(values):
+    """Drop trailing empty rows and pad the rest, as the Sheets API and gspread do"""
+    values = [list(row) for row in values]
+    while values and not any(str(cell) for cell in values[-1]):
+        values.pop()
+    return fill_gaps(values) if values else []
+
+
+def _read_range(rows, range_name):
+    if '!' in range_name:
+        range_name = range_name.rsplit('!', 1)[1]
+    grid = a1_range_to_grid_range(range_name)
+    row_slice = rows[grid.get('startRowIndex', 0):grid.get('endRowIndex', len(rows))]
+    start_col = grid.get('startColumnIndex', 0)
+    end_col = grid.get('endColumnIndex')
+    return _trim([row[start_col:end_col] for row in row_slice])
+
+
+class _FakeWorksheet:
+    def __init__(self, source, rows):
+        self.source = source
+        self.rows = rows
+
+    @property
+    def row_count(self):
+        # Google sheets come with spare empty rows; mimic the default grid
+        return max(1000, len(self.rows))
+
+    def get_all_values(self):
+        self.source._call('get_all_values')
+        return _trim(self.rows)
+
+    def row_values(self, row):
+        self.source._call('row_values')
+        values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def get_values(self, range_name=None):
+        self.source._call('get_values')
+        if range_name is None:
+            return _trim(self.rows)
+        return _read_range(self.rows, range_name)
+
+
+class _FakeSpreadsheet:
+    def __init__(self, source, sheet_id, worksheets):
+        self.source = source
+        self.id = sheet_id
+        self.worksheets = worksheets
+
+    def get_worksheet(self, index):
+        self.source._call('fetch_sheet_metadata')
+        if index >= len(self.worksheets):
+            return None
+        return _FakeWorksheet(self.source, self.worksheets[index])
+
+
+class _FakeHTTPClient:
+    def __init__(self, source):
+        self.source = source
+
+    def values_batch_get(self, id, ranges, params=None):
+        self.source._call('values_batch_get')
+        worksheets = self.source._worksheets(id)
+        first = worksheets[0] if worksheets else []
+        return {
+            'spreadsheetId': id,
+            'valueRanges': [{'range': range_name, 'values': _read_range(first, range_name)} for range_name in ranges],
+        }
+
+
+class _FakeClient:
+    def __init__(self, source):
+        self.source = source
+        self.http_client = _FakeHTTPClient(source)
+
+    def open_by_key(self, key):
+        self.source._call('open_by_key')
+        return _FakeSpreadsheet(self.source, key, self.source._worksheets(key))
@@ -0,0 +1,200 @@
+"""
+Streaming import of user accounts from an uploaded CSV file.
+
+The file is decoded and parsed row by row straight from the upload (Django
+keeps large uploads in a temporary file), so memory use does not grow with
+the file. Valid rows are collected into batches and created with
+provision_users(), which checks existing accounts with one query per batch.
+Problems are reported per row in a CSV kept in the database for download, and
+welcome emails are queued in the outbox, in the transaction that creates
+their batch, instead of being sent in the request.
+
+Expected columns (header names are case-insensitive)::
+
+    Email, User Type[, First Name, Last Name]
+
+"User Type" (or "Role") is Student or Faculty, as in the onboarding sheet.
+"""
+
+import codecs
+import csv
+import io
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.utils import timezone
+
+from core.models import UserImportReport
+from .OutboxModule import enqueue_emails
+from .UserProvisioningModule import DEFAULT_BATCH_SIZE, hashing_pool, provision_users
+
+HEADER_ALIASES = {
+    'email': 'email',
+    'email address': 'email',
+    'user type': 'user_type',
+    'role': 'user_type',
+    'first name': 'first_name',
+    'last name': 'last_name',
+}
+REPORT_RETENTION = timedelta(hours=24)
+REPORT_COLUMNS = ['Row', 'Email', 'Status', 'Details']
+
+WELCOME_SUBJECT = "Your Smart Face Proctor System Login"
+WELCOME_BODY = (
+    "Hello {user_type},\n\n"
+    "Your ID is: {user_id}\n"
+    "Your password is: {password}\n\n"
+    "Best Regards,\nSmart Face Proctor System"
+)
+
+
+class UserImportError(Exception):
+    """The file as a whole cannot be imported (e.g. a missing column)"""
+
+
+class UserImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.skipped = 0
+        self.problems = []
+        self.emails_queued = 0
+        self.elapsed = 0.0
+        self.report_token = None
+
+    def add_problem(self, row_number, email, status, details):
+        self.problems.append((row_number, email, status, details))
+
+    def summary(self):
+        text = f'{self.created} of {self.rows} user(s) created'
+        if self.skipped:
+            text += f', {self.skipped} already existed'
+        errors = len(self.problems) - self.skipped
+        if errors:
+            text += f', {errors} row(s) with errors'
+        if self.emails_queued:
+            text += f'; {self.emails_queued} welcome email(s) queued'
+        return text
+
+
+def _read_rows(uploaded_file):
+    """Yield (row_number, dict) from the upload without reading it into memory"""
+    uploaded_file.seek(0)
+    reader = csv.reader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    header = next(reader, None)
+    if not header:
+        raise UserImportError('The file is empty.')
+    columns = [HEADER_ALIASES.get(name.strip().lower()) for name in header]
+    missing = {'email', 'user_type'} - set(columns)
+    if missing:
+        raise UserImportError('Missing column(s): ' + ', '.join(
+            'Email' if name == 'email' else 'User Type' for name in sorted(missing)))
+    for row_number, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        yield row_number, {field: value.strip() for field, value in zip(columns, row) if field}
+
+
+def _queue_welcome_emails(created):
+    enqueue_emails([
+        (user.email, WELCOME_SUBJECT,
+         WELCOME_BODY.format(user_type=user.user_type.title(), user_id=user.username, password=user.password))
+        for user in created
+    ], kind='welcome')
+
+
+def _import_batch(batch, generate, result, send_welcome, executor):
+    # The welcome emails are queued in the transaction that creates the batch
+    provisioned = provision_users(
+        [(values['email'], values['user_type'],
+          {'first_name': values.get('first_name', ''), 'last_name': values.get('last_name', '')})
+         for _, values in batch],
+        generate,
+        batch_size=len(batch),
+        executor=executor,
+        on_batch=_queue_welcome_emails if send_welcome else None,
+    )
+    rows_by_email = {values['email'].lower(): row_number for row_number, values in batch}
+
+    def row_of(email):
+        return rows_by_email.get(email.lower())
+
+    result.created += len(provisioned.created)
+    if send_welcome:
+        result.emails_queued += len(provisioned.created)
+    for email in provisioned.skipped:
+        result.skipped += 1
+        result.add_problem(row_of(email), email, 'skipped', 'A user with this email already exists')
+    for email, error in provisioned.failed.items():
+        result.add_problem(row_of(email), email, 'error', error)
+
+
+def import_users_from_csv(uploaded_file, generate, batch_size=DEFAULT_BATCH_SIZE, send_welcome=True):
+    """
+    Create users from an uploaded CSV; generate(user_type) returns a
+    (username, password) pair. Returns a UserImportResult whose report_token
+    fetches the per-row report with get_import_report() when there were
+    problems. Raises UserImportError if the file cannot be read at all.
+    """
+    start = time.perf_counter()
+    result = UserImportResult()
+    seen = set()
+    batch = []
+
+    try:
+        with hashing_pool() as executor:
+            for row_number, values in _read_rows(uploaded_file):
+                result.rows += 1
+                email = values.get('email', '')
+                user_type = values.get('user_type', '').lower()
+                try:
+                    validate_email(email)
+                except ValidationError:
+                    result.add_problem(row_number, email, 'error', 'Invalid email address')
+                    continue
+                if user_type not in ('student', 'faculty'):
+                    result.add_problem(row_number, email, 'error', 'User Type must be Student or Faculty')
+                    continue
+                # Duplicates within the file; those already in the database are found per batch
+                if email.lower() in seen:
+                    result.add_problem(row_number, email, 'error', 'Email repeated earlier in the file')
+                    continue
+                seen.add(email.lower())
+                values['user_type'] = user_type
+                batch.append((row_number, values))
+                if len(batch) >= batch_size:
+                    _import_batch(batch, generate, result, send_welcome, executor)
+                    batch = []
+            if batch:
+                _import_batch(batch, generate, result, send_welcome, executor)
+    except UnicodeDecodeError:
+        raise UserImportError('The file is not UTF-8 encoded CSV.')
+    except csv.Error as e:
+        raise UserImportError(f'Cannot read the CSV file: {e}')
+
+    if result.problems:
+        result.report_token = uuid.uuid4().hex
+        now = timezone.now()
+        UserImportReport.objects.filter(created_at__lt=now - REPORT_RETENTION).delete()
+        UserImportReport.objects.create(token=result.report_token, content=_build_report(result), created_at=now)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _build_report(result):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_COLUMNS)
+    writer.writerows(sorted(result.problems, key=lambda problem: problem[0] or 0))
+    return buffer.getvalue()
+
+
+def get_import_report(token):
+    """The report CSV text of an import, or None once it has expired"""
+    report = UserImportReport.objects.filter(
+        token=token, created_at__gte=timezone.now() - REPORT_RETENTION
+    ).first()
+    return report.content if report is not None else None
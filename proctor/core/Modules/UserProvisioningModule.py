@@ -0,0 +1,210 @@
+"""
+Bulk creation of user accounts, e.g. a whole cohort from the onboarding sheet.
+
+Creating users one at a time costs an existence query, an INSERT and a full
+PBKDF2 hash per user, all in series. provision_users() instead checks every
+email and generated username with one query per batch, hashes the passwords
+on a process pool (hashing is CPU bound, so threads would not help) and
+inserts each batch with bulk_create.
+"""
+
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from core.models import User
+
+DEFAULT_BATCH_SIZE = 1000
+HASH_CHUNK_SIZE = 50
+MAX_USERNAME_ATTEMPTS = 10
+
+
+class ProvisionedUser:
+    def __init__(self, email, user_type, username, password, fields=None):
+        self.email = email
+        self.user_type = user_type
+        self.username = username
+        self.password = password
+        self.fields = fields or {}
+
+
+class ProvisioningResult:
+    """Accounts created (with their plaintext passwords, for the welcome email), skipped and failed"""
+
+    def __init__(self):
+        self.created = []
+        self.skipped = []
+        self.failed = {}
+        self.elapsed = 0.0
+        self.hash_time = 0.0
+
+    def summary(self):
+        rate = len(self.created) / self.elapsed if self.elapsed else 0
+        text = (f'{len(self.created)} user(s) created in {self.elapsed:.1f}s ({rate:.0f}/s, '
+                f'{self.hash_time:.1f}s hashing), {len(self.skipped)} already existed')
+        if self.failed:
+            text += f', {len(self.failed)} failed'
+        return text
+
+
+def _hash_chunk(passwords, hasher='default'):
+    return [make_password(password, hasher=hasher) for password in passwords]
+
+
+def hash_passwords(passwords, executor=None, hasher='default'):
+    """
+    Hash passwords with hasher (as for make_password: the configured one by
+    default), spread over executor's processes if given.
+    """
+    if executor is None or len(passwords) <= HASH_CHUNK_SIZE:
+        return _hash_chunk(passwords, hasher)
+    chunks = [passwords[i:i + HASH_CHUNK_SIZE] for i in range(0, len(passwords), HASH_CHUNK_SIZE)]
+    hashed = []
+    for chunk in executor.map(functools.partial(_hash_chunk, hasher=hasher), chunks):
+        hashed.extend(chunk)
+    return hashed
+
+
+def _assign_usernames(pending, generate, result):
+    """
+    Give every pending user a username that is neither taken in the database
+    nor used twice in the batch; random IDs collide now and then.
+    """
+    taken = set()
+    unresolved = pending
+    for _ in range(MAX_USERNAME_ATTEMPTS):
+        for user in unresolved:
+            user.username, user.password = generate(user.user_type)
+        candidates = {user.username for user in unresolved}
+        taken |= set(User.objects.filter(username__in=candidates).values_list('username', flat=True))
+        retry = []
+        for user in unresolved:
+            if user.username in taken:
+                retry.append(user)
+            else:
+                taken.add(user.username)
+        unresolved = retry
+        if not unresolved:
+            return pending
+    for user in unresolved:
+        result.failed[user.email] = 'Could not generate a unique user ID'
+    return [user for user in pending if user not in unresolved]
+
+
+def _insert(users, hashed, result):
+    """Create the users; returns the ones created, which are also added to result"""
+    objects = [
+        User(username=User.normalize_username(user.username), email=user.email, password=password,
+             role='Student' if user.user_type == 'student' else 'Faculty', **user.fields)
+        for user, password in zip(users, hashed)
+    ]
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(objects)
+        result.created.extend(users)
+        return users
+    except IntegrityError:
+        pass
+    # Another request created one of these users meanwhile; find out which, row by row
+    created = []
+    for user, obj in zip(users, objects):
+        try:
+            with transaction.atomic():
+                obj.save(force_insert=True)
+            created.append(user)
+        except IntegrityError as e:
+            result.failed[user.email] = f'Already exists: {e}'
+    result.created.extend(created)
+    return created
+
+
+@contextmanager
+def hashing_pool(processes=None):
+    """
+    Process pool for hash_passwords, or None when hashing in this process.
+    Spawned rather than forked: a fork of a threaded web process can inherit
+    held locks and open database connections. Workers set Django up
+    themselves; they start on first use, so an unused pool costs nothing.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1:
+        yield None
+        return
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=django.setup)
+    try:
+        yield executor
+    finally:
+        executor.shutdown()
+
+
+def provision_users(entries, generate, batch_size=DEFAULT_BATCH_SIZE, processes=None, hasher='default',
+                    executor=None, on_batch=None):
+    """
+    Create accounts for (email, user_type) pairs, or (email, user_type, fields)
+    with fields a dict of further User fields such as first_name; user_type
+    is 'student' or 'faculty'. generate(user_type) returns a (username, password) pair, as
+    SmartFaceProctorMailer.generate_user_id_and_password does. Emails that
+    already have an account, or repeat earlier in entries, are skipped.
+    processes is the size of the hashing pool (default: one per CPU; 1 hashes
+    in this process) unless a hashing_pool() executor is passed, and hasher is
+    passed to make_password, e.g. a faster PasswordHasher for benchmarks.
+    Passwords are hashed before any transaction is opened. on_batch(created)
+    runs in the transaction that inserts each batch, e.g. to queue welcome
+    emails, so the batch is rolled back if it fails; the plaintext passwords
+    are then cleared from the result. Returns a ProvisioningResult.
+    """
+    result = ProvisioningResult()
+    start = time.perf_counter()
+
+    users = []
+    seen = set()
+    for email, user_type, *fields in entries:
+        email = User.objects.normalize_email((email or '').strip())
+        user_type = (user_type or '').strip().lower()
+        if not email:
+            continue
+        if email.lower() in seen:
+            result.skipped.append(email)
+            continue
+        if user_type not in ('student', 'faculty'):
+            result.failed[email] = f'Unknown user type: {user_type}'
+            continue
+        seen.add(email.lower())
+        users.append(ProvisionedUser(email, user_type, None, None, fields[0] if fields else None))
+
+    if executor is not None or len(users) <= HASH_CHUNK_SIZE:
+        pool = nullcontext(executor)
+    else:
+        pool = hashing_pool(processes)
+    with pool as executor:
+        for i in range(0, len(users), batch_size):
+            batch = users[i:i + batch_size]
+            existing = set(User.objects.filter(email__in=[user.email for user in batch])
+                           .values_list('email', flat=True))
+            result.skipped.extend(user.email for user in batch if user.email in existing)
+            batch = _assign_usernames([user for user in batch if user.email not in existing], generate, result)
+            if not batch:
+                continue
+
+            hash_start = time.perf_counter()
+            hashed = hash_passwords([user.password for user in batch], executor, hasher)
+            result.hash_time += time.perf_counter() - hash_start
+            if on_batch is None:
+                _insert(batch, hashed, result)
+                continue
+            with transaction.atomic():
+                created = _insert(batch, hashed, result)
+                on_batch(created)
+            for user in created:
+                user.password = None
+
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -1,14 +1,22 @@
 import os
-import json
-import gspread
 import random
 import string
 from email.message import EmailMessage
-import smtplib
-from oauth2client.service_account import ServiceAccountCredentials
+from datetime import timedelta
 from pathlib import Path
 
+from django.db import transaction
+
 from core.models import User
+from .ConfigCacheModule import load_json_config
+from .OutboxModule import cancel_queued_emails, enqueue_email, enqueue_emails
+from .SheetManagerModule import get_sheets_client
+from .SMTPPoolModule import get_smtp_pool
+from .UserImportModule import import_users_from_csv
+from .UserProvisioningModule import DEFAULT_BATCH_SIZE, provision_users
+
+# Matches PasswordResetOTP.is_expired
+OTP_VALID_MINUTES = 15
 
 class SmartFaceProctorMailer:
     def __init__(self,
@@ -25,7 +33,8 @@ class SmartFaceProctorMailer:
         self.sheet_url = sheet_url
         self.sheet_name = sheet_name
         self.password_length = password_length
-        self.smtp_creds = self._load_smtp_credentials()
+        # Fail early if the file is missing; smtp_creds reads through the config cache
+        self._load_smtp_credentials()
         if self.google_credentials_path and self.sheet_url:
             self.sheet = self._get_google_sheet()
             self.recipients = self._collect_recipients()
@@ -35,16 +44,20 @@ class SmartFaceProctorMailer:
             self.recipients = []
 
     def _load_smtp_credentials(self):
-        with open(self.smtp_credentials_path, 'r') as f:
-            return json.load(f)
+        # Served from memory; the file is re-read only when it changes on disk
+        return load_json_config(self.smtp_credentials_path)
+
+    @property
+    def smtp_creds(self):
+        return self._load_smtp_credentials()
 
     def _get_google_sheet(self):
         scope = [
             'https://spreadsheets.google.com/feeds',
             'https://www.googleapis.com/auth/drive'
         ]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(self.google_credentials_path, scope)
-        client = gspread.authorize(creds)
+        # Shared, already authorized client instead of a new token exchange per mailer
+        client = get_sheets_client(self.google_credentials_path, scopes=tuple(scope))
         sheet = client.open_by_url(self.sheet_url).worksheet(self.sheet_name)
         return sheet
 
@@ -111,30 +124,29 @@ class SmartFaceProctorMailer:
                 'error': f'Error resetting password: {str(e)}'
             }
 
-    def send_email(self, recipient, subject, body):
+    def build_message(self, recipient, subject, body):
         msg = EmailMessage()
         msg.set_content(body)
         msg['Subject'] = subject
         msg['From'] = self.smtp_creds['FROM_EMAIL']
         msg['To'] = recipient
+        return msg
+
+    def send_email(self, recipient, subject, body):
+        msg = self.build_message(recipient, subject, body)
         
         try:
-            with smtplib.SMTP_SSL(self.smtp_creds['SMTP_HOST'], self.smtp_creds['SMTP_PORT']) as smtp:
-                smtp.login(self.smtp_creds['SMTP_USER'], self.smtp_creds['SMTP_API_KEY'])
-                smtp.send_message(msg)
+            # Reuses a logged-in connection instead of a new TLS session per message
+            get_smtp_pool(self.smtp_creds).send_message(msg)
             print(f"Sent email to {recipient}")
             return True
         except Exception as e:
             print(f"Failed to send email to {recipient}: {e}")
             return False
 
-    def send_password_reset_email(self, email):
-        """Send password reset email with existing ID and new password"""
-        result = self.reset_user_password(email)
-        
-        if result['success']:
-            subject = "Password Reset - Smart Face Proctor"
-            body = f"""
+    def _password_reset_content(self, result):
+        subject = "Password Reset - Smart Face Proctor"
+        body = f"""
             Hello {result['user_name']},
             
             Your password has been reset successfully.
@@ -148,6 +160,14 @@ class SmartFaceProctorMailer:
             Best regards,
             Smart Face Proctor Team
             """
+        return subject, body
+
+    def send_password_reset_email(self, email):
+        """Send password reset email with existing ID and new password"""
+        result = self.reset_user_password(email)
+        
+        if result['success']:
+            subject, body = self._password_reset_content(result)
             
             email_sent = self.send_email(email, subject, body)
             if email_sent:
@@ -163,28 +183,66 @@ class SmartFaceProctorMailer:
         else:
             return result
 
-    def send_otp_email(self, email, otp):
-        """Send OTP email for password reset"""
-        try:
-            # Find user by email
-            from ..models import User
-            user = User.objects.get(email=email)
-            user_name = user.get_full_name() or user.username
-            
-            subject = "Password Reset OTP - Smart Face Proctor"
-            body = f"""
+    def queue_password_reset_email(self, email):
+        """Like send_password_reset_email, but leaves the sending to the outbox worker"""
+        result = self.reset_user_password(email)
+        if not result['success']:
+            return result
+        subject, body = self._password_reset_content(result)
+        enqueue_email(email, subject, body, kind='password_reset')
+        return {
+            'success': True,
+            'message': f'Password reset email sent to {email}. Please check your inbox.'
+        }
+
+    def _otp_content(self, user, otp):
+        user_name = user.get_full_name() or user.username
+        subject = "Password Reset OTP - Smart Face Proctor"
+        body = f"""
             Hello {user_name},
             
             You have requested to reset your password.
             
             Your OTP (One-Time Password) is: {otp}
             
-            This OTP is valid for 15 minutes only.
+            This OTP is valid for {OTP_VALID_MINUTES} minutes only.
             If you didn't request this password reset, please ignore this email.
             
             Best regards,
             Smart Face Proctor Team
             """
+        return subject, body
+
+    def queue_otp_email(self, email, otp):
+        """
+        Like send_otp_email, but only adds the email to the outbox; the
+        send_queued_emails worker delivers it. It is dropped if still unsent
+        when the OTP expires, and so are the user's earlier OTP emails that are
+        still waiting, since the new OTP replaces theirs.
+        """
+        try:
+            user = User.objects.get(email=email)
+        except User.DoesNotExist:
+            return {
+                'success': False,
+                'error': 'No user found with this email address.'
+            }
+        subject, body = self._otp_content(user, otp)
+        with transaction.atomic():
+            cancel_queued_emails(email, 'otp', reason='Superseded by a newer OTP')
+            enqueue_email(email, subject, body, kind='otp', expires_in=timedelta(minutes=OTP_VALID_MINUTES))
+        return {
+            'success': True,
+            'message': f'OTP sent to {email}. Please check your inbox.'
+        }
+
+    def send_otp_email(self, email, otp):
+        """Send OTP email for password reset"""
+        try:
+            # Find user by email
+            from ..models import User
+            user = User.objects.get(email=email)
+            subject, body = self._otp_content(user, otp)
             
             email_sent = self.send_email(email, subject, body)
             
@@ -235,24 +293,44 @@ class SmartFaceProctorMailer:
             print(f"Failed to create user in database: {e}")
             return False
 
-    def process_and_send(self, subject, body_template):
+    def import_users_from_csv(self, csv_file, send_welcome=True):
+        """
+        Create the users listed in an uploaded CSV (Email, User Type[, First
+        Name, Last Name]) and queue their welcome emails in the outbox.
+        Returns a UserImportResult; see UserImportModule.
+        """
+        result = import_users_from_csv(csv_file, self.generate_user_id_and_password, send_welcome=send_welcome)
+        print(f"CSV import: {result.summary()}")
+        return result
+
+    def process_and_queue(self, subject, body_template, batch_size=DEFAULT_BATCH_SIZE):
         """
         body_template should be a str with two placeholders:
         {user_id} and {password}
+        Users are created in bulk (see UserProvisioningModule); each batch's
+        login emails are queued in the outbox in the transaction that creates
+        the batch, so no account exists without its email. Returns the
+        ProvisioningResult, whose plaintext passwords are already cleared.
         """
-        for row, email, user_type in self.recipients:
-            try:
-                user_id, password = self.generate_user_id_and_password(user_type)
-                # First create the user in database
-                if self.create_user(email, user_type, user_id, password):
-                    # If user creation successful, send email
-                    body = body_template.format(
-                        user_type=user_type.title(),
-                        user_id=user_id,
-                        password=password
-                    )
-                    self.send_email(email, subject, body)
-                else:
-                    print(f"Skipping email for {email} due to database error")
-            except Exception as e:
-                print(f"Could not process user at {email}: {e}")
\ No newline at end of file
+        def queue_logins(created):
+            enqueue_emails([
+                (user.email, subject, body_template.format(
+                    user_type=user.user_type.title(),
+                    user_id=user.username,
+                    password=user.password
+                ))
+                for user in created
+            ], kind='welcome')
+
+        result = provision_users(
+            ((email, user_type) for row, email, user_type in self.recipients),
+            self.generate_user_id_and_password,
+            batch_size=batch_size,
+            on_batch=queue_logins,
+        )
+        print(f"Provisioning: {result.summary()}")
+        for email in result.skipped:
+            print(f"User with email {email} already exists - skipping")
+        for email, error in result.failed.items():
+            print(f"Could not process user at {email}: {error}")
+        return result
@@ -4,9 +4,17 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import User, BugReport
+from django.db.models import Q
+from django.utils import timezone
+from .models import User, BugReport, BackgroundTaskStatus, OutboundEmail
 import os
-from django.conf import settings
+import threading
+from datetime import timedelta
+from django import db
+
+SHEET_EMAIL_TASK = 'sheet_emails'
+# A run still marked running after this long belongs to a process that died
+SHEET_EMAIL_LOCK_TIMEOUT = timedelta(hours=6)
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'role', 'is_active')
@@ -24,11 +32,28 @@ class UserAdmin(admin.ModelAdmin):
             extra_context = {}
         send_url = reverse('admin:send-sheet-emails')
         extra_context['send_sheet_emails_url'] = send_url
+        extra_context['sheet_email_status'] = BackgroundTaskStatus.objects.filter(name=SHEET_EMAIL_TASK).first()
         return super().changelist_view(request, extra_context=extra_context)
 
     def send_sheet_emails(self, request):
+        BackgroundTaskStatus.objects.get_or_create(name=SHEET_EMAIL_TASK)
+        # The conditional UPDATE lets only one request, in any process, start a run
+        now = timezone.now()
+        claimed = BackgroundTaskStatus.objects.filter(name=SHEET_EMAIL_TASK).filter(
+            Q(running=False) | Q(started_at__lt=now - SHEET_EMAIL_LOCK_TIMEOUT)
+        ).update(running=True, summary='Reading the sheet...', failed=[], started_at=now, finished_at=None)
+        if not claimed:
+            self.message_user(request, "Sheet emails are already being sent.", level=messages.WARNING)
+            return redirect('..')
+        # Reading the sheet and creating thousands of users takes far too long for a
+        # request; the login emails themselves are sent by the send_queued_emails worker
+        threading.Thread(target=self._send_sheet_emails, name='sheet-emails', daemon=True).start()
+        self.message_user(request, "Creating users in the background. Reload this page for the result; "
+                                   "the login emails are sent from the outbox.", level=messages.SUCCESS)
+        return redirect('..')
+
+    def _send_sheet_emails(self):
         from core.Modules.send_email_using_sheets import SmartFaceProctorMailer
-        import os
         BASE_DIR = os.path.dirname(os.path.abspath(__file__))
         smtp_credentials_path = os.path.join(BASE_DIR, 'config', 'SMTP_credentials.json')
         google_credentials_path = os.path.join(BASE_DIR, 'config', 'credentials.json')
@@ -36,13 +61,6 @@ class UserAdmin(admin.ModelAdmin):
         sheet_url = "https://docs.google.com/spreadsheets/d/1682Pl8z4Ix4IxI7UGfbZgcX6p_gzMpRl2tRi0_my9kI/edit?gid=0#gid=0"
         sheet_name = 'Sheet1'
         password_length = 12
-        mailer = SmartFaceProctorMailer(
-            smtp_credentials_path=smtp_credentials_path,
-            google_credentials_path=google_credentials_path,
-            sheet_url=sheet_url,
-            sheet_name=sheet_name,
-            password_length=password_length
-        )
         email_subject = "Your Smart Face Proctor System Login"
         email_body_template = (
             "Hello {user_type},\n\n"
@@ -51,11 +69,24 @@ class UserAdmin(admin.ModelAdmin):
             "Best Regards,\nSmart Face Proctor System"
         )
         try:
-            mailer.process_and_send(email_subject, email_body_template)
-            self.message_user(request, "Emails sent successfully to all users in the sheet.", level=messages.SUCCESS)
+            mailer = SmartFaceProctorMailer(
+                smtp_credentials_path=smtp_credentials_path,
+                google_credentials_path=google_credentials_path,
+                sheet_url=sheet_url,
+                sheet_name=sheet_name,
+                password_length=password_length
+            )
+            result = mailer.process_and_queue(email_subject, email_body_template)
+            summary = f"{result.summary()}; {len(result.created)} login email(s) queued"
+            failed = list(result.failed.items())[:50]
         except Exception as e:
-            self.message_user(request, f"Error sending emails: {e}", level=messages.ERROR)
-        return redirect('..')
+            summary, failed = f"Error sending emails: {e}", []
+        try:
+            BackgroundTaskStatus.objects.filter(name=SHEET_EMAIL_TASK).update(
+                running=False, summary=summary, failed=failed, finished_at=timezone.now()
+            )
+        finally:
+            db.connection.close()
 
 admin.site.register(User, UserAdmin)
 
@@ -70,3 +101,14 @@ class BugReportAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('reporter')
 
 admin.site.register(BugReport, BugReportAdmin)
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'kind', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('recipient', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'claimed_at', 'claim_token')
+    # Bodies hold OTPs and passwords
+    exclude = ('body',)
+    list_per_page = 50
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
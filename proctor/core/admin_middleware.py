@@ -1,12 +1,16 @@
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+
 class AdminSecurityMiddleware:
     """
     Middleware to enhance security for admin routes
@@ -40,8 +44,8 @@ class AdminSecurityMiddleware:
                     messages.warning(request, 'Your session has expired. Please log in again.')
                     return redirect('login')
                 
-                # Update last activity
-                request.session['last_activity'] = timezone.now().isoformat()
+                # Update last activity, at most once per SESSION_ACTIVITY_GRANULARITY
+                self._touch_activity(request)
                 
                 # Log admin activity
                 self._log_admin_activity(request)
@@ -68,6 +72,19 @@ class AdminSecurityMiddleware:
         except (ValueError, TypeError):
             return True
     
+    def _touch_activity(self, request):
+        """Write last_activity only once it is older than the granularity, so the session is not saved every request"""
+        now = timezone.now()
+        try:
+            last_activity_time = timezone.datetime.fromisoformat(request.session.get('last_activity'))
+            if timezone.is_naive(last_activity_time):
+                last_activity_time = timezone.make_aware(last_activity_time)
+            if (now - last_activity_time).total_seconds() < getattr(settings, 'SESSION_ACTIVITY_GRANULARITY', 60):
+                return
+        except (ValueError, TypeError):
+            pass
+        request.session['last_activity'] = now.isoformat()
+    
     def _log_admin_activity(self, request):
         """Log admin activities for audit purposes"""
         try:
@@ -104,29 +121,20 @@ class AdminRateLimitMiddleware:
         if method not in self.rate_limits:
             return False
         
-        # Use session to track requests
-        session_key = f'admin_rate_limit_{method}'
-        current_time = timezone.now()
-        
-        # Get existing requests from session
-        requests_data = request.session.get(session_key, [])
-        
-        # Filter requests from the last minute
-        one_minute_ago = current_time - timedelta(minutes=1)
-        recent_requests = [
-            req_time for req_time in requests_data 
-            if timezone.datetime.fromisoformat(req_time) > one_minute_ago
-        ]
+        # Count requests per admin and minute in the shared cache rather than
+        # keeping a list of timestamps in the session, which was rewritten every request
+        window = int(time.time() // 60)
+        cache_key = f'admin_rate_limit:{request.user.pk}:{method}:{window}'
+        cache.add(cache_key, 0, 60)
+        try:
+            request_count = cache.incr(cache_key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(cache_key, 1, 60)
+            request_count = 1
         
         # Check if limit exceeded
-        if len(recent_requests) >= self.rate_limits[method]:
-            return True
-        
-        # Add current request
-        recent_requests.append(current_time.isoformat())
-        request.session[session_key] = recent_requests
-        
-        return False
+        return request_count > self.rate_limits[method]
 
 
 class AdminAuditMiddleware:
@@ -174,18 +182,6 @@ class AdminAuditMiddleware:
                 
                 # Log to file or database
                 logger.info(f"Admin audit: {audit_data}")
-                
-                # Store in session for recent activity display
-                recent_activities = request.session.get('admin_recent_activities', [])
-                recent_activities.insert(0, {
-                    'action': action_type,
-                    'path': request.path,
-                    'timestamp': timezone.now().strftime('%Y-%m-%d %H:%M:%S'),
-                })
-                
-                # Keep only last 10 activities
-                request.session['admin_recent_activities'] = recent_activities[:10]
-                
         except Exception as e:
             logger.error(f"Error in admin audit: {e}")
     
@@ -7,12 +7,17 @@ from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
 from django.db.models import Q, Count
 from django.utils import timezone
+from django.core.cache import cache
+from django.conf import settings
 from datetime import datetime, timedelta
 import json
 import csv
+import os
 
 from .models import User, Exam, Question, Submission, Violation, BugReport, PasswordResetOTP, ExamAssignment
 from .Modules.send_email_using_sheets import SmartFaceProctorMailer
+from .Modules.UserImportModule import get_import_report
+from .FaceModules.TelemetryModule import TelemetryReader, METRIC_FIELDS, downsample_metrics, telemetry_path
 from .views import get_client_ip
 
 
@@ -301,17 +306,40 @@ def admin_create_user(request):
 @admin_required
 def admin_import_users(request):
     """Import users from CSV"""
+    result = None
     if request.method == 'POST':
         csv_file = request.FILES.get('csv_file')
         if csv_file:
             try:
                 mailer = SmartFaceProctorMailer()
-                mailer.import_users_from_csv(csv_file)
-                messages.success(request, 'Users imported successfully.')
+                result = mailer.import_users_from_csv(csv_file, send_welcome=request.POST.get('send_welcome') != 'off')
+                if result.created:
+                    messages.success(request, f'Import finished: {result.summary()}.')
+                else:
+                    messages.warning(request, f'No users were created: {result.summary()}.')
             except Exception as e:
                 messages.error(request, f'Error importing users: {str(e)}')
+        else:
+            messages.error(request, 'Please choose a CSV file to import.')
     
-    return render(request, 'admin_import_users.html')
+    context = {
+        'admin': request.user,
+        'result': result,
+        'problems': result.problems[:100] if result else [],
+    }
+    return render(request, 'admin_import_users.html', context)
+
+
+@admin_required
+def admin_import_users_report(request, token):
+    """Download the per-row report of a CSV user import"""
+    report = get_import_report(token)
+    if report is None:
+        messages.error(request, 'This import report has expired. Please run the import again.')
+        return redirect('admin_import_users')
+    response = HttpResponse(report, content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="user_import_report.csv"'
+    return response
 
 
 @admin_required
@@ -589,6 +617,7 @@ def admin_violations(request):
     context = {
         'admin': request.user,
         'page_obj': page_obj,
+        'violations': page_obj,
         'search_query': search_query,
         'violation_type': violation_type,
         'violation_types': Violation.VIOLATION_TYPES,
@@ -596,6 +625,44 @@ def admin_violations(request):
     return render(request, 'admin_violations.html', context)
 
 
+@admin_required
+def admin_telemetry_series(request, exam_id, student_id):
+    """Downsampled gaze/head metric series of one student's exam for the review chart"""
+    try:
+        points = min(max(int(request.GET.get('points', 1000)), 10), 5000)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid points value'}, status=400)
+    
+    metrics = [m for m in request.GET.get('metrics', '').split(',') if m] or list(METRIC_FIELDS)
+    unknown = [m for m in metrics if m not in METRIC_FIELDS]
+    if unknown:
+        return JsonResponse({'success': False, 'error': f'Unknown metrics: {", ".join(unknown)}'}, status=400)
+    
+    path = telemetry_path(settings.PROCTOR_TELEMETRY_ROOT, exam_id, student_id)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return JsonResponse({'success': False, 'error': 'No telemetry recorded for this student'}, status=404)
+    
+    # File size and mtime are part of the key, so a session that is still being
+    # recorded is recomputed as it grows while a finished one stays cached
+    cache_key = f"telemetry:{exam_id}:{student_id}:{points}:{','.join(metrics)}:{stat.st_size}:{stat.st_mtime_ns}"
+    payload = cache.get(cache_key)
+    if payload is None:
+        records = TelemetryReader(path).read_range()
+        payload = {
+            'success': True,
+            'exam_id': exam_id,
+            'student_id': student_id,
+            'points': points,
+            'total_samples': len(records),
+            'series': downsample_metrics(records, metrics, points),
+        }
+        cache.set(cache_key, payload, 600)
+    
+    return JsonResponse(payload)
+
+
 @admin_required
 def admin_bug_reports(request):
     """Manage bug reports"""
@@ -745,12 +812,13 @@ def admin_export_data(request):
     elif data_type == 'violations':
         response['Content-Disposition'] = 'attachment; filename="violations.csv"'
         writer = csv.writer(response)
-        writer.writerow(['Student', 'Exam', 'Type', 'Timestamp'])
+        writer.writerow(['Student', 'Exam', 'Type', 'Started', 'Ended', 'Detections', 'Peak Severity'])
         
         for violation in Violation.objects.select_related('student', 'exam').all():
             writer.writerow([
                 violation.student.username, violation.exam.title, 
-                violation.type, violation.timestamp
+                violation.type, violation.timestamp, violation.ended_at,
+                violation.frame_count, violation.peak_severity
             ])
     
     return response
@@ -0,0 +1,39 @@
+"""
+Database guard shared by the benchmark commands that write rows.
+
+Those commands create and delete thousands of users and sessions, so they
+refuse to run until told where: --test-database runs them in a throwaway
+test database, --database NAME against the configured default database only
+if NAME is its name (a typed confirmation, like the one dropdb asks for).
+"""
+
+from contextlib import contextmanager
+
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def add_database_arguments(parser):
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--test-database', action='store_true',
+                       help='Run in a test database that is created for the run and dropped afterwards')
+    group.add_argument('--database', metavar='NAME',
+                       help='Run against the configured database; NAME must be its name, to confirm')
+
+
+@contextmanager
+def benchmark_database(options):
+    """Run the body against the database the options chose"""
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not options['test_database']:
+        if options['database'] != str(connection.settings_dict['NAME']):
+            raise CommandError(f"--database {options['database']} does not match the configured database "
+                               f"{connection.settings_dict['NAME']}; use --test-database for a throwaway one")
+        yield
+        return
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
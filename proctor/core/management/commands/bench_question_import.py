@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Exam, Question, User
+from core.Modules.QuestionImportModule import DEFAULT_BATCH_SIZE, import_exam_questions
+
+
+class Command(BaseCommand):
+    help = 'Measure question import throughput (rows/s); everything is rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=5000, help='Rows in the generated question bank')
+        parser.add_argument('--batch-size', type=int, action='append',
+                            help=f'bulk_create batch size to try (repeatable, default {DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--skip-per-row', action='store_true',
+                            help='Do not time the old one INSERT per row import')
+
+    def handle(self, *args, **options):
+        rows = [{
+            'Questions': f'Sample question number {i} for the import benchmark?',
+            'Option A': f'Answer {i}a',
+            'Option B': f'Answer {i}b',
+            'Option C': f'Answer {i}c',
+            'Option D': f'Answer {i}d',
+            'Answer': 'ABCD'[i % 4],
+        } for i in range(options['questions'])]
+
+        if not options['skip_per_row']:
+            elapsed = self._timed(lambda faculty: self._per_row_import(faculty, rows))
+            self._report('per-row create', len(rows), elapsed)
+
+        for batch_size in options['batch_size'] or [DEFAULT_BATCH_SIZE]:
+            elapsed = self._timed(
+                lambda faculty: import_exam_questions(self._exam_fields(faculty), rows, batch_size=batch_size)
+            )
+            self._report(f'bulk_create batch={batch_size}', len(rows), elapsed)
+
+    def _exam_fields(self, faculty):
+        return {
+            'title': 'Import benchmark',
+            'date': timezone.now(),
+            'duration_minutes': 60,
+            'created_by': faculty,
+        }
+
+    def _per_row_import(self, faculty, rows):
+        exam = Exam.objects.create(**self._exam_fields(faculty))
+        for q in rows:
+            Question.objects.create(
+                exam=exam,
+                text=q['Questions'],
+                option_a=q['Option A'],
+                option_b=q['Option B'],
+                option_c=q['Option C'],
+                option_d=q['Option D'],
+                answer=q['Answer'],
+            )
+
+    def _timed(self, run):
+        with transaction.atomic():
+            faculty = User.objects.create(username='import-bench-faculty', email='import-bench@example.com',
+                                          role='Faculty')
+            start = time.perf_counter()
+            run(faculty)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed
+
+    def _report(self, label, count, elapsed):
+        self.stdout.write(f'{label:>24}: {count} rows in {elapsed:6.3f} s  ({count / elapsed:9.0f} rows/s)')
@@ -0,0 +1,114 @@
+import csv
+import io
+import threading
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.core.management.base import BaseCommand
+
+from core.Modules import SheetManagerModule
+from core.Modules.QuestionFileModule import parse_csv, parse_xlsx
+from core.Modules.SheetManagerModule import SheetsClientManager, fetch_question_bank
+from core.management.commands.bench_sheets_client import FakeCredentials, FakeSheetsClient
+
+HEADER = ['Questions', 'Option A', 'Option B', 'Option C', 'Option D', 'Answer']
+
+
+def build_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def build_xlsx(rows):
+    """Minimal single-sheet workbook with every cell in the shared string table, as Excel writes it"""
+    strings = {}
+    sheet_rows = []
+    for r, row in enumerate(rows, 1):
+        cells = []
+        for c, value in enumerate(row):
+            index = strings.setdefault(value, len(strings))
+            cells.append(f'<c r="{_column_letter(c)}{r}" t="s"><v>{index}</v></c>')
+        sheet_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    pkg = 'http://schemas.openxmlformats.org/package/2006/relationships'
+    shared = ''.join(f'<si><t>{escape(value)}</t></si>' for value in strings)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('xl/workbook.xml',
+                         f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets>'
+                         f'<sheet name="Questions" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        archive.writestr('xl/_rels/workbook.xml.rels',
+                         f'<Relationships xmlns="{pkg}"><Relationship Id="rId1" '
+                         f'Type="{rel}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>')
+        archive.writestr('xl/sharedStrings.xml',
+                         f'<sst xmlns="{main}" count="{len(strings)}" uniqueCount="{len(strings)}">{shared}</sst>')
+        archive.writestr('xl/worksheets/sheet1.xml',
+                         f'<worksheet xmlns="{main}"><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Compare question parse throughput of CSV and XLSX uploads against the Google Sheets path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=5000, help='Question rows per file')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per format; the best run is reported')
+        parser.add_argument('--auth-latency', type=float, default=0.25,
+                            help='Seconds per OAuth token exchange of the fake Sheets API')
+        parser.add_argument('--call-latency', type=float, default=0.3,
+                            help='Seconds per call to the fake Sheets API')
+
+    def handle(self, *args, **options):
+        count = options['questions']
+        rows = [HEADER] + [[f'Sample question number {i} for the parse benchmark?', f'Answer {i}a',
+                            f'Answer {i}b', f'Answer {i}c', f'Answer {i}d', 'ABCD'[i % 4]] for i in range(count)]
+        csv_data = build_csv(rows)
+        xlsx_data = build_xlsx(rows)
+
+        self._report('CSV upload', count, len(csv_data), self._best(options, lambda: parse_csv(io.BytesIO(csv_data))))
+        self._report('XLSX upload', count, len(xlsx_data),
+                     self._best(options, lambda: parse_xlsx(io.BytesIO(xlsx_data))))
+
+        # The Sheets path on a cold process: token exchange plus the remote calls
+        original = SheetManagerModule.sheets_clients
+        stats = {'lock': threading.Lock(), 'token_exchanges': 0}
+
+        def fetch_cold():
+            SheetManagerModule.sheets_clients = SheetsClientManager(
+                load_credentials=lambda path, scopes: FakeCredentials(stats, options['auth_latency'], 3600),
+                authorize=lambda creds: FakeSheetsClient(rows, options['call_latency']),
+            )
+            return fetch_question_bank('https://docs.google.com/spreadsheets/d/bench-parse/edit')
+
+        try:
+            self._report('Google Sheets (fake)', count, 0, self._best(options, fetch_cold))
+        finally:
+            SheetManagerModule.sheets_clients = original
+            SheetManagerModule.question_bank_cache.clear()
+
+    def _best(self, options, run):
+        best = None
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def _report(self, label, count, size, elapsed):
+        size_note = f'  {size / 1024:8.0f} KB' if size else ' ' * 13
+        self.stdout.write(f'{label:>22}:{size_note}  {elapsed * 1000:8.1f} ms  ({count / elapsed:9.0f} rows/s)')
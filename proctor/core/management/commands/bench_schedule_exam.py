@@ -0,0 +1,125 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from core.management.benchmarks import add_database_arguments, benchmark_database
+from core.models import Exam, ExamImportJob, User
+from core.Modules import SheetManagerModule
+from core.Modules.ExamImportJobModule import run_exam_import_job
+from core.Modules.SheetSourceModule import FakeSheetSource
+
+HEADER = ['Questions', 'Option A', 'Option B', 'Option C', 'Option D', 'Answer']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the end-to-end schedule_exam flow against the offline fake sheet source'
+
+    def add_arguments(self, parser):
+        add_database_arguments(parser)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                            help='Question counts to benchmark')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per size; the median is reported')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds per fake Sheets API call')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency per call')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Probability that a fake API call fails with a 503')
+        parser.add_argument('--chunk-rows', type=int, default=500, help='Rows per streamed chunk in the worker')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self._benchmark(options)
+
+    def _benchmark(self, options):
+        source = FakeSheetSource(latency=options['latency'], jitter=options['jitter'],
+                                 error_rate=options['error_rate'], seed=options['seed'])
+        original_source = SheetManagerModule.sheets_clients
+        SheetManagerModule.sheets_clients = source
+
+        # Test environment: testserver host, template context capture, no real email
+        setup_test_environment()
+        faculty = User.objects.create(username='schedule-bench-faculty', email='schedule-bench@example.com',
+                                      role='Faculty')
+        client = Client()
+        client.force_login(faculty)
+
+        self.stdout.write(f'{"questions":>9} {"preview":>9} {"schedule":>9} {"import":>9} {"total":>9} '
+                          f'{"rows/s":>9} {"API calls":>9}  failures')
+        try:
+            for size in options['sizes']:
+                sheet_id = f'bench-schedule-{size}'
+                source.add_sheet(sheet_id, [HEADER] + [
+                    [f'Benchmark question number {i}?', f'Answer {i}a', f'Answer {i}b', f'Answer {i}c',
+                     f'Answer {i}d', 'ABCD'[i % 4]] for i in range(size)
+                ])
+                runs = []
+                failures = 0
+                for _ in range(options['repeat']):
+                    SheetManagerModule.question_bank_cache.clear()
+                    source.reset_stats()
+                    run = self._run_flow(client, faculty, sheet_id, size, options)
+                    if run is None:
+                        failures += 1
+                    else:
+                        runs.append(run + (source.total_calls,))
+                self._report(size, runs, failures)
+        finally:
+            Exam.objects.filter(created_by=faculty).delete()
+            faculty.delete()
+            teardown_test_environment()
+            SheetManagerModule.sheets_clients = original_source
+            SheetManagerModule.question_bank_cache.clear()
+
+    def _run_flow(self, client, faculty, sheet_id, size, options):
+        form = {
+            'examName': f'Schedule benchmark {size}',
+            'warningLimit': '3',
+            'examDate': (timezone.localtime() + timezone.timedelta(days=1)).strftime('%Y-%m-%d'),
+            'examTime': '10:00',
+            'freezeTime': '60',
+            'sheetUrl': f'https://docs.google.com/spreadsheets/d/{sheet_id}/edit',
+        }
+
+        start = time.perf_counter()
+        response = client.post(reverse('schedule_exam_preview'), form)
+        preview_time = time.perf_counter() - start
+        if response.status_code != 200:
+            return None
+
+        start = time.perf_counter()
+        client.post(reverse('schedule_exam'), form)
+        schedule_time = time.perf_counter() - start
+
+        # Run the queued job the way the worker would, but only this one
+        job = ExamImportJob.objects.filter(created_by=faculty, status='queued').order_by('-id').first()
+        if job is None:
+            return None
+        ExamImportJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now())
+        job.refresh_from_db()
+        start = time.perf_counter()
+        run_exam_import_job(job, chunk_rows=options['chunk_rows'])
+        import_time = time.perf_counter() - start
+
+        ok = job.status == 'succeeded' and job.questions_imported == size
+        if job.exam_id:
+            Exam.objects.filter(pk=job.exam_id).delete()
+        job.delete()
+        if not ok:
+            return None
+        return preview_time, schedule_time, import_time
+
+    def _report(self, size, runs, failures):
+        if not runs:
+            self.stdout.write(f'{size:>9} {"-":>9} {"-":>9} {"-":>9} {"-":>9} {"-":>9} {"-":>9}  {failures}')
+            return
+        preview, schedule, import_, calls = (statistics.median(values) for values in zip(*runs))
+        total = preview + schedule + import_
+        self.stdout.write(
+            f'{size:>9} {preview * 1000:>7.0f}ms {schedule * 1000:>7.0f}ms {import_ * 1000:>7.0f}ms '
+            f'{total * 1000:>7.0f}ms {size / total:>9.0f} {calls:>9.0f}  {failures}'
+        )
@@ -0,0 +1,123 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.management.benchmarks import add_database_arguments, benchmark_database
+from core.models import User, UserSession
+from core.session_utils import SessionSecurity, get_monitor_snapshot, invalidate_monitor_snapshot
+
+EMAIL_DOMAIN = 'session-bench.example.com'
+KEY_PREFIX = 'benchsess'
+
+
+def legacy_scan(user_id, now):
+    """The per-session step of the old detection: decode every session to find this user's ones"""
+    count = 0
+    for session in Session.objects.filter(expire_date__gt=now):
+        session_user_id = session.get_decoded().get('_auth_user_id')
+        if session_user_id and int(session_user_id) == int(user_id):
+            count += 1
+    return count
+
+
+class Command(BaseCommand):
+    help = 'Compare the old decode-every-session suspicious-session detection with the registry pass'
+
+    def add_arguments(self, parser):
+        add_database_arguments(parser)
+        parser.add_argument('--sessions', type=int, default=10000, help='Active sessions to create')
+        parser.add_argument('--users', type=int, default=4000, help='Users the sessions belong to')
+        parser.add_argument('--legacy-sample', type=int, default=5,
+                            help='Sessions checked with the old algorithm; its full time is extrapolated')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self._cleanup()
+            try:
+                self._populate(options)
+                self._run(options)
+            finally:
+                self._cleanup()
+                invalidate_monitor_snapshot()
+
+    def _populate(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        users = User.objects.bulk_create([
+            User(username=f'sessbench{i}', email=f'user{i}@{EMAIL_DOMAIN}', password='!',
+                 role='Student' if i % 10 else 'Faculty')
+            for i in range(options['users'])
+        ], batch_size=1000)
+        users = list(User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}'))
+
+        store = SessionStore()
+        sessions, registry = [], []
+        expire_date = now + timedelta(days=1)
+        for i in range(options['sessions']):
+            user = rng.choice(users)
+            # Mostly fresh sessions, some older than a day, some exams running too long
+            started = now - timedelta(hours=rng.choice([0.5, 1, 2, 5, 30]))
+            in_exam = rng.random() < 0.2
+            exam_start = now - timedelta(hours=rng.choice([0.5, 1, 4])) if in_exam else None
+            key = f'{KEY_PREFIX}{i:031d}'
+            sessions.append(Session(session_key=key, expire_date=expire_date, session_data=store.encode({
+                '_auth_user_id': str(user.id),
+                'user_role': user.role,
+                'session_start': started.timestamp(),
+                'in_exam': in_exam,
+                'exam_start_time': exam_start.timestamp() if exam_start else None,
+                'ip_address': f'10.0.{i // 250 % 250}.{i % 250}',
+            })))
+            registry.append(UserSession(session_key=key, user=user, role=user.role,
+                                        ip_address=f'10.0.{i // 250 % 250}.{i % 250}', in_exam=in_exam,
+                                        exam_start_time=exam_start, session_start=started,
+                                        last_activity=now, expire_date=expire_date))
+        Session.objects.bulk_create(sessions, batch_size=1000)
+        UserSession.objects.bulk_create(registry, batch_size=1000)
+        self.stdout.write(f'{len(sessions)} sessions for {len(users)} users')
+
+    def _run(self, options):
+        now = timezone.now()
+        total = Session.objects.filter(expire_date__gt=now).count()
+        sample = list(Session.objects.filter(expire_date__gt=now, session_key__startswith=KEY_PREFIX)
+                      [:options['legacy_sample']])
+
+        start = time.perf_counter()
+        for session in sample:
+            legacy_scan(session.get_decoded()['_auth_user_id'], now)
+        per_session = (time.perf_counter() - start) / len(sample) if sample else 0
+        legacy = per_session * total
+        self.stdout.write(f'{"old":>14}: {per_session * 1000:8.1f}ms per session, '
+                          f'~{legacy:8.1f}s for {total} sessions ({total * total} decodes)')
+
+        start = time.perf_counter()
+        suspicious = SessionSecurity.detect_suspicious_sessions()
+        single_pass = time.perf_counter() - start
+        kinds = {}
+        for entry in suspicious:
+            kinds[entry['type']] = kinds.get(entry['type'], 0) + 1
+        self.stdout.write(f'{"single pass":>14}: {single_pass:8.3f}s, ' + ', '.join(
+            f'{count} {kind}' for kind, count in sorted(kinds.items())))
+
+        invalidate_monitor_snapshot()
+        start = time.perf_counter()
+        get_monitor_snapshot()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        get_monitor_snapshot()
+        warm = time.perf_counter() - start
+        self.stdout.write(f'{"monitor page":>14}: {cold:8.3f}s to build the snapshot, '
+                          f'{warm * 1000:.1f}ms from the cache')
+
+        if single_pass:
+            self.stdout.write(self.style.SUCCESS(f'Detection speed-up: ~{legacy / single_pass:.0f}x'))
+
+    def _cleanup(self):
+        Session.objects.filter(session_key__startswith=KEY_PREFIX).delete()
+        User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+
+from core.management.benchmarks import add_database_arguments, benchmark_database
+from core.models import User
+
+EMAIL_DOMAIN = 'session-writes-bench.example.com'
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Write every request, as with SESSION_SAVE_EVERY_REQUEST and an unconditional last_activity update
+EVERY_REQUEST = {'SESSION_SAVE_EVERY_REQUEST': True, 'SESSION_ACTIVITY_GRANULARITY': 0}
+
+
+def is_write(sql):
+    return sql.lstrip().upper().startswith(WRITE_STATEMENTS)
+
+
+class Command(BaseCommand):
+    help = 'Count database writes per request for student and admin page views'
+
+    def add_arguments(self, parser):
+        add_database_arguments(parser)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per page')
+        parser.add_argument('--student-path', default='/student/profile/')
+        parser.add_argument('--admin-path', default='/customadmin/users/')
+
+    def handle(self, *args, **options):
+        with benchmark_database(options):
+            self._benchmark(options)
+
+    def _benchmark(self, options):
+        setup_test_environment()
+        self._cleanup()
+        try:
+            student = User.objects.create_user(username='SPS-BENCH-WRITES', email=f'student@{EMAIL_DOMAIN}',
+                                               password=None, role='Student')
+            admin = User.objects.create_user(username='ADM-BENCH-WRITES', email=f'admin@{EMAIL_DOMAIN}',
+                                             password=None, role='Admin')
+            pages = [('student', student, options['student_path']), ('admin', admin, options['admin_path'])]
+            for label, settings in (('every request', EVERY_REQUEST), ('coalesced', {})):
+                with override_settings(**settings):
+                    for role, user, path in pages:
+                        self._measure(label, role, user, path, options['requests'])
+        finally:
+            self._cleanup()
+            teardown_test_environment()
+
+    def _measure(self, label, role, user, path, count):
+        client = Client()
+        client.force_login(user)
+        # The first request initialises the session tracking; leave it out
+        client.get(path)
+
+        writes = queries = 0
+        status = None
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                status = client.get(path).status_code
+            queries += len(captured.captured_queries)
+            writes += sum(1 for query in captured.captured_queries if is_write(query['sql']))
+        self.stdout.write(f'{label:>14} {role:>8} {path} (HTTP {status}): '
+                          f'{writes / count:5.2f} writes, {queries / count:5.2f} queries per request')
+
+    def _cleanup(self):
+        User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
@@ -0,0 +1,132 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.Modules import SheetManagerModule
+from core.Modules.SheetManagerModule import SHEETS_SCOPES, SheetsClientManager, fetch_question_bank
+
+
+class FakeCredentials:
+    """Service account credentials whose token exchange takes auth_latency seconds"""
+
+    def __init__(self, stats, auth_latency, token_lifetime):
+        self.stats = stats
+        self.auth_latency = auth_latency
+        self.token_lifetime = token_lifetime
+        self.expiry = None
+
+    @property
+    def valid(self):
+        return self.expiry is not None and time.monotonic() < self.expiry
+
+    def refresh(self, request):
+        time.sleep(self.auth_latency)
+        with self.stats['lock']:
+            self.stats['token_exchanges'] += 1
+        self.expiry = time.monotonic() + self.token_lifetime
+
+
+class FakeWorksheet:
+    def __init__(self, client, rows):
+        self.client = client
+        self.rows = rows
+
+    def get_all_values(self):
+        time.sleep(self.client.call_latency)
+        return [list(row) for row in self.rows]
+
+
+class FakeSpreadsheet:
+    def __init__(self, client):
+        self.client = client
+
+    def get_worksheet(self, index):
+        return FakeWorksheet(self.client, self.client.rows)
+
+
+class FakeSheetsClient:
+    """Local stand-in for the Sheets API; every remote call takes call_latency seconds"""
+
+    def __init__(self, rows, call_latency):
+        self.rows = rows
+        self.call_latency = call_latency
+
+    def open_by_key(self, key):
+        time.sleep(self.call_latency)
+        return FakeSpreadsheet(self)
+
+
+class PerCallClientManager(SheetsClientManager):
+    """The previous behaviour: read credentials, authorize and exchange a token on every call"""
+
+    def get_client(self, credentials_path, scopes=SHEETS_SCOPES):
+        creds = self.load_credentials(str(credentials_path), scopes=list(scopes))
+        client = self.authorize(creds)
+        creds.refresh(None)
+        return client
+
+
+class Command(BaseCommand):
+    help = 'Compare sheet fetch latency with per-call authorization against the shared Sheets client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flows', type=int, default=50, help='Number of scheduling flows to simulate')
+        parser.add_argument('--concurrency', type=int, default=1, help='Flows run in parallel')
+        parser.add_argument('--questions', type=int, default=100, help='Question rows in the fake sheet')
+        parser.add_argument('--auth-latency', type=float, default=0.25, help='Seconds per OAuth token exchange')
+        parser.add_argument('--call-latency', type=float, default=0.08, help='Seconds per Sheets API call')
+
+    def handle(self, *args, **options):
+        rows = [['Question', 'Option A', 'Option B', 'Option C', 'Option D', 'Answer']]
+        rows += [[f'Question {i}?', 'a', 'b', 'c', 'd', 'A'] for i in range(options['questions'])]
+
+        stats = {'lock': threading.Lock(), 'token_exchanges': 0}
+
+        def load_credentials(path, scopes):
+            return FakeCredentials(stats, options['auth_latency'], token_lifetime=3600)
+
+        def authorize(creds):
+            return FakeSheetsClient(rows, options['call_latency'])
+
+        results = []
+        for label, manager_class in (
+            ('per-call authorize', PerCallClientManager),
+            ('shared client', SheetsClientManager),
+        ):
+            stats['token_exchanges'] = 0
+            manager = manager_class(load_credentials=load_credentials, authorize=authorize)
+            latencies, elapsed = self._run(manager, options)
+            results.append((label, latencies, elapsed, stats['token_exchanges']))
+
+        for label, latencies, elapsed, exchanges in results:
+            latencies.sort()
+            mean = sum(latencies) / len(latencies)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f'{label:>20}: mean {mean * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  '
+                f'total {elapsed:6.2f} s  token exchanges {exchanges}'
+            )
+
+    def _run(self, manager, options):
+        latencies = []
+        lock = threading.Lock()
+
+        def flow(i):
+            start = time.perf_counter()
+            fetch_question_bank(f'https://docs.google.com/spreadsheets/d/bench-sheet-{i}/edit')
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+        # fetch_question_bank goes through the module-wide manager, so swap the fake in for the run
+        original = SheetManagerModule.sheets_clients
+        SheetManagerModule.sheets_clients = manager
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                list(executor.map(flow, range(options['flows'])))
+        finally:
+            SheetManagerModule.sheets_clients = original
+            SheetManagerModule.question_bank_cache.clear()
+        return latencies, time.perf_counter() - start
@@ -0,0 +1,170 @@
+import random
+import smtplib
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+from django.core.management.base import BaseCommand
+
+from core.Modules.BulkMailerModule import BulkMailer
+from core.Modules.SMTPPoolModule import SMTPConnectionPool
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal SMTP server that accepts and discards everything: enough of
+    RFC 5321 for smtplib (EHLO with AUTH PLAIN, AUTH, MAIL, RCPT, DATA, RSET,
+    NOOP, QUIT). Every reply waits server.rtt seconds to stand in for the
+    network round trip to a real provider.
+    """
+
+    def reply(self, line):
+        if self.server.rtt:
+            time.sleep(self.server.rtt)
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        # Connection setup (TCP + TLS) costs a few round trips before the banner
+        if self.server.rtt:
+            time.sleep(self.server.rtt * self.server.handshake_rtts)
+        self.reply('220 bench-sink ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-bench-sink\r\n')
+                self.reply('250 AUTH PLAIN')
+            elif verb == 'HELO':
+                self.reply('250 bench-sink')
+            elif verb == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                with self.server.lock:
+                    failed = self.server.fail_rate and self.server.random.random() < self.server.fail_rate
+                    if not failed:
+                        self.server.messages += 1
+                if failed:
+                    self.reply('451 4.3.0 Temporary failure, try again')
+                else:
+                    self.reply('250 OK queued')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, rtt=0.0, handshake_rtts=3, fail_rate=0.0, seed=1):
+        super().__init__(('127.0.0.1', 0), _SinkHandler)
+        self.rtt = rtt
+        self.handshake_rtts = handshake_rtts
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+def build_message(index):
+    msg = EmailMessage()
+    msg.set_content(f'Benchmark message {index}\n\nYour login ID: SPS-{index:010d}\n')
+    msg['Subject'] = 'Smart Face Proctor benchmark'
+    msg['From'] = 'proctor@example.com'
+    msg['To'] = f'student{index}@example.com'
+    return msg
+
+
+class Command(BaseCommand):
+    help = 'Compare SMTP throughput of a connection per message, pooled connections and the bulk mailer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Messages per run')
+        parser.add_argument('--threads', type=int, default=1, help='Concurrent senders')
+        parser.add_argument('--rtt', type=float, default=0.005,
+                            help='Simulated round trip per server reply in seconds')
+        parser.add_argument('--pool-size', type=int, default=4, help='Maximum pooled connections')
+        parser.add_argument('--max-messages', type=int, default=100, help='Messages per pooled connection')
+        parser.add_argument('--bulk-workers', type=int, default=8, help='Workers of the bulk mailer run')
+        parser.add_argument('--rate-limit', type=float, default=0,
+                            help='Bulk mailer messages per second (0 for unlimited)')
+        parser.add_argument('--fail-rate', type=float, default=0.0,
+                            help='Probability that the sink answers DATA with a temporary 451 (bulk run only)')
+
+    def handle(self, *args, **options):
+        # The local sink stands in for the provider; plain SMTP since it has no certificate
+        sink = SMTPSink(rtt=options['rtt'])
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        try:
+            def send_direct(msg):
+                with smtplib.SMTP('127.0.0.1', sink.port, timeout=30) as smtp:
+                    smtp.login('bench', 'secret')
+                    smtp.send_message(msg)
+
+            self._run('connection per message', sink, send_direct, options)
+
+            pool = SMTPConnectionPool('127.0.0.1', sink.port, 'bench', 'secret', use_ssl=False,
+                                      max_size=options['pool_size'], max_messages=options['max_messages'])
+            try:
+                self._run('pooled connections', sink, pool.send_message, options)
+            finally:
+                pool.close()
+
+            sink.fail_rate = options['fail_rate']
+            pool = SMTPConnectionPool('127.0.0.1', sink.port, 'bench', 'secret', use_ssl=False,
+                                      max_size=options['bulk_workers'], max_messages=options['max_messages'])
+            mailer = BulkMailer({'SMTP_HOST': '127.0.0.1'}, workers=options['bulk_workers'],
+                                rate_limit=options['rate_limit'], base_delay=0.05, pool=pool)
+            try:
+                self._run_bulk(sink, mailer, options)
+            finally:
+                pool.close()
+        finally:
+            sink.shutdown()
+            sink.server_close()
+
+    def _run(self, label, sink, send, options):
+        count = options['messages']
+        messages = [build_message(i) for i in range(count)]
+        with sink.lock:
+            sink.connections = sink.messages = 0
+
+        start = time.perf_counter()
+        if options['threads'] > 1:
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                list(executor.map(send, messages))
+        else:
+            for msg in messages:
+                send(msg)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'{label:>24}: {count} messages in {elapsed:6.2f}s  ({count / elapsed:8.1f} msgs/s), '
+                          f'{sink.connections} connection(s), {sink.messages} delivered')
+
+    def _run_bulk(self, sink, mailer, options):
+        messages = [build_message(i) for i in range(options['messages'])]
+        with sink.lock:
+            sink.connections = sink.messages = 0
+        report = mailer.send_all(messages)
+        label = f'bulk mailer ({mailer.workers} workers)'
+        self.stdout.write(f'{label:>24}: {report.summary()}, {sink.connections} connection(s), '
+                          f'{sink.messages} delivered')
@@ -0,0 +1,76 @@
+import os
+import time
+
+from django.contrib.auth.hashers import MD5PasswordHasher, make_password
+from django.core.management.base import BaseCommand
+
+from core.management.benchmarks import add_database_arguments, benchmark_database
+from core.models import User
+from core.Modules.UserProvisioningModule import provision_users
+from core.Modules.send_email_using_sheets import SmartFaceProctorMailer
+
+EMAIL_DOMAIN = 'provision-bench.example.com'
+
+
+class _Generator:
+    """generate_user_id_and_password without loading SMTP credentials"""
+    password_length = 12
+    generate_user_id_and_password = SmartFaceProctorMailer.generate_user_id_and_password
+
+
+class Command(BaseCommand):
+    help = 'Compare user-by-user account creation against bulk provisioning'
+
+    def add_arguments(self, parser):
+        add_database_arguments(parser)
+        parser.add_argument('--users', type=int, default=10000, help='Accounts to provision in bulk')
+        parser.add_argument('--serial-sample', type=int, default=100,
+                            help='Accounts created one by one; the serial time for --users is extrapolated')
+        parser.add_argument('--processes', type=int, default=None,
+                            help=f'Hashing processes (default: one per CPU, {os.cpu_count()} here)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Accounts per bulk_create')
+        parser.add_argument('--fast-hasher', action='store_true',
+                            help='Use the MD5 hasher to measure everything but PBKDF2')
+
+    def handle(self, *args, **options):
+        hasher = MD5PasswordHasher() if options['fast_hasher'] else 'default'
+        generator = _Generator()
+        with benchmark_database(options):
+            self._cleanup()
+            try:
+                self._run(generator, hasher, options)
+            finally:
+                self._cleanup()
+
+    def _run(self, generator, hasher, options):
+        count = options['users']
+        sample = min(options['serial_sample'], count)
+
+        start = time.perf_counter()
+        for i in range(sample):
+            email = f'serial{i}@{EMAIL_DOMAIN}'
+            user_id, password = generator.generate_user_id_and_password('student')
+            if not User.objects.filter(email=email).exists():
+                user = User(username=user_id, email=email, role='Student')
+                user.password = make_password(password, hasher=hasher)
+                user.save()
+        serial = time.perf_counter() - start
+        per_user = serial / sample if sample else 0
+        rate = 1 / per_user if per_user else 0
+        self.stdout.write(f'{"one by one":>12}: {sample} users in {serial:7.2f}s ({rate:7.0f}/s), '
+                          f'{count} users would take ~{per_user * count:7.1f}s')
+
+        entries = [(f'bulk{i}@{EMAIL_DOMAIN}', 'student' if i % 10 else 'faculty') for i in range(count)]
+        # A few rows that are already provisioned or repeated, as in a re-run sheet
+        entries += [(f'serial{i}@{EMAIL_DOMAIN}', 'student') for i in range(min(sample, 10))]
+        entries += entries[:10]
+        result = provision_users(entries, generator.generate_user_id_and_password,
+                                 batch_size=options['batch_size'], processes=options['processes'], hasher=hasher)
+        self.stdout.write(f'{"bulk":>12}: {result.summary()}')
+        if per_user and result.elapsed:
+            self.stdout.write(self.style.SUCCESS(
+                f'Speed-up: {per_user * len(result.created) / result.elapsed:.1f}x'
+            ))
+
+    def _cleanup(self):
+        User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
@@ -5,10 +5,11 @@ Usage: python manage.py cleanup_sessions
 
 from django.core.management.base import BaseCommand
 from django.contrib.sessions.models import Session
+from django.db.models import Count
 from django.utils import timezone
 from datetime import timedelta
 from core.session_utils import SessionManager, SessionSecurity
-from core.models import User
+from core.models import User, UserSession
 
 
 class Command(BaseCommand):
@@ -66,7 +67,11 @@ class Command(BaseCommand):
         max_sessions = options['max_sessions_per_user']
         users_with_many_sessions = []
         
-        for user in User.objects.all():
+        # Only users over the limit, found with one grouped query on the session registry
+        crowded_user_ids = (UserSession.objects.filter(expire_date__gt=timezone.now())
+                            .values('user').annotate(count=Count('id')).filter(count__gt=max_sessions)
+                            .values_list('user', flat=True))
+        for user in User.objects.filter(id__in=list(crowded_user_ids)):
             user_sessions = SessionManager.get_user_sessions(user)
             if len(user_sessions) > max_sessions:
                 users_with_many_sessions.append((user, len(user_sessions)))
@@ -79,12 +84,8 @@ class Command(BaseCommand):
                                            reverse=True)
                     
                     for session_info in sorted_sessions[sessions_to_keep:]:
-                        try:
-                            session = Session.objects.get(session_key=session_info['session_key'])
-                            session.delete()
+                        if SessionManager.terminate_session(session_info['session_key']):
                             cleanup_count += 1
-                        except Session.DoesNotExist:
-                            pass
                     
                     self.stdout.write(
                         f'   Cleaned up excess sessions for user {user.username} '
@@ -103,24 +104,13 @@ class Command(BaseCommand):
         max_age_hours = options['max_session_age_hours']
         cutoff_time = timezone.now() - timedelta(hours=max_age_hours)
         
-        old_sessions = []
-        for session in Session.objects.filter(expire_date__gt=timezone.now()):
-            try:
-                session_data = session.get_decoded()
-                session_start = session_data.get('session_start')
-                if session_start:
-                    session_start_time = timezone.datetime.fromtimestamp(
-                        session_start, tz=timezone.get_current_timezone()
-                    )
-                    if session_start_time < cutoff_time:
-                        old_sessions.append(session)
-            except Exception:
-                # If we can't decode the session, it's probably corrupted
-                old_sessions.append(session)
+        old_sessions = list(UserSession.objects.filter(
+            session_start__lt=cutoff_time, expire_date__gt=timezone.now()
+        ).values_list('session_key', flat=True))
         
         if not options['dry_run']:
-            for session in old_sessions:
-                session.delete()
+            for session_key in old_sessions:
+                SessionManager.terminate_session(session_key)
                 cleanup_count += 1
             self.stdout.write(
                 self.style.SUCCESS(f'   Cleaned up {len(old_sessions)} old sessions')
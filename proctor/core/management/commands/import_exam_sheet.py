@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import User
+from core.Modules.QuestionImportModule import QuestionImportError, stream_exam_questions
+from core.Modules.SheetManagerModule import SheetRowStream
+
+
+class Command(BaseCommand):
+    help = 'Create an exam from a very large question sheet, streaming it in row chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sheet_url', help='Google Sheets URL of the question bank')
+        parser.add_argument('--title', required=True, help='Exam title')
+        parser.add_argument('--faculty', required=True, help='Username of the faculty member who owns the exam')
+        parser.add_argument('--date', required=True, help='Exam start as "YYYY-MM-DD HH:MM"')
+        parser.add_argument('--duration', type=int, default=60, help='Duration in minutes')
+        parser.add_argument('--chunk-rows', type=int, default=500, help='Sheet rows fetched per request')
+
+    def handle(self, *args, **options):
+        try:
+            faculty = User.objects.get(username=options['faculty'], role='Faculty')
+        except User.DoesNotExist:
+            raise CommandError(f"No faculty user named {options['faculty']}")
+
+        try:
+            date = timezone.make_aware(datetime.strptime(options['date'], '%Y-%m-%d %H:%M'))
+        except ValueError:
+            raise CommandError('Invalid --date, expected "YYYY-MM-DD HH:MM"')
+
+        stream = SheetRowStream(options['sheet_url'], chunk_rows=options['chunk_rows'])
+
+        def progress(processed, total):
+            self.stdout.write(f'  {processed}/{total} rows checked')
+
+        try:
+            exam, count = stream_exam_questions({
+                'title': options['title'],
+                'date': date,
+                'duration_minutes': options['duration'],
+                'created_by': faculty,
+                'sheet_url': options['sheet_url'],
+            }, stream, progress=progress)
+        except QuestionImportError as e:
+            for error in e.errors:
+                self.stdout.write(self.style.ERROR(f'  {error}'))
+            raise CommandError('Import failed, nothing was saved')
+
+        self.stdout.write(self.style.SUCCESS(f'Created exam {exam.id} "{exam.title}" with {count} questions'))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.session_utils import DEFAULT_CLEANUP_CHUNK_SIZE, SessionManager
+
+
+class Command(BaseCommand):
+    help = 'Background job that deletes expired sessions in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Delete what has expired and exit (cron)')
+        parser.add_argument('--interval', type=float, default=3600,
+                            help='Seconds between runs when not using --once')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CLEANUP_CHUNK_SIZE,
+                            help='Rows deleted per statement')
+        parser.add_argument('--pause', type=float, default=0.5, help='Seconds to sleep between chunks')
+        parser.add_argument('--max-chunks', type=int, default=None,
+                            help='Stop a run after this many chunks; the rest waits for the next run')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            start = time.perf_counter()
+            counts = SessionManager.purge_expired_sessions(
+                chunk_size=options['chunk_size'], pause=options['pause'], max_chunks=options['max_chunks'],
+            )
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {counts["sessions"]} expired session(s) and {counts["registry"]} registry row(s) '
+                f'in {counts["chunks"]} chunk(s), {elapsed:.2f}s'
+            ))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,102 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Exam
+from core.Modules.ExamValidationModule import ExamValidator
+from core.Modules.QuestionImportModule import QuestionImportError, resync_exam_questions
+from core.Modules.SheetManagerModule import QUESTION_RANGE, batch_fetch_question_banks, extract_sheet_id
+
+
+class Command(BaseCommand):
+    help = 'Validate (and optionally re-sync) the question sheets of upcoming exams with batched reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Include exams starting within this many days')
+        parser.add_argument('--exam', type=int, action='append', dest='exam_ids',
+                            help='Only these exam IDs (repeatable)')
+        parser.add_argument('--resync', action='store_true',
+                            help='Apply sheet changes to the stored questions of valid exams')
+        parser.add_argument('--concurrency', type=int, default=4, help='Spreadsheets read in parallel')
+        parser.add_argument('--max-retries', type=int, default=5,
+                            help='Retries per spreadsheet on rate limits and server errors')
+        parser.add_argument('--backoff', type=float, default=1.0, help='Base backoff delay in seconds')
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.exclude(sheet_url__isnull=True).exclude(sheet_url='')
+        if options['exam_ids']:
+            exams = exams.filter(id__in=options['exam_ids'])
+        else:
+            now = timezone.now()
+            exams = exams.filter(date__gte=now, date__lte=now + timezone.timedelta(days=options['days']))
+        exams = list(exams.order_by('date'))
+        if not exams:
+            self.stdout.write('No exams with question sheets to refresh.')
+            return
+
+        # Several exams can share one spreadsheet; it is read once for all of them
+        exams_by_sheet = defaultdict(list)
+        failed = 0
+        for exam in exams:
+            try:
+                exams_by_sheet[extract_sheet_id(exam.sheet_url)].append(exam)
+            except ValueError as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'Exam {exam.id} "{exam.title}": {e}: {exam.sheet_url}'))
+
+        start = time.perf_counter()
+        results = batch_fetch_question_banks(
+            {sheet_id: [QUESTION_RANGE] for sheet_id in exams_by_sheet},
+            concurrency=options['concurrency'],
+            max_retries=options['max_retries'],
+            base_delay=options['backoff'],
+        )
+        fetch_time = time.perf_counter() - start
+
+        total_calls = 0
+        for sheet_id, sheet_exams in exams_by_sheet.items():
+            result = results[sheet_id]
+            total_calls += result.api_calls
+            calls_per_exam = result.api_calls / len(sheet_exams)
+            for exam in sheet_exams:
+                label = f'Exam {exam.id} "{exam.title}" ({calls_per_exam:.2g} API calls, {result.elapsed:.2f}s)'
+                if result.error is not None:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'{label}: cannot read sheet: {result.error}'))
+                    continue
+
+                bank = result.banks[QUESTION_RANGE]
+                if bank.content_hash == exam.sheet_content_hash:
+                    self.stdout.write(self.style.SUCCESS(f'{label}: sheet unchanged since the last sync, skipped'))
+                    continue
+                validator = ExamValidator()
+                if not validator.validate_question_format(bank.questions, bank.headers):
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'{label}: {len(validator.errors)} error(s)'))
+                    for error in validator.errors:
+                        self.stdout.write(f'    {error}')
+                    continue
+
+                message = f'{label}: {len(bank.rows)} questions OK'
+                if validator.warnings:
+                    message += f', {len(validator.warnings)} warning(s)'
+                if options['resync']:
+                    try:
+                        changes = resync_exam_questions(exam, bank.questions, content_hash=bank.content_hash)
+                        message += (f'; re-synced {changes["updated"]} updated, {changes["inserted"]} added, '
+                                    f'{changes["deleted"]} removed, {changes["moved"]} moved')
+                    except QuestionImportError as e:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f'{label}: re-sync rejected: {"; ".join(e.errors)}'))
+                        continue
+                self.stdout.write(self.style.SUCCESS(message))
+
+        elapsed = time.perf_counter() - start
+        summary = (f'{len(exams)} exam(s) from {len(exams_by_sheet)} spreadsheet(s): {total_calls} API call(s), '
+                   f'fetched in {fetch_time:.2f}s, {elapsed:.2f}s total')
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{summary}; {failed} exam(s) need attention'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
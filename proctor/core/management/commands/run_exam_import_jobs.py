@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.Modules.ExamImportJobModule import (
+    DEFAULT_LEASE, claim_next_job, requeue_stale_jobs, run_exam_import_job,
+)
+
+
+class Command(BaseCommand):
+    help = 'Worker that runs queued sheet-backed exam imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the queued jobs and exit')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between checks when the queue is empty')
+        parser.add_argument('--chunk-rows', type=int, default=500, help='Sheet rows fetched per request')
+        parser.add_argument('--lease', type=int, default=int(DEFAULT_LEASE.total_seconds()),
+                            help='Seconds a running job may go without progress before another worker requeues it')
+
+    def handle(self, *args, **options):
+        lease = timedelta(seconds=options['lease'])
+        while True:
+            close_old_connections()
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} import job(s) whose worker stopped'))
+
+            job = claim_next_job(lease)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Running import job {job.id}: {job.title}')
+            start = time.perf_counter()
+            run_exam_import_job(job, chunk_rows=options['chunk_rows'], lease=lease)
+            elapsed = time.perf_counter() - start
+            if job.status == 'succeeded':
+                self.stdout.write(self.style.SUCCESS(
+                    f'  Created exam {job.exam_id} with {job.questions_imported} questions in {elapsed:.1f}s'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'  Failed after {elapsed:.1f}s: {job.errors}'))
@@ -0,0 +1,61 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.Modules.OutboxModule import claim_batch, deliver_batch, purge_old_emails, requeue_stale_emails
+from core.Modules.send_email_using_sheets import SmartFaceProctorMailer
+
+
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Worker that sends the emails queued in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send the emails that are due and exit')
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails claimed per batch')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='SMTP connections used at once (rate limited by PROCTOR_SMTP_RATE_LIMITS)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between checks when nothing is due')
+        parser.add_argument('--stale-after', type=int, default=10,
+                            help='Requeue emails left sending this many minutes by a dead worker')
+        parser.add_argument('--keep-days', type=int, default=30,
+                            help='Delete sent and dead emails this many days old (checked hourly)')
+
+    def handle(self, *args, **options):
+        mailer = SmartFaceProctorMailer()
+        stale_after = timedelta(minutes=options['stale_after'])
+        keep = timedelta(days=options['keep_days'])
+        next_purge = 0
+
+        while True:
+            close_old_connections()
+            if time.monotonic() >= next_purge:
+                purged = purge_old_emails(keep)
+                if purged:
+                    self.stdout.write(f'Deleted {purged} email(s) older than {options["keep_days"]} day(s)')
+                next_purge = time.monotonic() + PURGE_INTERVAL
+            requeued = requeue_stale_emails(stale_after)
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale email(s)'))
+
+            batch = claim_batch(options['batch_size'])
+            if not batch:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            start = time.perf_counter()
+            counts = deliver_batch(batch, mailer, workers=options['workers'])
+            elapsed = time.perf_counter() - start
+            message = (f'Sent {counts["sent"]} of {len(batch)} email(s) in {elapsed:.2f}s; '
+                       f'{counts["retried"]} to retry, {counts["dead"]} dead')
+            if counts['dead']:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def close_existing_episodes(apps, schema_editor):
+    """Existing rows are single detections, so each episode ends where it started"""
+    Violation = apps.get_model('core', 'Violation')
+    Violation.objects.update(ended_at=models.F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_exam_is_selective_alter_user_role_examassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='violation',
+            name='ended_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='violation',
+            name='frame_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='violation',
+            name='peak_severity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='violation',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(close_existing_episodes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='violation',
+            index=models.Index(fields=['exam', 'student', 'type', 'ended_at'], name='core_violation_episode_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_violation_episodes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('stage', models.CharField(choices=[('queued', 'Waiting for a worker'), ('validating', 'Validating exam details'), ('fetching', 'Reading the question sheet'), ('importing', 'Importing questions'), ('done', 'Done')], default='queued', max_length=12)),
+                ('title', models.CharField(max_length=100)),
+                ('date', models.DateTimeField()),
+                ('duration_minutes', models.PositiveIntegerField()),
+                ('warning_limit', models.CharField(blank=True, max_length=10)),
+                ('sheet_url', models.URLField()),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('rows_total', models.PositiveIntegerField(default=0)),
+                ('questions_imported', models.PositiveIntegerField(default=0)),
+                ('errors', models.TextField(blank=True, help_text='One error per line')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_import_jobs', to=settings.AUTH_USER_MODEL)),
+                ('exam', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to='core.exam')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='core_import_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_outbound_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('role', models.CharField(db_index=True, max_length=10)),
+                ('ip_address', models.CharField(blank=True, db_index=True, max_length=45)),
+                ('user_agent', models.TextField(blank=True)),
+                ('is_admin_session', models.BooleanField(default=False)),
+                ('in_exam', models.BooleanField(db_index=True, default=False)),
+                ('exam_start_time', models.DateTimeField(blank=True, null=True)),
+                ('login_count', models.PositiveIntegerField(default=0)),
+                ('session_start', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_activity', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('expire_date', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'expire_date'], name='core_user_session_user_idx')],
+            },
+        ),
+    ]
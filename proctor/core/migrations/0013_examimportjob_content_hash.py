@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_user_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examimportjob',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Hash of the sheet rows shown on the preview page', max_length=64),
+        ),
+    ]
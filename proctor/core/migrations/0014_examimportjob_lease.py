@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_examimportjob_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examimportjob',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_examimportjob_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedQuestionBank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('rows', models.JSONField(help_text='Header row followed by the question rows')),
+                ('uploaded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploaded_question_banks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('created_by', 'content_hash'), name='core_uploaded_bank_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_uploaded_question_banks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
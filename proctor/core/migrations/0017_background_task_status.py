@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_question_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundTaskStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('running', models.BooleanField(default=False)),
+                ('summary', models.TextField(blank=True)),
+                ('failed', models.JSONField(blank=True, default=list, help_text='[recipient, error] pairs')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_background_task_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserImportReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32, unique=True)),
+                ('content', models.TextField(help_text='The report as CSV text')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
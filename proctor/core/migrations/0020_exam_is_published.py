@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='is_published',
+            field=models.BooleanField(default=True, help_text='False while the questions are still being imported'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_exam_is_published'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='sheet_content_hash',
+            field=models.CharField(blank=True, help_text='Hash of the sheet rows the questions were last synced from', max_length=64),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from datetime import timedelta
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -17,6 +19,13 @@ class User(AbstractUser):
         return f"{self.username} ({self.role})"
 
 
+class PublishedExamManager(models.Manager):
+    """Exams whose questions have all been imported"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_published=True)
+
+
 class Exam(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -24,7 +33,14 @@ class Exam(models.Model):
     duration_minutes = models.PositiveIntegerField()
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'Faculty'})
     sheet_url = models.URLField(blank=True, null=True)
+    sheet_content_hash = models.CharField(max_length=64, blank=True,
+                                          help_text="Hash of the sheet rows the questions were last synced from")
     is_selective = models.BooleanField(default=False, help_text="If True, only assigned students can take this exam")
+    is_published = models.BooleanField(default=True, help_text="False while the questions are still being imported")
+
+    # Exams still being imported are hidden everywhere except through all_objects
+    objects = PublishedExamManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return f"{self.title} on {self.date.strftime('%d-%m-%Y %H:%M')}"
@@ -57,20 +73,77 @@ class Submission(models.Model):
 
 
 class Violation(models.Model):
+    """
+    A violation episode: consecutive detections of the same type for one student
+    in one exam, merged while they are less than EPISODE_GAP_SECONDS apart.
+    `timestamp` is when the episode started and `ended_at` its latest detection.
+    """
     VIOLATION_TYPES = (
         ('Distraction', 'Distraction'),
         ('Face Missing', 'Face Missing'),
         ('Multiple Faces', 'Multiple Faces'),
     )
+    EPISODE_GAP_SECONDS = 10
 
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'Student'})
     type = models.CharField(max_length=20, choices=VIOLATION_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    ended_at = models.DateTimeField(default=timezone.now)
+    peak_severity = models.FloatField(default=0)
+    frame_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['exam', 'student', 'type', 'ended_at'], name='core_violation_episode_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.type} @ {self.timestamp}"
 
+    @property
+    def duration_seconds(self):
+        return (self.ended_at - self.timestamp).total_seconds()
+
+    @classmethod
+    def record_detection(cls, exam, student, violation_type, severity=0.0, detected_at=None, gap_seconds=None):
+        """
+        Fold one flagged detection into the student's open episode of the same
+        type, or start a new episode if the last one ended more than the gap ago.
+        Returns the episode's primary key, so it can be used as a
+        DistractionDetector violation_handler (the ID goes into the JSON
+        evidence index).
+        """
+        detected_at = detected_at or timezone.now()
+        gap = timedelta(seconds=cls.EPISODE_GAP_SECONDS if gap_seconds is None else gap_seconds)
+
+        with transaction.atomic():
+            # Lock the student first: while no episode is open there is no row to
+            # lock, and two detections arriving together would both start one
+            User.objects.select_for_update().filter(pk=student.pk).values_list('pk', flat=True).first()
+            episode = (
+                cls.objects.select_for_update()
+                .filter(exam=exam, student=student, type=violation_type, ended_at__gte=detected_at - gap)
+                .order_by('-ended_at')
+                .first()
+            )
+            if episode is None:
+                episode = cls.objects.create(
+                    exam=exam,
+                    student=student,
+                    type=violation_type,
+                    timestamp=detected_at,
+                    ended_at=detected_at,
+                    peak_severity=severity,
+                )
+                return episode.pk
+
+            episode.ended_at = max(episode.ended_at, detected_at)
+            episode.peak_severity = max(episode.peak_severity, severity)
+            episode.frame_count += 1
+            episode.save(update_fields=['ended_at', 'peak_severity', 'frame_count'])
+            return episode.pk
+
 
 class Question(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='questions')
@@ -80,11 +153,104 @@ class Question(models.Model):
     option_c = models.CharField(max_length=255)
     option_d = models.CharField(max_length=255)
     answer = models.CharField(max_length=10)
+    # Index of the question's row in the sheet; questions are shown in this order
+    position = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.text[:50]}..."
 
 
+class ExamImportJob(models.Model):
+    """
+    Sheet-backed exam creation queued by schedule_exam and run by the
+    run_exam_import_jobs worker, so the faculty request never waits on Sheets.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    STAGE_CHOICES = (
+        ('queued', 'Waiting for a worker'),
+        ('validating', 'Validating exam details'),
+        ('fetching', 'Reading the question sheet'),
+        ('importing', 'Importing questions'),
+        ('done', 'Done'),
+    )
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exam_import_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    stage = models.CharField(max_length=12, choices=STAGE_CHOICES, default='queued')
+
+    # Exam details as submitted
+    title = models.CharField(max_length=100)
+    date = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField()
+    warning_limit = models.CharField(max_length=10, blank=True)
+    sheet_url = models.URLField()
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    help_text="Hash of the sheet rows shown on the preview page")
+
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_total = models.PositiveIntegerField(default=0)
+    questions_imported = models.PositiveIntegerField(default=0)
+    errors = models.TextField(blank=True, help_text="One error per line")
+    exam = models.ForeignKey(Exam, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the worker while it runs the job; once it lapses the job is requeued
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='core_import_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Import of {self.title} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def to_status_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'stage_display': self.get_stage_display(),
+            'rows_processed': self.rows_processed,
+            'rows_total': self.rows_total,
+            'questions_imported': self.questions_imported,
+            'errors': self.errors.splitlines(),
+            'exam_id': self.exam_id,
+        }
+
+
+class UploadedQuestionBank(models.Model):
+    """
+    Question file parsed on the schedule preview page, kept until the faculty
+    confirms the exam. Stored in the database so the confirming request can be
+    served by any worker process.
+    """
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploaded_question_banks')
+    content_hash = models.CharField(max_length=64)
+    file_name = models.CharField(max_length=255, blank=True)
+    rows = models.JSONField(help_text="Header row followed by the question rows")
+    uploaded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'content_hash'], name='core_uploaded_bank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name or self.content_hash} uploaded by {self.created_by}"
+
+
 class BugReport(models.Model):
     BUG_TYPE_CHOICES = (
         ('technical', 'Technical Issue'),
@@ -141,3 +307,104 @@ class PasswordResetOTP(models.Model):
         from django.utils import timezone
         from datetime import timedelta
         return timezone.now() > self.created_at + timedelta(minutes=15)
+
+
+class OutboundEmail(models.Model):
+    """
+    Outbox row for an email sent by the send_queued_emails worker instead of
+    inside a request. Delivery is at-least-once: a worker that dies between
+    sending and recording the result leaves the row to be sent again.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead letter'),
+    )
+    KIND_CHOICES = (
+        ('otp', 'Password reset OTP'),
+        ('password_reset', 'Password reset'),
+        ('welcome', 'Welcome'),
+        ('other', 'Other'),
+    )
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='other')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="Not worth sending after this, e.g. an OTP")
+    last_error = models.TextField(blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='core_outbox_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} email to {self.recipient} ({self.status})"
+
+
+class UserImportReport(models.Model):
+    """Per-row problem report of a CSV user import, downloadable by its token for a day"""
+    token = models.CharField(max_length=32, unique=True)
+    content = models.TextField(help_text="The report as CSV text")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"User import report {self.token}"
+
+
+class BackgroundTaskStatus(models.Model):
+    """
+    State of a long-running task started from the admin, such as sending the
+    onboarding sheet emails. Kept in the database so every web process sees
+    the same lock and outcome.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    running = models.BooleanField(default=False)
+    summary = models.TextField(blank=True)
+    failed = models.JSONField(default=list, blank=True, help_text="[recipient, error] pairs")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({'running' if self.running else 'idle'})"
+
+
+class UserSession(models.Model):
+    """
+    Registry of logged-in sessions with the fields the session monitor needs
+    as indexed columns, so it never has to decode django_session rows.
+    Rows are written on login, kept current by UserSessionRegistryMiddleware
+    and removed on logout or when SessionManager terminates the session.
+    """
+    session_key = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_sessions')
+    role = models.CharField(max_length=10, db_index=True)
+    ip_address = models.CharField(max_length=45, blank=True, db_index=True)
+    user_agent = models.TextField(blank=True)
+    is_admin_session = models.BooleanField(default=False)
+    in_exam = models.BooleanField(default=False, db_index=True)
+    exam_start_time = models.DateTimeField(null=True, blank=True)
+    login_count = models.PositiveIntegerField(default=0)
+    session_start = models.DateTimeField(default=timezone.now)
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True)
+    expire_date = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expire_date'], name='core_user_session_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Session of {self.user_id} from {self.ip_address or 'unknown'}"
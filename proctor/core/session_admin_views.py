@@ -10,7 +10,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.sessions.models import Session
 from django.utils import timezone
 from .admin_views import admin_required
-from .session_utils import SessionManager, SessionSecurity
+from .session_utils import SessionManager, SessionSecurity, get_monitor_snapshot, invalidate_monitor_snapshot
 from .models import User
 
 
@@ -18,15 +18,6 @@ from .models import User
 def admin_session_monitor(request):
     """Session monitoring dashboard for admins"""
     
-    # Get session statistics
-    stats = SessionManager.get_session_statistics()
-    
-    # Get active sessions
-    active_sessions = SessionManager.get_active_sessions()
-    
-    # Get suspicious sessions
-    suspicious_sessions = SessionSecurity.detect_suspicious_sessions()
-    
     # Process actions
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -41,11 +32,9 @@ def admin_session_monitor(request):
             
         elif action == 'terminate_session':
             session_key = request.POST.get('session_key')
-            try:
-                session = Session.objects.get(session_key=session_key)
-                session.delete()
+            if SessionManager.terminate_session(session_key):
                 messages.success(request, 'Session terminated successfully.')
-            except Session.DoesNotExist:
+            else:
                 messages.error(request, 'Session not found.')
                 
         elif action == 'terminate_user_sessions':
@@ -57,13 +46,21 @@ def admin_session_monitor(request):
             except User.DoesNotExist:
                 messages.error(request, 'User not found.')
         
+        # Show the effect of the action rather than the cached snapshot
+        invalidate_monitor_snapshot()
         return redirect('admin_session_monitor')
     
+    # Statistics, active and suspicious sessions, cached for a few seconds
+    snapshot = get_monitor_snapshot()
+    active_sessions = snapshot['active_sessions']
+    suspicious_sessions = snapshot['suspicious_sessions']
+    
     context = {
         'admin': request.user,
-        'stats': stats,
+        'stats': snapshot['stats'],
         'active_sessions': active_sessions,
         'suspicious_sessions': suspicious_sessions,
+        'snapshot_time': snapshot['generated_at'],
         'total_active': len(active_sessions),
         'total_suspicious': len(suspicious_sessions)
     }
@@ -88,11 +85,9 @@ def admin_user_sessions(request, user_id):
             
             elif action == 'terminate_session':
                 session_key = request.POST.get('session_key')
-                try:
-                    session = Session.objects.get(session_key=session_key)
-                    session.delete()
+                if SessionManager.terminate_session(session_key):
                     messages.success(request, 'Session terminated successfully.')
-                except Session.DoesNotExist:
+                else:
                     messages.error(request, 'Session not found.')
                 return redirect('admin_user_sessions', user_id=user_id)
         
@@ -14,6 +14,11 @@ from django.utils import timezone
 from datetime import timedelta
 
 
+def activity_granularity():
+    """Seconds last_activity may lag behind before it is written again"""
+    return getattr(settings, 'SESSION_ACTIVITY_GRANULARITY', 60)
+
+
 class SessionSecurityMiddleware(MiddlewareMixin):
     """
     Enhanced session security middleware that provides:
@@ -90,9 +95,10 @@ class SessionSecurityMiddleware(MiddlewareMixin):
                 logout(request)
                 return redirect('login')
         
-        # Update last activity
-        request.session['last_activity'] = current_time
-        request.session.modified = True
+        # Update last activity; only write it once it has moved by the
+        # granularity, so that most requests leave the session unmodified
+        if not last_activity or current_time - last_activity >= activity_granularity():
+            request.session['last_activity'] = current_time
         
         return None
     
@@ -117,9 +123,11 @@ class ExamSessionMiddleware(MiddlewareMixin):
         # Check if user is in an exam
         if request.path.startswith('/student/start-mcq-exam/') or request.path.startswith('/student/mcq-exam/'):
             if hasattr(request, 'user') and request.user.is_authenticated and request.user.role == 'Student':
-                # Track exam session
-                request.session['in_exam'] = True
-                request.session['exam_start_time'] = request.session.get('exam_start_time', time.time())
+                # Track exam session; assigning marks the session modified, so only set what changed
+                if not request.session.get('in_exam'):
+                    request.session['in_exam'] = True
+                if 'exam_start_time' not in request.session:
+                    request.session['exam_start_time'] = time.time()
                 
                 # Prevent multiple tabs/windows during exam
                 exam_session_id = request.session.get('exam_session_id')
@@ -130,7 +138,8 @@ class ExamSessionMiddleware(MiddlewareMixin):
                     # Log violation here if needed
                     return redirect('student_exams')
                 
-                request.session['exam_session_id'] = current_session_id
+                if exam_session_id != current_session_id:
+                    request.session['exam_session_id'] = current_session_id
         
         # Clear exam session when not in exam
         elif request.session.get('in_exam'):
@@ -141,38 +150,20 @@ class ExamSessionMiddleware(MiddlewareMixin):
         return None
 
 
-class SessionCleanupMiddleware(MiddlewareMixin):
+class UserSessionRegistryMiddleware(MiddlewareMixin):
     """
-    Middleware to clean up expired sessions and perform maintenance
+    Keeps the UserSession registry row of authenticated sessions current
+    (last activity, expiry, exam state). The row is written only when the
+    session itself is about to be saved: the activity and exam middleware
+    modify the session only when something changed or last_activity is
+    older than SESSION_ACTIVITY_GRANULARITY, and the registry follows suit.
     """
     
-    def process_request(self, request):
-        """Perform session cleanup periodically"""
-        
-        # Only run cleanup occasionally to avoid performance impact
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is None or not session.modified:
+            return response
         if hasattr(request, 'user') and request.user.is_authenticated:
-            last_cleanup = request.session.get('last_cleanup', 0)
-            current_time = time.time()
-            
-            # Run cleanup every hour
-            if current_time - last_cleanup > 3600:
-                self.cleanup_expired_sessions()
-                request.session['last_cleanup'] = current_time
-        
-        return None
-    
-    def cleanup_expired_sessions(self):
-        """Clean up expired sessions from database"""
-        try:
-            from django.contrib.sessions.models import Session
-            from django.utils import timezone
-            
-            # Delete expired sessions
-            expired_sessions = Session.objects.filter(expire_date__lt=timezone.now())
-            expired_count = expired_sessions.count()
-            expired_sessions.delete()
-            
-            print(f"Cleaned up {expired_count} expired sessions")
-            
-        except Exception as e:
-            print(f"Error during session cleanup: {e}")
+            from .session_utils import SessionManager
+            SessionManager.touch_session(request)
+        return response
@@ -3,112 +3,193 @@ Session management utilities for the Proctor System.
 Provides session monitoring, cleanup, and security functions.
 """
 
-import time
+from collections import defaultdict
 from django.contrib.sessions.models import Session
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
+import time
+
+from .models import UserSession
 
 User = get_user_model()
 
+DEFAULT_CLEANUP_CHUNK_SIZE = 1000
+
+
+def get_client_ip(request):
+    """Get the client's IP address"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def _timestamp(value):
+    return value.timestamp() if value else None
+
+
+def _session_info(user_session):
+    return {
+        'session_key': user_session.session_key,
+        'expire_date': user_session.expire_date,
+        'last_activity': _timestamp(user_session.last_activity),
+        'ip_address': user_session.ip_address or 'Unknown',
+        'user_agent': user_session.user_agent or 'Unknown',
+        'login_count': user_session.login_count,
+        'in_exam': user_session.in_exam,
+        'is_admin_session': user_session.is_admin_session
+    }
+
 
 class SessionManager:
-    """Utility class for managing user sessions"""
+    """
+    Utility class for managing user sessions.
+    Lookups go through the indexed UserSession registry instead of decoding
+    every row of django_session.
+    """
+    
+    @staticmethod
+    def register_session(request, user):
+        """Add or refresh the registry row of the request's session (called on login)"""
+        session_key = request.session.session_key
+        if not session_key:
+            return None
+        now = timezone.now()
+        user_session, _ = UserSession.objects.update_or_create(
+            session_key=session_key,
+            defaults={
+                'user': user,
+                'role': getattr(user, 'role', '') or '',
+                'ip_address': (get_client_ip(request) or '')[:45],
+                'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+                'is_admin_session': bool(request.session.get('is_admin_session', False)),
+                'in_exam': bool(request.session.get('in_exam', False)),
+                'login_count': request.session.get('login_count', 0),
+                'session_start': now,
+                'last_activity': now,
+                'expire_date': request.session.get_expiry_date(),
+            }
+        )
+        return user_session
+    
+    @staticmethod
+    def touch_session(request):
+        """Record activity on the request's session; registers it if it predates the registry"""
+        session_key = request.session.session_key
+        if not session_key:
+            return
+        exam_start = request.session.get('exam_start_time')
+        updated = UserSession.objects.filter(session_key=session_key).update(
+            last_activity=timezone.now(),
+            expire_date=request.session.get_expiry_date(),
+            in_exam=bool(request.session.get('in_exam', False)),
+            exam_start_time=datetime.fromtimestamp(exam_start, tz=dt_timezone.utc) if exam_start else None,
+            is_admin_session=bool(request.session.get('is_admin_session', False)),
+        )
+        if not updated:
+            SessionManager.register_session(request, request.user)
+    
+    @staticmethod
+    def unregister_session(session_key):
+        if session_key:
+            UserSession.objects.filter(session_key=session_key).delete()
+    
+    @staticmethod
+    def terminate_session(session_key):
+        """Delete one session and its registry row; returns True if the session existed"""
+        deleted, _ = Session.objects.filter(session_key=session_key).delete()
+        UserSession.objects.filter(session_key=session_key).delete()
+        return bool(deleted)
     
     @staticmethod
     def get_active_sessions():
-        """Get all active sessions with user information"""
+        """
+        Get all active sessions with user information, as plain values only
+        (the user is a dict of id, username and email) so the list can be cached.
+        """
         active_sessions = []
-        current_time = timezone.now()
+        registry = UserSession.objects.filter(expire_date__gt=timezone.now()).select_related('user').only(
+            'session_key', 'expire_date', 'last_activity', 'ip_address', 'user_agent', 'login_count',
+            'in_exam', 'is_admin_session', 'role', 'user__username', 'user__email'
+        )
         
-        for session in Session.objects.filter(expire_date__gt=current_time):
-            try:
-                session_data = session.get_decoded()
-                user_id = session_data.get('_auth_user_id')
-                
-                if user_id:
-                    try:
-                        user = User.objects.get(id=user_id)
-                        session_info = {
-                            'session_key': session.session_key,
-                            'user': user,
-                            'user_role': session_data.get('user_role', 'Unknown'),
-                            'expire_date': session.expire_date,
-                            'last_activity': session_data.get('last_activity'),
-                            'ip_address': session_data.get('ip_address', 'Unknown'),
-                            'user_agent': session_data.get('user_agent', 'Unknown'),
-                            'login_count': session_data.get('login_count', 0),
-                            'in_exam': session_data.get('in_exam', False),
-                            'is_admin_session': session_data.get('is_admin_session', False)
-                        }
-                        active_sessions.append(session_info)
-                    except User.DoesNotExist:
-                        # Session exists but user doesn't - mark for cleanup
-                        session.delete()
-            except Exception as e:
-                print(f"Error processing session {session.session_key}: {e}")
+        for user_session in registry:
+            session_info = _session_info(user_session)
+            session_info['user'] = {
+                'id': user_session.user_id,
+                'username': user_session.user.username,
+                'email': user_session.user.email,
+            }
+            session_info['user_role'] = user_session.role or 'Unknown'
+            active_sessions.append(session_info)
                 
         return active_sessions
     
     @staticmethod
     def get_user_sessions(user):
         """Get all active sessions for a specific user"""
-        user_sessions = []
-        current_time = timezone.now()
-        
-        for session in Session.objects.filter(expire_date__gt=current_time):
-            try:
-                session_data = session.get_decoded()
-                session_user_id = session_data.get('_auth_user_id')
-                
-                if session_user_id and int(session_user_id) == user.id:
-                    session_info = {
-                        'session_key': session.session_key,
-                        'expire_date': session.expire_date,
-                        'last_activity': session_data.get('last_activity'),
-                        'ip_address': session_data.get('ip_address', 'Unknown'),
-                        'user_agent': session_data.get('user_agent', 'Unknown'),
-                        'login_count': session_data.get('login_count', 0),
-                        'in_exam': session_data.get('in_exam', False),
-                        'is_admin_session': session_data.get('is_admin_session', False)
-                    }
-                    user_sessions.append(session_info)
-            except Exception as e:
-                print(f"Error processing session for user {user.username}: {e}")
-                
-        return user_sessions
+        registry = UserSession.objects.filter(user=user, expire_date__gt=timezone.now())
+        return [_session_info(user_session) for user_session in registry]
     
     @staticmethod
     def terminate_user_sessions(user, exclude_session_key=None):
         """Terminate all sessions for a specific user"""
-        terminated_count = 0
-        current_time = timezone.now()
+        registry = UserSession.objects.filter(user=user)
+        if exclude_session_key:
+            registry = registry.exclude(session_key=exclude_session_key)
+        session_keys = list(registry.values_list('session_key', flat=True))
+        if not session_keys:
+            return 0
         
-        for session in Session.objects.filter(expire_date__gt=current_time):
-            if exclude_session_key and session.session_key == exclude_session_key:
-                continue
-                
-            try:
-                session_data = session.get_decoded()
-                session_user_id = session_data.get('_auth_user_id')
-                
-                if session_user_id and int(session_user_id) == user.id:
-                    session.delete()
-                    terminated_count += 1
-            except Exception as e:
-                print(f"Error terminating session: {e}")
-                
+        terminated_count, _ = Session.objects.filter(
+            session_key__in=session_keys, expire_date__gt=timezone.now()
+        ).delete()
+        UserSession.objects.filter(session_key__in=session_keys).delete()
         return terminated_count
     
     @staticmethod
-    def cleanup_expired_sessions():
-        """Clean up expired sessions"""
-        current_time = timezone.now()
-        expired_sessions = Session.objects.filter(expire_date__lt=current_time)
-        expired_count = expired_sessions.count()
-        expired_sessions.delete()
-        return expired_count
+    def cleanup_expired_sessions(chunk_size=DEFAULT_CLEANUP_CHUNK_SIZE, pause=0.0):
+        """Clean up expired sessions; returns how many were deleted"""
+        return SessionManager.purge_expired_sessions(chunk_size=chunk_size, pause=pause)['sessions']
+    
+    @staticmethod
+    def purge_expired_sessions(chunk_size=DEFAULT_CLEANUP_CHUNK_SIZE, pause=0.0, max_chunks=None):
+        """
+        Delete expired sessions and their registry rows in primary key order,
+        at most chunk_size rows per DELETE and sleeping pause seconds between
+        chunks, so no statement holds locks on the session table for long.
+        max_chunks bounds a run; what is left is deleted by the next one.
+        Returns the counts of deleted sessions, registry rows and chunks.
+        """
+        cutoff = timezone.now()
+        counts = {'sessions': 0, 'registry': 0, 'chunks': 0}
+        
+        for model, counter in ((Session, 'sessions'), (UserSession, 'registry')):
+            last_pk = None
+            while max_chunks is None or counts['chunks'] < max_chunks:
+                expired = model.objects.filter(expire_date__lt=cutoff).order_by('pk')
+                if last_pk is not None:
+                    expired = expired.filter(pk__gt=last_pk)
+                pks = list(expired.values_list('pk', flat=True)[:chunk_size])
+                if not pks:
+                    break
+                last_pk = pks[-1]
+                
+                # Expiry is checked again: the session may have been used since the SELECT
+                deleted, _ = model.objects.filter(pk__in=pks, expire_date__lt=cutoff).delete()
+                counts[counter] += deleted
+                counts['chunks'] += 1
+                if len(pks) < chunk_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+        
+        return counts
     
     @staticmethod
     def get_session_statistics():
@@ -117,22 +198,20 @@ class SessionManager:
         
         total_sessions = Session.objects.count()
         active_sessions = Session.objects.filter(expire_date__gt=current_time).count()
-        expired_sessions = Session.objects.filter(expire_date__lt=current_time).count()
+        expired_sessions = total_sessions - active_sessions
         
         # Count sessions by role
         role_counts = {'Student': 0, 'Faculty': 0, 'Admin': 0, 'Unknown': 0}
-        exam_sessions = 0
+        registry = UserSession.objects.filter(expire_date__gt=current_time)
+        registered = 0
+        for row in registry.values('role').annotate(count=Count('id')):
+            role = row['role'] or 'Unknown'
+            role_counts[role] = role_counts.get(role, 0) + row['count']
+            registered += row['count']
+        # Anonymous sessions (e.g. a password reset in progress) have no registry row
+        role_counts['Unknown'] += max(0, active_sessions - registered)
         
-        for session in Session.objects.filter(expire_date__gt=current_time):
-            try:
-                session_data = session.get_decoded()
-                role = session_data.get('user_role', 'Unknown')
-                role_counts[role] = role_counts.get(role, 0) + 1
-                
-                if session_data.get('in_exam', False):
-                    exam_sessions += 1
-            except Exception:
-                role_counts['Unknown'] += 1
+        exam_sessions = registry.filter(in_exam=True).count()
         
         return {
             'total_sessions': total_sessions,
@@ -146,55 +225,60 @@ class SessionManager:
 class SessionSecurity:
     """Security utilities for session management"""
     
+    MAX_CONCURRENT_SESSIONS = 3
+    MAX_SESSION_SECONDS = 24 * 60 * 60
+    MAX_EXAM_SECONDS = 3 * 60 * 60
+    
     @staticmethod
     def detect_suspicious_sessions():
-        """Detect potentially suspicious sessions"""
+        """
+        Detect potentially suspicious sessions.
+        One query over the session registry, grouped by user, with every rule
+        applied in the same pass.
+        """
         suspicious_sessions = []
-        current_time = timezone.now()
+        now = timezone.now()
         
-        for session in Session.objects.filter(expire_date__gt=current_time):
-            try:
-                session_data = session.get_decoded()
-                user_id = session_data.get('_auth_user_id')
-                
-                if not user_id:
-                    continue
-                
+        sessions_by_user = defaultdict(list)
+        registry = UserSession.objects.filter(expire_date__gt=now).order_by('user_id', 'id').values_list(
+            'user_id', 'session_key', 'session_start', 'in_exam', 'exam_start_time'
+        )
+        for user_id, session_key, session_start, in_exam, exam_start in registry:
+            sessions_by_user[user_id].append((session_key, session_start, in_exam, exam_start))
+        
+        for user_id, user_sessions in sessions_by_user.items():
+            session_count = len(user_sessions)
+            for session_key, session_start, in_exam, exam_start in user_sessions:
                 # Check for multiple sessions from different IPs
-                user_sessions = SessionManager.get_user_sessions(User.objects.get(id=user_id))
-                if len(user_sessions) > 3:  # More than 3 concurrent sessions
+                if session_count > SessionSecurity.MAX_CONCURRENT_SESSIONS:
                     suspicious_sessions.append({
                         'type': 'multiple_sessions',
                         'user_id': user_id,
-                        'session_count': len(user_sessions),
-                        'session_key': session.session_key
+                        'session_count': session_count,
+                        'session_key': session_key
                     })
                 
                 # Check for very long sessions
-                session_start = session_data.get('session_start')
                 if session_start:
-                    session_duration = time.time() - session_start
-                    if session_duration > 86400:  # More than 24 hours
+                    session_duration = (now - session_start).total_seconds()
+                    if session_duration > SessionSecurity.MAX_SESSION_SECONDS:
                         suspicious_sessions.append({
                             'type': 'long_session',
                             'user_id': user_id,
                             'duration_hours': session_duration / 3600,
-                            'session_key': session.session_key
+                            'session_key': session_key
                         })
                 
                 # Check for exam sessions that are too long
-                if session_data.get('in_exam', False):
-                    exam_start = session_data.get('exam_start_time')
-                    if exam_start and (time.time() - exam_start) > 10800:  # More than 3 hours
+                if in_exam and exam_start:
+                    exam_duration = (now - exam_start).total_seconds()
+                    if exam_duration > SessionSecurity.MAX_EXAM_SECONDS:
                         suspicious_sessions.append({
                             'type': 'long_exam_session',
                             'user_id': user_id,
-                            'exam_duration_hours': (time.time() - exam_start) / 3600,
-                            'session_key': session.session_key
+                            'exam_duration_hours': exam_duration / 3600,
+                            'session_key': session_key
                         })
-                        
-            except Exception as e:
-                print(f"Error checking session security: {e}")
         
         return suspicious_sessions
     
@@ -206,13 +290,40 @@ class SessionSecurity:
         
         for suspicious in suspicious_sessions:
             try:
-                session = Session.objects.get(session_key=suspicious['session_key'])
-                session.delete()
-                terminated_count += 1
-                print(f"Terminated suspicious session: {suspicious['type']} for user {suspicious['user_id']}")
-            except Session.DoesNotExist:
-                pass
+                if SessionManager.terminate_session(suspicious['session_key']):
+                    terminated_count += 1
+                    print(f"Terminated suspicious session: {suspicious['type']} for user {suspicious['user_id']}")
             except Exception as e:
                 print(f"Error terminating suspicious session: {e}")
         
         return terminated_count
+
+
+MONITOR_SNAPSHOT_KEY = 'session_monitor:snapshot'
+
+
+def get_monitor_snapshot(max_age=None):
+    """
+    Statistics, active and suspicious sessions for the session monitor page,
+    cached for SESSION_MONITOR_CACHE_SECONDS (default 10) so that reloads and
+    several admins watching at once do not repeat the queries. The snapshot
+    holds only plain values (no model instances), so the cached row stays small.
+    """
+    snapshot = cache.get(MONITOR_SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = {
+            'stats': SessionManager.get_session_statistics(),
+            'active_sessions': SessionManager.get_active_sessions(),
+            'suspicious_sessions': SessionSecurity.detect_suspicious_sessions(),
+            'generated_at': timezone.now(),
+        }
+        if max_age is None:
+            max_age = getattr(settings, 'SESSION_MONITOR_CACHE_SECONDS', 10)
+        cache.set(MONITOR_SNAPSHOT_KEY, snapshot, max_age)
+    return snapshot
+
+
+def invalidate_monitor_snapshot():
+    """Drop the cached snapshot, e.g. after terminating sessions"""
+    cache.delete(MONITOR_SNAPSHOT_KEY)
+
@@ -0,0 +1,22 @@
+"""
+Signal handlers of the core app, connected in CoreConfig.ready().
+"""
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.dispatch import receiver
+
+from .session_utils import SessionManager
+
+
+@receiver(user_logged_in)
+def register_user_session(sender, request, user, **kwargs):
+    """Add the new session to the UserSession registry"""
+    if request is not None and hasattr(request, 'session'):
+        SessionManager.register_session(request, user)
+
+
+@receiver(user_logged_out)
+def unregister_user_session(sender, request, user, **kwargs):
+    """Drop the session from the registry; logout() flushes it right after"""
+    if request is not None and hasattr(request, 'session'):
+        SessionManager.unregister_session(request.session.session_key)
@@ -1,3 +1,1223 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import csv
+import io
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+
+from .FaceModules.DistractionDetectionModule import VIOLATION_TYPE_BY_LABEL, DistractionDetector
+from .FaceModules.EvidenceRecorderModule import EvidenceRecorder, load_evidence_frames, read_evidence_index
+from .FaceModules.SecondaryDetectorModule import (
+    SecondaryDetector, SecondaryDetectionScheduler, SecondaryDetectionStage,
+)
+from .FaceModules.TelemetryModule import (
+    FILE_HEADER, TELEMETRY_DTYPE, TelemetryReader, TelemetryWriter, downsample_metrics, lttb_indices,
+)
+from .admin import SHEET_EMAIL_LOCK_TIMEOUT, SHEET_EMAIL_TASK
+from .admin_middleware import AdminRateLimitMiddleware
+from .models import (
+    BackgroundTaskStatus, Exam, ExamImportJob, OutboundEmail, Question, UploadedQuestionBank, User, UserImportReport,
+    UserSession, Violation,
+)
+from .Modules.BulkMailerModule import RateLimiter, is_retryable
+from .Modules.ExamImportJobModule import (
+    claim_next_job, enqueue_exam_import, requeue_stale_jobs, run_exam_import_job,
+)
+from .Modules.ExamValidationModule import ExamValidator
+from .Modules.OutboxModule import (
+    claim_batch, deliver_batch, enqueue_email, enqueue_emails, purge_old_emails, requeue_stale_emails,
+)
+from .Modules.QuestionFileModule import get_uploaded_bank, parse_question_file, parse_xlsx
+from .Modules.QuestionImportModule import (
+    QuestionImportError, import_exam_questions, resync_exam_questions, stream_exam_questions,
+)
+from .Modules.SheetManagerModule import (
+    QUESTION_RANGE, QuestionBank, batch_fetch_question_banks, question_bank_cache,
+)
+from .Modules.SheetSourceModule import FakeSheetSource
+from .Modules.UserImportModule import UserImportError, get_import_report, import_users_from_csv
+from .Modules.UserProvisioningModule import HASH_CHUNK_SIZE, provision_users
+from .Modules.send_email_using_sheets import SmartFaceProctorMailer
+from .session_utils import SessionManager, SessionSecurity, get_monitor_snapshot, invalidate_monitor_snapshot
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class StubDetector(SecondaryDetector):
+    """Detector that reports one phone per frame and can be held mid-detection"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def detect(self, frame):
+        self.release.wait(5)
+        self.calls += 1
+        return [{'label': 'cell phone', 'confidence': 0.9, 'box': (0, 0, 10, 10)}]
+
+
+class SecondaryDetectionSchedulerTests(SimpleTestCase):
+    def test_single_stream_runs_once_per_min_interval(self):
+        clock = FakeClock()
+        scheduler = SecondaryDetectionScheduler(cpu_budget=0.5, min_interval=2.0, initial_cost=0.1, clock=clock)
+
+        self.assertTrue(scheduler.should_run('a'))
+        self.assertFalse(scheduler.should_run('a'))
+        clock.advance(1.9)
+        self.assertFalse(scheduler.should_run('a'))
+        clock.advance(0.1)
+        self.assertTrue(scheduler.should_run('a'))
+
+    def test_budget_is_shared_fairly_between_streams(self):
+        clock = FakeClock()
+        scheduler = SecondaryDetectionScheduler(cpu_budget=0.5, min_interval=2.0, max_interval=5.0,
+                                                initial_cost=0.2, clock=clock)
+        streams = [f'student-{i}' for i in range(20)]
+        runs = dict.fromkeys(streams, 0)
+
+        # 120 s of 10 fps video from every stream, each detection costing 0.2 s
+        for _ in range(1200):
+            for stream in streams:
+                if scheduler.should_run(stream):
+                    runs[stream] += 1
+                    scheduler.record_cost(0.2)
+            clock.advance(0.1)
+
+        # 20 streams * 0.2 s / 0.5 budget stretches the interval to 8 s
+        self.assertAlmostEqual(scheduler.interval(), 8.0)
+        self.assertLessEqual(max(runs.values()) - min(runs.values()), 1)
+        self.assertLessEqual(sum(runs.values()) * 0.2, 0.5 * 120 + scheduler.capacity)
+
+
+class SecondaryDetectionStageTests(SimpleTestCase):
+    def test_offer_runs_stub_detector_off_the_calling_thread(self):
+        clock = FakeClock()
+        results = []
+        detector = StubDetector()
+        stage = SecondaryDetectionStage(
+            detector,
+            scheduler=SecondaryDetectionScheduler(min_interval=2.0, initial_cost=0.01, clock=clock),
+            on_result=lambda stream_id, detections: results.append((stream_id, detections)),
+        )
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+        detector.release.clear()
+        future = stage.offer('a', frame)
+        self.assertIsNotNone(future)
+        # Still in flight, so further frames are dropped rather than queued
+        clock.advance(5)
+        self.assertIsNone(stage.offer('a', frame))
+        detector.release.set()
+        future.result(timeout=5)
+
+        self.assertEqual(detector.calls, 1)
+        self.assertEqual(results[0][0], 'a')
+        self.assertEqual(results[0][1][0]['label'], 'cell phone')
+        stage.shutdown()
+
+    def test_frames_between_intervals_are_not_processed(self):
+        clock = FakeClock()
+        detector = StubDetector()
+        stage = SecondaryDetectionStage(
+            detector,
+            scheduler=SecondaryDetectionScheduler(min_interval=2.0, initial_cost=0.01, clock=clock),
+        )
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+        for _ in range(30):
+            future = stage.offer('a', frame)
+            if future:
+                future.result(timeout=5)
+            clock.advance(1 / 30)
+
+        self.assertEqual(detector.calls, 1)
+        stage.shutdown()
+
+
+def synthetic_frame(value, width=64, height=48):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+class EvidenceRecorderTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage_dir = directory.name
+
+    def test_ring_buffer_samples_at_fps_and_keeps_the_last_seconds(self):
+        recorder = EvidenceRecorder(self.storage_dir, 'stream', seconds=2, fps=4, scale=0.5)
+        kept = [recorder.add_frame(synthetic_frame(i), timestamp=100 + i * 0.125) for i in range(40)]
+
+        # 8 frames a second offered, every other one sampled
+        self.assertEqual(kept[:4], [True, False, True, False])
+        self.assertEqual(len(recorder.frames), 8)
+        self.assertEqual(recorder.frames[0][0], 103.0)
+        self.assertEqual(recorder.frames[-1][0], 104.75)
+        self.assertEqual(recorder.frames[-1][1].shape, (24, 32, 3))
+
+    def test_trigger_writes_the_buffered_clip(self):
+        recorder = EvidenceRecorder(self.storage_dir, 'stream', seconds=1, fps=5, scale=1)
+        self.assertIsNone(recorder.trigger(violation_id=1))
+        for i in range(3):
+            recorder.add_frame(synthetic_frame(40 * i), timestamp=10 + i)
+
+        entry = recorder.trigger(violation_id=7, label='Looking Away').result(timeout=5)
+        # Frames added after the trigger belong to the next clip only
+        recorder.add_frame(synthetic_frame(255), timestamp=20)
+
+        self.assertEqual((entry['frame_count'], entry['start'], entry['end']), (3, 10.0, 12.0))
+        self.assertEqual(read_evidence_index(self.storage_dir, 'stream', violation_id=7), [entry])
+        frames = load_evidence_frames(self.storage_dir, 'stream', entry)
+        self.assertEqual([timestamp for timestamp, _ in frames], [10.0, 11.0, 12.0])
+        image = cv2.imdecode(np.frombuffer(frames[2][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(image.shape, (48, 64, 3))
+        self.assertLess(abs(int(image.mean()) - 80), 3)
+
+    def test_segments_roll_over_at_the_size_limit(self):
+        recorder = EvidenceRecorder(self.storage_dir, 'stream', seconds=1, fps=5, scale=1, segment_max_bytes=1)
+        entries = []
+        for violation_id in (1, 2):
+            recorder.add_frame(synthetic_frame(violation_id), timestamp=violation_id)
+            entries.append(recorder.trigger(violation_id=violation_id).result(timeout=5))
+
+        self.assertEqual([entry['segment'] for entry in entries], ['segment_00001.seg', 'segment_00002.seg'])
+        self.assertEqual([entry['offset'] for entry in entries], [0, 0])
+        self.assertEqual(len(load_evidence_frames(self.storage_dir, 'stream', entries[1])), 2)
+
+    def test_detector_buffers_raw_frames_and_triggers_on_violations(self):
+        recorder = mock.Mock()
+        with mock.patch('core.FaceModules.DistractionDetectionModule.mp') as mediapipe:
+            mediapipe.solutions.face_mesh.FaceMesh.return_value.process.return_value.multi_face_landmarks = None
+            detector = DistractionDetector(evidence_recorder=recorder, violation_handler=lambda violation_type: 42)
+
+        frame = synthetic_frame(0)
+        detector.detect_distraction(frame)
+        recorder.add_frame.assert_called_once_with(frame)
+
+        detector.record_violation('Eyes Closed')
+        recorder.trigger.assert_called_once_with(violation_id=42, label='Eyes Closed')
+
+
+class TelemetryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, '1', '2.tlm')
+
+    def test_records_round_trip_through_memory_map(self):
+        with TelemetryWriter(self.path, chunk_size=4, flush_interval=1e9) as writer:
+            for i in range(10):
+                writer.append(100.0 + i, 'Looking Away' if i % 2 else 'Focused', distracted=i == 3,
+                              head_offset=i / 10)
+            writer.append(110.0, 'No Face')
+
+        reader = TelemetryReader(self.path)
+        self.assertEqual(len(reader), 11)
+        self.assertEqual(reader.status_labels(reader.records['status'][:2]), ['Focused', 'Looking Away'])
+        self.assertEqual(reader.records['distracted'].tolist().index(1), 3)
+        self.assertAlmostEqual(float(reader.records['head_offset'][5]), 0.5, places=6)
+        self.assertTrue(np.isnan(reader.records['head_offset'][10]))
+
+        window = reader.read_range(102.0, 105.0)
+        self.assertEqual(window['timestamp'].tolist(), [102.0, 103.0, 104.0])
+
+    def test_buffer_is_flushed_after_the_interval_whatever_the_frame_timestamps(self):
+        clock = FakeClock()
+        with mock.patch('core.FaceModules.TelemetryModule.time') as fake_time:
+            fake_time.monotonic = clock
+            writer = TelemetryWriter(self.path, chunk_size=256, flush_interval=5.0)
+            writer.append(1.0, 'Focused')
+            clock.advance(4.9)
+            writer.append(2.0, 'Focused')
+            self.assertFalse(os.path.exists(self.path))
+            clock.advance(0.1)
+            writer.append(3.0, 'Focused')
+        self.assertEqual(TelemetryReader(self.path).records['timestamp'].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(writer.count, 0)
+
+    def test_partial_trailing_record_is_ignored(self):
+        with TelemetryWriter(self.path) as writer:
+            writer.append(1.0, 'Focused')
+            writer.append(2.0, 'Focused')
+        with open(self.path, 'ab') as f:
+            f.write(b'\0' * (TELEMETRY_DTYPE.itemsize // 2))
+
+        self.assertEqual(os.path.getsize(self.path),
+                         FILE_HEADER.size + TELEMETRY_DTYPE.itemsize * 2 + TELEMETRY_DTYPE.itemsize // 2)
+        self.assertEqual(TelemetryReader(self.path).records['timestamp'].tolist(), [1.0, 2.0])
+
+
+class DownsamplingTests(SimpleTestCase):
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        x = np.arange(10000, dtype=np.float64)
+        y = np.sin(x / 500)
+        y[4321] = 25.0
+        y[7777] = -25.0
+
+        keep = lttb_indices(x, y, 200)
+        self.assertEqual(len(keep), 200)
+        self.assertEqual((keep[0], keep[-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        self.assertIn(4321, keep)
+        self.assertIn(7777, keep)
+
+    def test_short_series_are_returned_whole(self):
+        self.assertEqual(lttb_indices([0, 1, 2], [5, 6, 7], 10).tolist(), [0, 1, 2])
+        self.assertEqual(lttb_indices(range(50), range(50), 2).tolist(), list(range(50)))
+
+    def test_downsample_metrics_skips_frames_without_a_face(self):
+        records = np.zeros(3000, dtype=TELEMETRY_DTYPE)
+        records['timestamp'] = np.arange(3000) / 30
+        records['head_offset'] = np.linspace(0, 1, 3000)
+        records['head_offset'][::3] = np.nan
+
+        series = downsample_metrics(records, fields=('head_offset',), points=100)['head_offset']
+        self.assertEqual(len(series['t']), 100)
+        self.assertFalse(any(np.isnan(series['v'])))
+        self.assertEqual(series['t'][0], round(1 / 30, 3))
+
+
+class ViolationEpisodeTests(TestCase):
+    def setUp(self):
+        faculty = User.objects.create(username='faculty', email='faculty@example.com', role='Faculty')
+        self.student = User.objects.create(username='student', email='student@example.com', role='Student')
+        self.exam = Exam.objects.create(title='Episodes', date=timezone.now(), duration_minutes=60,
+                                        created_by=faculty)
+        self.start = timezone.now()
+
+    def record(self, seconds, violation_type='Distraction', severity=0.0):
+        return Violation.record_detection(self.exam, self.student, violation_type, severity=severity,
+                                          detected_at=self.start + timedelta(seconds=seconds))
+
+    def test_detections_within_the_gap_merge_into_one_episode(self):
+        ids = {self.record(t, severity=s) for t, s in ((0, 0.2), (4, 0.9), (9, 0.5), (18, 0.1))}
+
+        self.assertEqual(len(ids), 1)
+        self.assertIsInstance(ids.pop(), int)
+        episode = Violation.objects.get()
+        self.assertEqual(episode.frame_count, 4)
+        self.assertEqual(episode.peak_severity, 0.9)
+        self.assertEqual(episode.duration_seconds, 18)
+
+    def test_pause_longer_than_the_gap_closes_the_episode(self):
+        first = self.record(0)
+        second = self.record(Violation.EPISODE_GAP_SECONDS + 1)
+        other_type = self.record(Violation.EPISODE_GAP_SECONDS + 2, violation_type='Face Missing')
+
+        self.assertEqual(len({first, second, other_type}), 3)
+        self.assertEqual(Violation.objects.get(pk=first).ended_at, self.start)
+        self.assertEqual(Violation.objects.filter(type='Distraction').count(), 2)
+
+    def test_episode_id_links_evidence(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        recorder = EvidenceRecorder(directory.name, 'stream', fps=5)
+        recorder.add_frame(np.zeros((48, 64, 3), dtype=np.uint8), timestamp=1.0)
+
+        violation_id = self.record(0)
+        recorder.trigger(violation_id=violation_id, label='Distraction').result(timeout=5)
+
+        entries = read_evidence_index(directory.name, 'stream', violation_id=violation_id)
+        self.assertEqual([(entry['violation_id'], entry['frame_count']) for entry in entries], [(violation_id, 1)])
+
+    def test_student_is_locked_before_looking_for_the_open_episode(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.record(0)
+        selects = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertIn(f'FROM "{User._meta.db_table}"', selects[0])
+        self.assertIn(f'FROM "{Violation._meta.db_table}"', selects[1])
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', selects[0])
+
+    def test_detector_labels_map_to_violation_types(self):
+        with mock.patch('core.FaceModules.DistractionDetectionModule.mp'):
+            detector = DistractionDetector(violation_handler=lambda violation_type: self.record(
+                0, violation_type=violation_type))
+        for label in ('Looking Away', 'Looking Up/Down', 'Head Movement', 'Eyes Closed'):
+            detector.record_violation(label)
+
+        self.assertEqual(set(VIOLATION_TYPE_BY_LABEL.values()) - {value for value, _ in Violation.VIOLATION_TYPES},
+                         set())
+        self.assertEqual(list(Violation.objects.values_list('type', 'frame_count')), [('Distraction', 4)])
+
+
+def question_rows(count):
+    return [{
+        'Questions': f'Question number {i}?',
+        'Option A': 'aa', 'Option B': 'bb', 'Option C': 'cc', 'Option D': 'dd',
+        'Answer': 'ABCD'[i % 4],
+    } for i in range(count)]
+
+
+class FakeRowStream:
+    """SheetRowStream stand-in that records the open transactions at every chunk fetch"""
+
+    def __init__(self, rows, chunk_rows=3):
+        self.header = list(rows[0].keys())
+        self.rows = rows
+        self.chunk_rows = chunk_rows
+        self.total_rows = len(rows)
+        self.atomic_depths = []
+
+    def __iter__(self):
+        for start in range(0, len(self.rows), self.chunk_rows):
+            self.atomic_depths.append(len(connection.atomic_blocks))
+            yield start + 2, self.rows[start:start + self.chunk_rows]
+
+
+class QuestionImportTests(TestCase):
+    def setUp(self):
+        self.faculty = User.objects.create(username='faculty', email='faculty@example.com', role='Faculty')
+        self.exam_fields = {'title': 'Streamed', 'date': timezone.now(), 'duration_minutes': 60,
+                            'created_by': self.faculty}
+
+    def test_preview_and_import_apply_the_same_row_checks(self):
+        rows = question_rows(3)
+        rows[1]['Option B'] = 'x' * 300
+
+        validator = ExamValidator()
+        self.assertFalse(validator.validate_question_format(rows))
+        with self.assertRaises(QuestionImportError) as raised:
+            import_exam_questions(self.exam_fields, rows)
+        self.assertEqual(validator.errors, raised.exception.errors)
+        self.assertEqual(validator.errors, ["Row 3: 'Option B' is longer than 255 characters"])
+
+    def test_malformed_sheet_url_is_a_validation_error(self):
+        validator = ExamValidator()
+        self.assertFalse(validator.validate_sheet_url_format('https://docs.google.com/spreadsheets/abc'))
+        self.assertEqual(validator.errors, ["Could not extract sheet ID from URL"])
+
+        self.client.force_login(self.faculty)
+        response = self.client.post('/dashboard/faculty/preview/', {
+            'examName': 'Malformed', 'examDate': '2030-01-01', 'examTime': '10:00', 'freezeTime': '60',
+            'sheetUrl': 'https://docs.google.com/spreadsheets/abc',
+        })
+        self.assertRedirects(response, '/dashboard/faculty/schedule/', fetch_redirect_response=False)
+        self.assertIn("Could not extract sheet ID from URL", str(list(get_messages(response.wsgi_request))[0]))
+
+    def test_schedule_reports_every_detail_error(self):
+        self.client.force_login(self.faculty)
+        response = self.client.post('/schedule_exam/', {
+            'examName': '', 'examDate': '2030-01-01', 'examTime': '10:00', 'freezeTime': 'soon',
+            'sheetUrl': 'https://docs.google.com/spreadsheets/abc',
+        })
+        self.assertRedirects(response, '/dashboard/faculty/schedule/', fetch_redirect_response=False)
+        message = str(list(get_messages(response.wsgi_request))[0])
+        self.assertIn("Exam title is required", message)
+        self.assertIn("Invalid exam duration format", message)
+        self.assertIn("Could not extract sheet ID from URL", message)
+        self.assertFalse(ExamImportJob.objects.exists())
+
+    def test_stream_commits_chunk_by_chunk(self):
+        stream = FakeRowStream(question_rows(10))
+        depth = len(connection.atomic_blocks)
+
+        exam, count = stream_exam_questions(self.exam_fields, stream)
+        self.assertEqual(count, 10)
+        self.assertEqual(exam.questions.count(), 10)
+        # No transaction is held open while the next chunk is fetched
+        self.assertEqual(stream.atomic_depths, [depth] * 4)
+
+    def test_exam_stays_hidden_until_the_last_chunk(self):
+        visible = []
+
+        def progress(processed, total):
+            visible.append(Exam.objects.exists())
+            if processed == 6:
+                raise ConnectionError('Sheets API went away')
+
+        with self.assertRaises(ConnectionError):
+            stream_exam_questions(self.exam_fields, FakeRowStream(question_rows(10)), progress=progress)
+        self.assertEqual(visible, [False, False])
+        self.assertFalse(Exam.all_objects.exists())
+        self.assertFalse(Question.objects.exists())
+
+        exam, _ = stream_exam_questions(self.exam_fields, FakeRowStream(question_rows(10)))
+        self.assertTrue(exam.is_published)
+        self.assertEqual(list(Exam.objects.all()), [exam])
+
+    def test_stream_error_removes_the_partial_exam(self):
+        rows = question_rows(10)
+        rows[7]['Answer'] = 'E'
+
+        with self.assertRaises(QuestionImportError) as raised:
+            stream_exam_questions(self.exam_fields, FakeRowStream(rows))
+        self.assertEqual(raised.exception.errors, ["Row 9: Invalid answer 'E'. Must be A, B, C, or D"])
+        self.assertFalse(Exam.objects.exists())
+        self.assertFalse(Question.objects.exists())
+
+
+def sheet_values(rows):
+    header = list(rows[0].keys())
+    return [header] + [[row[column] for column in header] for row in rows]
+
+
+class ExamImportJobTests(TestCase):
+    sheet_url = 'https://docs.google.com/spreadsheets/d/pinned-sheet/edit'
+
+    def setUp(self):
+        self.faculty = User.objects.create(username='faculty', email='faculty@example.com', role='Faculty')
+        self.previewed = QuestionBank('pinned-sheet', 0, sheet_values(question_rows(5)))
+
+    def enqueue(self, content_hash):
+        enqueue_exam_import(self.faculty, 'Pinned', timezone.now(), 60, '3', self.sheet_url, content_hash)
+        return claim_next_job()
+
+    def test_pinned_job_imports_the_previewed_rows(self):
+        question_bank_cache.put(self.previewed)
+        self.addCleanup(question_bank_cache.clear)
+        job = run_exam_import_job(self.enqueue(self.previewed.content_hash))
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual((job.questions_imported, job.rows_processed, job.rows_total), (5, 5, 5))
+        self.assertEqual(job.exam.questions.count(), 5)
+
+    def test_pinned_job_reuses_a_preview_from_another_process(self):
+        question_bank_cache.put(self.previewed)
+        self.addCleanup(question_bank_cache.clear)
+        # The worker's own process never saw the preview
+        question_bank_cache.clear()
+        with mock.patch('core.Modules.SheetManagerModule.get_sheets_client') as client:
+            job = run_exam_import_job(self.enqueue(self.previewed.content_hash))
+        client.assert_not_called()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.exam.questions.count(), 5)
+        self.assertEqual(question_bank_cache.get('pinned-sheet', 0, self.previewed.content_hash).rows,
+                         self.previewed.rows)
+
+    def test_pinned_job_fails_when_the_sheet_changed(self):
+        edited = QuestionBank('pinned-sheet', 0, sheet_values(question_rows(6)))
+        with mock.patch('core.Modules.ExamImportJobModule.fetch_question_bank', return_value=edited):
+            job = run_exam_import_job(self.enqueue(self.previewed.content_hash))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('changed after it was previewed', job.errors)
+        self.assertFalse(Exam.objects.exists())
+
+
+    def test_only_jobs_with_a_lapsed_lease_are_requeued(self):
+        alive = self.enqueue('')
+        dead = self.enqueue('')
+        ExamImportJob.objects.filter(pk=dead.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        # Started long ago, but its worker still renews the lease
+        ExamImportJob.objects.filter(pk=alive.pk).update(started_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(ExamImportJob.objects.get(pk=alive.pk).status, 'running')
+        self.assertEqual(ExamImportJob.objects.get(pk=dead.pk).status, 'queued')
+
+    def test_progress_renews_the_lease(self):
+        question_bank_cache.put(self.previewed)
+        self.addCleanup(question_bank_cache.clear)
+        job = self.enqueue(self.previewed.content_hash)
+        leases = []
+        with mock.patch('core.Modules.ExamImportJobModule.import_exam_questions',
+                        side_effect=lambda fields, rows: leases.append(
+                            ExamImportJob.objects.get(pk=job.pk).lease_expires_at) or (None, 0)):
+            run_exam_import_job(job, lease=timedelta(hours=1))
+        self.assertGreater(leases[0], timezone.now() + timedelta(minutes=59))
+        self.assertIsNone(job.lease_expires_at)
+
+
+class SheetRefreshTests(TestCase):
+    def setUp(self):
+        self.source = FakeSheetSource({
+            'shared-sheet': sheet_values(question_rows(5)),
+            'own-sheet': sheet_values(question_rows(3)),
+        })
+        patcher = mock.patch('core.Modules.SheetManagerModule.sheets_clients', self.source)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(question_bank_cache.clear)
+        self.faculty = User.objects.create(username='faculty', email='faculty@example.com', role='Faculty')
+
+    def schedule(self, title, sheet_id, count):
+        exam, _ = import_exam_questions({
+            'title': title, 'date': timezone.now() + timedelta(days=1), 'duration_minutes': 60,
+            'created_by': self.faculty, 'sheet_url': f'https://docs.google.com/spreadsheets/d/{sheet_id}/edit',
+        }, question_rows(count))
+        return exam
+
+    def refresh(self):
+        out = io.StringIO()
+        call_command('refresh_exam_sheets', '--resync', '--backoff', '0', stdout=out)
+        return out.getvalue()
+
+    def test_batch_fetch_retries_server_errors_only(self):
+        self.source.fail_next(1, status=503)
+        results = batch_fetch_question_banks({'shared-sheet': [QUESTION_RANGE], 'missing-sheet': [QUESTION_RANGE]},
+                                             concurrency=1, base_delay=0)
+
+        shared = results['shared-sheet']
+        self.assertIsNone(shared.error)
+        self.assertEqual(shared.api_calls, 2)
+        self.assertEqual(shared.banks[QUESTION_RANGE].questions, question_rows(5))
+        self.assertEqual(results['missing-sheet'].api_calls, 1)
+        self.assertEqual(results['missing-sheet'].error.response.status_code, 404)
+
+    def test_one_batch_read_serves_every_exam_of_a_sheet(self):
+        first = self.schedule('First', 'shared-sheet', 5)
+        second = self.schedule('Second', 'shared-sheet', 5)
+        own = self.schedule('Own', 'own-sheet', 3)
+
+        output = self.refresh()
+
+        self.assertEqual(self.source.calls, {'values_batch_get': 2})
+        self.assertIn('3 exam(s) from 2 spreadsheet(s): 2 API call(s)', output)
+        hashes = dict(Exam.objects.values_list('id', 'sheet_content_hash'))
+        self.assertEqual(hashes[first.id], hashes[second.id])
+        self.assertNotEqual(hashes[own.id], '')
+
+    def test_unchanged_sheets_are_skipped(self):
+        self.schedule('Shared', 'shared-sheet', 5)
+        own = self.schedule('Own', 'own-sheet', 3)
+        self.refresh()
+
+        edited = question_rows(3)
+        edited[1]['Questions'] = 'An edited question?'
+        self.source.add_sheet('own-sheet', sheet_values(edited))
+        with CaptureQueriesContext(connection) as queries:
+            output = self.refresh()
+
+        self.assertIn('"Shared" (1 API calls', output)
+        self.assertEqual(output.count('sheet unchanged since the last sync, skipped'), 1)
+        self.assertIn('re-synced 1 updated', output)
+        self.assertEqual(own.questions.order_by('position')[1].text, 'An edited question?')
+        updated_exams = [q['sql'] for q in queries.captured_queries
+                         if q['sql'].startswith(f'UPDATE "{Exam._meta.db_table}"')]
+        self.assertEqual(len(updated_exams), 1)
+
+
+XLSX_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+XLSX_REL_NS = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+
+
+def xlsx_bytes(sheet_data, shared_strings=(), sheet_xml=None, parts=None):
+    """A minimal workbook whose first sheet holds sheet_data (the <sheetData> children)"""
+    files = {
+        'xl/workbook.xml': f'<workbook {XLSX_NS} {XLSX_REL_NS}><sheets>'
+                           f'<sheet name="Questions" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        'xl/_rels/workbook.xml.rels': '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+                                      'relationships"><Relationship Id="rId1" Target="worksheets/sheet1.xml"/>'
+                                      '</Relationships>',
+        'xl/sharedStrings.xml': f'<sst {XLSX_NS}>' + ''.join(
+            f'<si><t>{value}</t></si>' for value in shared_strings) + '</sst>',
+        'xl/worksheets/sheet1.xml': sheet_xml or f'<worksheet {XLSX_NS}><sheetData>{sheet_data}</sheetData></worksheet>',
+    }
+    files.update(parts or {})
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in files.items():
+            if content is not None:
+                archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class QuestionFileTests(TestCase):
+    def test_xlsx_cells_are_placed_by_reference(self):
+        data = xlsx_bytes(
+            '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="C1" t="inlineStr"><is><t>Third</t></is></c></row>'
+            '<row r="3"><c r="B3"><v>42</v></c><c r="AA3" t="b"><v>1</v></c></row>',
+            shared_strings=['First'],
+        )
+        rows = parse_xlsx(io.BytesIO(data))
+        self.assertEqual(rows[0], ['First', '', 'Third'])
+        self.assertEqual(rows[1], [])
+        self.assertEqual(rows[2][:2], ['', '42'])
+        self.assertEqual((len(rows[2]), rows[2][26]), (27, 'TRUE'))
+
+    def test_damaged_xlsx_is_a_value_error(self):
+        damaged = {
+            'malformed xml': xlsx_bytes('', sheet_xml='<worksheet><sheetData><row>'),
+            'missing sheet part': xlsx_bytes('', parts={'xl/worksheets/sheet1.xml': None}),
+            'missing workbook': xlsx_bytes('', parts={'xl/workbook.xml': None}),
+            'bad shared string': xlsx_bytes('<row r="1"><c r="A1" t="s"><v>5</v></c></row>'),
+            'not a zip': b'Questions,Option A',
+        }
+        for label, data in damaged.items():
+            with self.subTest(label), self.assertRaises(ValueError):
+                parse_xlsx(io.BytesIO(data))
+
+    def test_unreadable_csv_is_a_value_error(self):
+        faculty = User.objects.create(username='faculty', email='faculty@example.com', role='Faculty')
+        oversized = b'Questions,Option A\n"' + b'x' * 200000 + b'",b\n'
+        with self.assertRaisesMessage(ValueError, 'The uploaded CSV file cannot be read'):
+            parse_question_file(SimpleUploadedFile('questions.csv', oversized), faculty)
+        self.assertFalse(UploadedQuestionBank.objects.exists())
+
+    def test_uploaded_bank_is_stored_per_user(self):
+        faculty = User.objects.create(username='faculty', email='faculty@example.com', role='Faculty')
+        other = User.objects.create(username='other', email='other@example.com', role='Faculty')
+        csv_data = ('Questions,Option A,Option B,Option C,Option D,Answer\n'
+                    'What is two plus two?,3,4,5,6,B\n').encode('utf-8')
+
+        bank = parse_question_file(SimpleUploadedFile('questions.csv', csv_data), faculty)
+        self.assertEqual(bank.questions[0]['Answer'], 'B')
+
+        stored = get_uploaded_bank(faculty, bank.content_hash)
+        self.assertEqual((stored.headers, stored.rows), (bank.headers, bank.rows))
+        self.assertIsNone(get_uploaded_bank(other, bank.content_hash))
+
+        UploadedQuestionBank.objects.update(uploaded_at=timezone.now() - timedelta(days=2))
+        self.assertIsNone(get_uploaded_bank(faculty, bank.content_hash))
+
+
+class ResyncExamQuestionsTests(TestCase):
+    def setUp(self):
+        faculty = User.objects.create(username='faculty', email='faculty@example.com', role='Faculty')
+        self.rows = question_rows(2000)
+        self.exam, _ = import_exam_questions({
+            'title': 'Resync', 'date': timezone.now(), 'duration_minutes': 60, 'created_by': faculty,
+        }, self.rows)
+
+    def test_three_edits_touch_three_rows(self):
+        for i in (5, 900, 1999):
+            self.rows[i]['Questions'] += ' (fixed)'
+
+        with CaptureQueriesContext(connection) as queries:
+            changes = resync_exam_questions(self.exam, self.rows)
+
+        self.assertEqual(changes, {'inserted': 0, 'updated': 3, 'moved': 0, 'deleted': 0, 'unchanged': 1997})
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(len(writes), 1)
+        texts = list(Question.objects.filter(exam=self.exam).order_by('id').values_list('text', flat=True))
+        self.assertEqual(texts[900], 'Question number 900? (fixed)')
+
+    def test_appended_and_removed_rows(self):
+        changes = resync_exam_questions(self.exam, self.rows[:1990] + question_rows(2000)[1990:1995])
+        self.assertEqual(changes['deleted'], 5)
+        self.assertEqual(Question.objects.filter(exam=self.exam).count(), 1995)
+
+        changes = resync_exam_questions(self.exam, self.rows)
+        self.assertEqual(changes['inserted'], 5)
+        self.assertEqual(Question.objects.filter(exam=self.exam).count(), 2000)
+
+    def test_row_inserted_mid_sheet_is_one_insert(self):
+        ids = list(Question.objects.filter(exam=self.exam).order_by('position').values_list('id', flat=True))
+        new_row = dict(question_rows(1)[0], Questions='A brand new question?')
+        rows = self.rows[:1000] + [new_row] + self.rows[1000:]
+
+        with CaptureQueriesContext(connection) as queries:
+            changes = resync_exam_questions(self.exam, rows, batch_size=250)
+
+        self.assertEqual(changes, {'inserted': 1, 'updated': 0, 'moved': 1000, 'deleted': 0, 'unchanged': 1000})
+        stored = list(Question.objects.filter(exam=self.exam).order_by('position').values_list('id', 'text'))
+        self.assertEqual([text for _, text in stored], [row['Questions'] for row in rows])
+        self.assertEqual([pk for pk, _ in stored[:1000] + stored[1001:]], ids)
+        # One INSERT, and the 1000 shifted questions only have their position set, 250 per UPDATE
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(updates), 4)
+        self.assertTrue(all(sql.split(' SET ')[1].startswith('"position" =') and '"text"' not in sql
+                            for sql in updates))
+        self.assertFalse(any(q['sql'].startswith('DELETE') for q in queries.captured_queries))
+
+    def test_invalid_row_changes_nothing(self):
+        self.rows[0]['Questions'] = 'Changed?'
+        self.rows[10]['Answer'] = 'E'
+        with self.assertRaises(QuestionImportError):
+            resync_exam_questions(self.exam, self.rows)
+        self.assertEqual(Question.objects.filter(exam=self.exam).order_by('id').first().text, 'Question number 0?')
+
+
+def smtp_credentials_file(test):
+    """A throwaway SMTP credentials file for a SmartFaceProctorMailer"""
+    handle, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(handle, 'w') as f:
+        json.dump({'SMTP_HOST': 'localhost', 'FROM_EMAIL': 'proctor@example.com'}, f)
+    test.addCleanup(os.remove, path)
+    return path
+
+
+class SequenceGenerator:
+    """generate(user_type) that hands out the given usernames first, then unique ones"""
+
+    def __init__(self, *usernames):
+        self.usernames = list(usernames)
+        self.count = 0
+
+    def __call__(self, user_type):
+        self.count += 1
+        username = self.usernames.pop(0) if self.usernames else f'{user_type[:3].upper()}-{self.count:010d}'
+        return username, f'password{self.count}'
+
+
+class UserProvisioningTests(TestCase):
+    hasher = MD5PasswordHasher()
+
+    def test_existing_repeated_and_invalid_entries(self):
+        User.objects.create(username='SPS-0000000001', email='existing@example.com', role='Student')
+        result = provision_users([
+            ('new@example.com', 'Student', {'first_name': 'Ada'}),
+            ('existing@example.com', 'student'),
+            ('NEW@example.com', 'faculty'),
+            ('other@example.com', 'admin'),
+            ('', 'student'),
+        ], SequenceGenerator(), processes=1, hasher=self.hasher)
+
+        self.assertEqual([user.email for user in result.created], ['new@example.com'])
+        self.assertEqual(result.skipped, ['NEW@example.com', 'existing@example.com'])
+        self.assertEqual(result.failed, {'other@example.com': 'Unknown user type: admin'})
+        user = User.objects.get(email='new@example.com')
+        self.assertEqual((user.first_name, user.role), ('Ada', 'Student'))
+        self.assertTrue(self.hasher.verify(result.created[0].password, user.password))
+
+    def test_colliding_usernames_are_generated_again(self):
+        User.objects.create(username='SPS-TAKEN', email='taken@example.com', role='Student')
+        generate = SequenceGenerator('SPS-TAKEN', 'SPS-TWICE', 'SPS-TWICE')
+        result = provision_users([('a@example.com', 'student'), ('b@example.com', 'student'),
+                                  ('c@example.com', 'student')], generate, processes=1, hasher=self.hasher)
+
+        usernames = [user.username for user in result.created]
+        self.assertEqual(len(set(usernames)), 3)
+        self.assertNotIn('SPS-TAKEN', usernames)
+        self.assertEqual(User.objects.filter(email__in=['a@example.com', 'b@example.com', 'c@example.com']).count(), 3)
+
+    def test_passwords_are_hashed_on_spawned_processes(self):
+        entries = [(f'user{i}@example.com', 'student') for i in range(HASH_CHUNK_SIZE + 10)]
+        result = provision_users(entries, SequenceGenerator(), processes=2, hasher=self.hasher)
+
+        self.assertEqual(len(result.created), len(entries))
+        last = result.created[-1]
+        self.assertTrue(self.hasher.verify(last.password, User.objects.get(email=last.email).password))
+
+    def test_batches_share_one_pool_and_hash_outside_the_transaction(self):
+        entries = [(f'user{i}@example.com', 'student') for i in range(HASH_CHUNK_SIZE + 10)]
+        depth = len(connection.atomic_blocks)
+        hash_depths, batches = [], []
+
+        def hash_passwords(passwords, executor, hasher):
+            hash_depths.append(len(connection.atomic_blocks))
+            return [hasher.encode(password, hasher.salt()) for password in passwords]
+
+        def on_batch(created):
+            self.assertGreater(len(connection.atomic_blocks), depth)
+            batches.append([user.password for user in created])
+
+        with mock.patch('core.Modules.UserProvisioningModule.hash_passwords', hash_passwords), \
+                mock.patch('core.Modules.UserProvisioningModule.ProcessPoolExecutor') as pool:
+            result = provision_users(entries, SequenceGenerator(), batch_size=20, processes=2,
+                                     hasher=self.hasher, on_batch=on_batch)
+
+        pool.assert_called_once()
+        self.assertEqual(hash_depths, [depth] * 3)
+        self.assertEqual([len(batch) for batch in batches], [20, 20, 20])
+        self.assertTrue(all(batches[0]))
+        self.assertEqual({user.password for user in result.created}, {None})
+
+    def test_failing_batch_callback_rolls_the_batch_back(self):
+        def on_batch(created):
+            raise RuntimeError('outbox unavailable')
+
+        with self.assertRaises(RuntimeError):
+            provision_users([('a@example.com', 'student')], SequenceGenerator(), processes=1,
+                            hasher=self.hasher, on_batch=on_batch)
+        self.assertFalse(User.objects.filter(email='a@example.com').exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserCsvImportTests(TestCase):
+    def import_csv(self, text, **kwargs):
+        return import_users_from_csv(SimpleUploadedFile('users.csv', text.encode('utf-8')), SequenceGenerator(),
+                                     **kwargs)
+
+    def test_rows_are_imported_and_problems_reported(self):
+        User.objects.create(username='SPS-0000000001', email='existing@example.com', role='Student')
+        result = self.import_csv(
+            'Email,Role,First Name\n'
+            'one@example.com,Student,Ada\n'
+            'not-an-email,Student,\n'
+            'two@example.com,Admin,\n'
+            '\n'
+            'existing@example.com,Student,\n'
+            'ONE@example.com,Faculty,\n'
+            'three@example.com,faculty,Grace\n',
+            batch_size=2,
+        )
+
+        self.assertEqual((result.rows, result.created, result.skipped, result.emails_queued), (6, 2, 1, 2))
+        self.assertEqual(User.objects.get(email='three@example.com').first_name, 'Grace')
+        self.assertEqual(OutboundEmail.objects.filter(kind='welcome').count(), 2)
+        report = list(csv.reader(io.StringIO(get_import_report(result.report_token))))
+        self.assertEqual(report[0], ['Row', 'Email', 'Status', 'Details'])
+        self.assertEqual([(row[0], row[2]) for row in report[1:]],
+                         [('3', 'error'), ('4', 'error'), ('6', 'skipped'), ('7', 'error')])
+
+    def test_batch_is_rolled_back_when_its_emails_cannot_be_queued(self):
+        with mock.patch('core.Modules.UserImportModule.enqueue_emails', side_effect=RuntimeError('outbox down')):
+            with self.assertRaises(RuntimeError):
+                self.import_csv('Email,Role\none@example.com,Student\ntwo@example.com,Faculty\n')
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_report_expires(self):
+        result = self.import_csv('Email,User Type\nnot-an-email,Student\n')
+        self.assertIsNotNone(get_import_report(result.report_token))
+        UserImportReport.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertIsNone(get_import_report(result.report_token))
+
+    def test_unreadable_files_are_rejected(self):
+        with self.assertRaisesMessage(UserImportError, 'Missing column(s): User Type'):
+            self.import_csv('Email,Name\none@example.com,Ada\n')
+        with self.assertRaises(UserImportError):
+            import_users_from_csv(SimpleUploadedFile('users.csv', 'Email,Role\n\xe9@x.com,Student\n'.encode('latin-1')),
+                                  SequenceGenerator())
+        self.assertFalse(User.objects.exists())
+
+
+class FakePool:
+    """SMTP pool stand-in that fails the recipients it was given an error for"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def send_message(self, message, retries=1):
+        error = self.errors.get(message['To'])
+        if error is not None:
+            raise error
+        self.sent.append(message['To'])
+
+
+class BulkMailerTests(SimpleTestCase):
+    def test_rate_limiter_spaces_acquisitions_after_the_burst(self):
+        clock = FakeClock()
+        with mock.patch('core.Modules.BulkMailerModule.time') as fake_time:
+            fake_time.monotonic = clock
+            fake_time.sleep.side_effect = clock.advance
+            limiter = RateLimiter(2, burst=2)
+            for _ in range(5):
+                limiter.acquire()
+
+        self.assertEqual(clock.now, 1001.5)
+        self.assertEqual([call.args[0] for call in fake_time.sleep.call_args_list], [0.5, 0.5, 0.5])
+
+    def test_only_temporary_failures_are_retryable(self):
+        self.assertTrue(is_retryable(smtplib.SMTPServerDisconnected('Connection lost')))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertTrue(is_retryable(smtplib.SMTPResponseException(451, b'Try again later')))
+        self.assertFalse(is_retryable(smtplib.SMTPResponseException(550, b'No such user')))
+        self.assertTrue(is_retryable(smtplib.SMTPRecipientsRefused({'a@example.com': (450, b'Busy')})))
+        self.assertFalse(is_retryable(smtplib.SMTPRecipientsRefused({
+            'a@example.com': (450, b'Busy'), 'b@example.com': (550, b'No such user'),
+        })))
+        self.assertFalse(is_retryable(ValueError('bad message')))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.mailer = SmartFaceProctorMailer(smtp_credentials_path=smtp_credentials_file(self))
+
+    def deliver(self, errors=None):
+        pool = FakePool(errors or {})
+        with mock.patch('core.Modules.OutboxModule.get_smtp_pool', return_value=pool):
+            counts = deliver_batch(claim_batch(), self.mailer)
+        return counts, pool
+
+    def test_claimed_emails_are_not_claimed_again(self):
+        enqueue_emails([(f'user{i}@example.com', 'Hello', 'Body') for i in range(3)])
+        later = enqueue_email('later@example.com', 'Hello', 'Body')
+        OutboundEmail.objects.filter(pk=later.pk).update(next_attempt_at=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(len(claim_batch(batch_size=2)), 2)
+        self.assertEqual([email.recipient for email in claim_batch()], ['user2@example.com'])
+        self.assertEqual(claim_batch(), [])
+
+    def test_temporary_failures_are_retried_and_permanent_ones_dead(self):
+        enqueue_emails([(recipient, 'Hello', 'Body') for recipient in
+                        ('ok@example.com', 'busy@example.com', 'gone@example.com')])
+        expired = enqueue_email('late@example.com', 'OTP', 'Body', kind='otp', expires_in=timedelta(minutes=15))
+        OutboundEmail.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        counts, pool = self.deliver({
+            'busy@example.com': smtplib.SMTPResponseException(451, b'Try again later'),
+            'gone@example.com': smtplib.SMTPResponseException(550, b'No such user'),
+        })
+
+        self.assertEqual(counts, {'sent': 1, 'retried': 1, 'dead': 2})
+        self.assertEqual(pool.sent, ['ok@example.com'])
+        status = dict(OutboundEmail.objects.values_list('recipient', 'status'))
+        self.assertEqual(status, {'ok@example.com': 'sent', 'busy@example.com': 'queued',
+                                  'gone@example.com': 'dead', 'late@example.com': 'dead'})
+        busy = OutboundEmail.objects.get(recipient='busy@example.com')
+        self.assertEqual(busy.attempts, 1)
+        self.assertGreater(busy.next_attempt_at, timezone.now())
+
+    @override_settings(PROCTOR_SMTP_RATE_LIMITS={'localhost': 3, 'default': 10})
+    def test_sends_go_through_the_host_rate_limiter(self):
+        enqueue_emails([(f'user{i}@example.com', 'Hello', 'Body') for i in range(3)])
+        with mock.patch.object(RateLimiter, 'acquire', autospec=True) as acquire:
+            counts, pool = self.deliver()
+        self.assertEqual(counts['sent'], 3)
+        self.assertEqual(sorted(pool.sent), [f'user{i}@example.com' for i in range(3)])
+        self.assertEqual([call.args[0].rate for call in acquire.call_args_list], [3, 3, 3])
+
+    def test_retries_stop_at_max_attempts(self):
+        email = enqueue_email('busy@example.com', 'Hello', 'Body', max_attempts=2)
+        for _ in range(2):
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            self.deliver({'busy@example.com': smtplib.SMTPServerDisconnected('Connection lost')})
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('dead', 2))
+
+    def test_stale_claims_are_requeued(self):
+        enqueue_email('user@example.com', 'Hello', 'Body')
+        claim_batch()
+        self.assertEqual(requeue_stale_emails(timedelta(minutes=10)), 0)
+        OutboundEmail.objects.update(claimed_at=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(requeue_stale_emails(timedelta(minutes=10)), 1)
+        self.assertEqual(len(claim_batch()), 1)
+
+    def test_new_otp_cancels_the_queued_one(self):
+        User.objects.create(username='SPS-0000000001', email='student@example.com', role='Student')
+        self.mailer.queue_otp_email('student@example.com', '111111')
+        self.mailer.queue_otp_email('student@example.com', '222222')
+
+        queued = OutboundEmail.objects.filter(kind='otp', status='queued')
+        self.assertEqual(len(queued), 1)
+        self.assertIn('222222', queued[0].body)
+        self.assertEqual(OutboundEmail.objects.get(status='dead').last_error, 'Superseded by a newer OTP')
+        self.assertNotIn('111111', OutboundEmail.objects.get(status='dead').body)
+
+    def test_finished_emails_do_not_keep_their_secrets(self):
+        enqueue_email('ok@example.com', 'OTP', 'Your OTP is 123456', kind='otp')
+        enqueue_email('gone@example.com', 'Login', 'Your password is hunter2', kind='welcome')
+        enqueue_email('busy@example.com', 'Login', 'Your password is swordfish', kind='welcome')
+
+        self.deliver({
+            'gone@example.com': smtplib.SMTPResponseException(550, b'No such user'),
+            'busy@example.com': smtplib.SMTPResponseException(451, b'Try again later'),
+        })
+
+        bodies = dict(OutboundEmail.objects.values_list('recipient', 'body'))
+        self.assertEqual(bodies, {'ok@example.com': '', 'gone@example.com': '',
+                                  'busy@example.com': 'Your password is swordfish'})
+
+    def test_old_finished_emails_are_purged(self):
+        for recipient, status in (('sent@example.com', 'sent'), ('dead@example.com', 'dead'),
+                                  ('queued@example.com', 'queued')):
+            email = enqueue_email(recipient, 'Hello', 'Body')
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                status=status, created_at=timezone.now() - timedelta(days=31))
+        enqueue_email('recent@example.com', 'Hello', 'Body')
+        OutboundEmail.objects.filter(recipient='recent@example.com').update(status='sent')
+
+        self.assertEqual(purge_old_emails(timedelta(days=30)), 2)
+        self.assertEqual(set(OutboundEmail.objects.values_list('recipient', flat=True)),
+                         {'queued@example.com', 'recent@example.com'})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SheetEmailTests(TestCase):
+    def test_login_emails_are_queued_with_the_accounts(self):
+        User.objects.create(username='SPS-0000000001', email='existing@example.com', role='Student')
+        mailer = SmartFaceProctorMailer(smtp_credentials_path=smtp_credentials_file(self))
+        mailer.recipients = [({}, email, user_type) for email, user_type in (
+            ('one@example.com', 'student'), ('two@example.com', 'faculty'),
+            ('existing@example.com', 'student'), ('three@example.com', 'student'),
+        )]
+
+        result = mailer.process_and_queue('Your login', '{user_type} {user_id} {password}', batch_size=2)
+
+        self.assertEqual(result.skipped, ['existing@example.com'])
+        self.assertEqual([user.password for user in result.created], [None, None, None])
+        emails = OutboundEmail.objects.filter(kind='welcome').order_by('id')
+        self.assertEqual([email.recipient for email in emails],
+                         ['one@example.com', 'two@example.com', 'three@example.com'])
+        user_type, username, password = emails[1].body.split()
+        self.assertEqual(user_type, 'Faculty')
+        self.assertTrue(User.objects.get(username=username, email='two@example.com').check_password(password))
+
+    def test_only_one_run_at_a_time_across_processes(self):
+        admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password=None)
+        self.client.force_login(admin_user)
+        url = reverse('admin:send-sheet-emails')
+
+        with mock.patch('core.admin.threading.Thread') as thread:
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(thread.call_count, 1)
+        self.assertTrue(BackgroundTaskStatus.objects.get(name=SHEET_EMAIL_TASK).running)
+
+        # A run whose process died no longer holds the lock
+        BackgroundTaskStatus.objects.update(started_at=timezone.now() - SHEET_EMAIL_LOCK_TIMEOUT)
+        with mock.patch('core.admin.threading.Thread') as thread:
+            self.client.get(url)
+        self.assertEqual(thread.call_count, 1)
+
+
+class AdminTelemetrySeriesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROCTOR_TELEMETRY_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = directory.name
+
+        admin_user = User.objects.create_user(username='admin', email='admin@example.com', password=None, role='Admin')
+        self.client.force_login(admin_user)
+        self.url = reverse('admin_telemetry_series', args=[3, 4])
+
+    def write_samples(self, count):
+        with TelemetryWriter(os.path.join(self.root, '3', '4.tlm'), flush_interval=1e9) as writer:
+            for i in range(count):
+                writer.append(float(i), 'Focused', head_offset=float(i % 7), left_ear=0.3)
+
+    def test_bad_parameters_are_rejected(self):
+        self.write_samples(5)
+        response = self.client.get(self.url, {'points': 'many'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Invalid points value')
+        response = self.client.get(self.url, {'metrics': 'head_offset,pulse'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Unknown metrics: pulse')
+
+    def test_missing_file_is_not_found(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.json()['success'])
+
+    def test_series_is_downsampled_and_cached(self):
+        self.write_samples(500)
+        response = self.client.get(self.url, {'points': '20', 'metrics': 'head_offset'})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual((payload['total_samples'], payload['points']), (500, 20))
+        self.assertEqual(list(payload['series']), ['head_offset'])
+        self.assertEqual(len(payload['series']['head_offset']['t']), 20)
+
+        with mock.patch('core.admin_views.TelemetryReader') as reader:
+            cached = self.client.get(self.url, {'points': '20', 'metrics': 'head_offset'})
+        reader.assert_not_called()
+        self.assertEqual(cached.json(), payload)
+
+        # A file that grew since is read again
+        self.write_samples(10)
+        self.assertEqual(self.client.get(self.url, {'points': '20', 'metrics': 'head_offset'}).json()['total_samples'],
+                         510)
+
+
+class AdminRateLimitTests(TestCase):
+    def test_post_limit_is_counted_in_the_shared_cache(self):
+        admin_user = User.objects.create(username='admin', email='admin@example.com', role='Admin')
+        request = RequestFactory().post('/customadmin/users/')
+        request.user = admin_user
+
+        # A new middleware instance per request, as in separate worker processes; all in one minute
+        with mock.patch('core.admin_middleware.time', mock.Mock(time=lambda: 60 * 29000000)):
+            limited = [AdminRateLimitMiddleware(lambda request: None)._is_rate_limited(request) for _ in range(61)]
+        self.assertEqual(limited, [False] * 60 + [True])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {settings.CACHES['default']['LOCATION']}")
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+
+class UserSessionRegistryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='SPS-0000000001', email='student@example.com',
+                                             password='secret-pass', role='Student')
+
+    def test_login_and_logout_maintain_registry(self):
+        self.client.force_login(self.user)
+        sessions = SessionManager.get_user_sessions(self.user)
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0]['session_key'], self.client.session.session_key)
+
+        self.client.logout()
+        self.assertFalse(UserSession.objects.filter(user=self.user).exists())
+
+    def test_terminate_user_sessions_uses_registry(self):
+        self.client.force_login(self.user)
+        other = self.client_class()
+        other.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            terminated = SessionManager.terminate_user_sessions(
+                self.user, exclude_session_key=other.session.session_key)
+        self.assertEqual(terminated, 1)
+        self.assertEqual([s['session_key'] for s in SessionManager.get_user_sessions(self.user)],
+                         [other.session.session_key])
+        self.assertFalse(any('django_session' in q['sql'] and 'SELECT' in q['sql'] and 'session_data' in q['sql']
+                             for q in queries.captured_queries))
+
+    def test_detect_suspicious_sessions_in_one_query(self):
+        now = timezone.now()
+        for i in range(4):
+            UserSession.objects.create(session_key=f'key{i}', user=self.user, role='Student',
+                                       session_start=now - timedelta(hours=30 if i == 0 else 1),
+                                       in_exam=i == 1, exam_start_time=now - timedelta(hours=4) if i == 1 else None,
+                                       expire_date=now + timedelta(hours=1))
+
+        with self.assertNumQueries(1):
+            suspicious = SessionSecurity.detect_suspicious_sessions()
+        kinds = sorted((entry['type'], entry['session_key']) for entry in suspicious)
+        self.assertEqual(kinds.count(('long_session', 'key0')), 1)
+        self.assertIn(('long_exam_session', 'key1'), kinds)
+        self.assertEqual(sum(1 for kind, _ in kinds if kind == 'multiple_sessions'), 4)
+
+    def test_repeat_requests_do_not_write_the_session(self):
+        self.client.force_login(self.user)
+        self.client.get('/student/profile/')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/student/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries.captured_queries
+                          if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+    def test_monitor_snapshot_caches_plain_values(self):
+        self.client.force_login(self.user)
+        invalidate_monitor_snapshot()
+        self.addCleanup(invalidate_monitor_snapshot)
+
+        def plain(value):
+            if isinstance(value, dict):
+                return all(plain(key) and plain(item) for key, item in value.items())
+            if isinstance(value, list):
+                return all(plain(item) for item in value)
+            return value is None or isinstance(value, (str, int, float, datetime))
+
+        snapshot = get_monitor_snapshot()
+        self.assertTrue(plain(snapshot))
+        self.assertEqual(snapshot['active_sessions'][0]['user'],
+                         {'id': self.user.pk, 'username': 'SPS-0000000001', 'email': 'student@example.com'})
+
+    def test_purge_expired_sessions_in_chunks(self):
+        past = timezone.now() - timedelta(minutes=1)
+        Session.objects.bulk_create([Session(session_key=f'expired{i:03d}', session_data='', expire_date=past)
+                                     for i in range(5)])
+        Session.objects.create(session_key='current', session_data='',
+                               expire_date=timezone.now() + timedelta(hours=1))
+        UserSession.objects.create(session_key='expired000', user=self.user, expire_date=past)
+
+        counts = SessionManager.purge_expired_sessions(chunk_size=2)
+        self.assertEqual(counts, {'sessions': 5, 'registry': 1, 'chunks': 4})
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
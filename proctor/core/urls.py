@@ -33,7 +33,9 @@ urlpatterns = [
     path('student/exam-review/<int:exam_id>/', views.exam_review, name='exam_review'),
     path('report-bug/', views.report_bug, name='report_bug'),
     path('schedule_exam/', views.schedule_exam, name='schedule_exam'),
+    path('dashboard/faculty/imports/<int:job_id>/status/', views.exam_import_status, name='exam_import_status'),
     path('delete_exam/<int:exam_id>/', views.delete_exam, name='delete_exam'),
+    path('resync_exam/<int:exam_id>/', views.resync_exam, name='resync_exam'),
     
     # Custom Admin URLs
     path('customadmin/login/', admin_views.admin_login, name='admin_login'),
@@ -41,6 +43,7 @@ urlpatterns = [
     path('customadmin/dashboard/', admin_views.admin_dashboard, name='admin_dashboard'),
     path('customadmin/users/', admin_views.admin_users, name='admin_users'),
     path('customadmin/users/import/', admin_views.admin_import_users, name='admin_import_users'),
+    path('customadmin/users/import/report/<str:token>/', admin_views.admin_import_users_report, name='admin_import_users_report'),
     path('customadmin/users/create/', admin_views.admin_user_create, name='admin_user_create'),
     path('customadmin/users/<int:user_id>/', admin_views.admin_user_detail, name='admin_user_detail'),
     path('customadmin/exams/', admin_views.admin_exams, name='admin_exams'),
@@ -49,6 +52,7 @@ urlpatterns = [
     path('customadmin/exams/<int:exam_id>/assignments/', admin_views.admin_exam_assignments, name='admin_exam_assignments'),
     path('customadmin/submissions/', admin_views.admin_submissions, name='admin_submissions'),
     path('customadmin/violations/', admin_views.admin_violations, name='admin_violations'),
+    path('customadmin/telemetry/<int:exam_id>/<int:student_id>/', admin_views.admin_telemetry_series, name='admin_telemetry_series'),
     path('customadmin/bugs/', admin_views.admin_bug_reports, name='admin_bug_reports'),
     path('customadmin/bugs/<int:bug_id>/', admin_views.admin_bug_detail, name='admin_bug_detail'),
     path('customadmin/settings/', admin_views.admin_system_settings, name='admin_system_settings'),
@@ -13,8 +13,8 @@ import warnings
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse, HttpResponseRedirect
 from django.urls import reverse
-from .models import Exam, Question, BugReport
-from .Modules.SheetManagerModule import get_questions_from_sheet
+from django.db.models import Q
+from .models import Exam, Question, BugReport, ExamImportJob
 
 def get_client_ip(request):
 	"""Get the client's IP address"""
@@ -214,13 +214,13 @@ def forget(request):
 					messages.error(request, f'Database error: {str(e)}')
 					return render(request, 'forget.html')
 				
-				# Send OTP email
+				# Queue the OTP email; the send_queued_emails worker delivers it
 				try:
 					from .Modules.send_email_using_sheets import SmartFaceProctorMailer
 					mailer = SmartFaceProctorMailer()
 					print("✓ Mailer created")  # Debug
 					
-					result = mailer.send_otp_email(email, otp)
+					result = mailer.queue_otp_email(email, otp)
 					print(f"✓ Email result: {result}")  # Debug
 				except Exception as e:
 					print(f"✗ Error in email sending: {e}")  # Debug
@@ -535,23 +535,27 @@ def schedule_exam(request):
 	exam_time = request.POST.get('examTime')
 	freeze_time = request.POST.get('freezeTime')
 	sheet_url = request.POST.get('sheetUrl')
+	# Set when the questions came from an uploaded file on the preview page
+	upload_hash = request.POST.get('uploadHash') or None
+	# Hash of the sheet rows shown on the preview page; the import worker checks it
+	sheet_hash = request.POST.get('sheetHash', '')
 	
-	# Validate exam data
-	from .Modules.ExamValidationModule import validate_exam_data
-	validation_result = validate_exam_data(title, exam_date, exam_time, freeze_time, sheet_url)
-	
-	if not validation_result['is_valid']:
-		# Return validation errors
-		error_message = "Validation failed:\n" + "\n".join(validation_result['errors'])
-		if validation_result['warnings']:
-			error_message += "\n\nWarnings:\n" + "\n".join(validation_result['warnings'])
-		messages.error(request, error_message)
+	# Validate the exam details here; the sheet itself is read by the import worker
+	from .Modules.ExamValidationModule import ExamValidator
+	from .Modules.ExamImportJobModule import enqueue_exam_import
+	from .Modules.QuestionFileModule import get_uploaded_bank
+	from .Modules.QuestionImportModule import import_exam_questions, QuestionImportError
+	validator = ExamValidator()
+	if not validator.validate_exam_details(title, exam_date, exam_time, freeze_time, None if upload_hash else sheet_url):
+		messages.error(request, "Validation failed:\n" + "\n".join(validator.errors))
 		return HttpResponseRedirect(reverse('schedule_exam_page'))
 	
-	# If there are warnings, show them but continue
-	if validation_result['warnings']:
-		warning_message = "Warnings:\n" + "\n".join(validation_result['warnings'])
-		messages.warning(request, warning_message)
+	uploaded_bank = None
+	if upload_hash:
+		uploaded_bank = get_uploaded_bank(request.user, upload_hash)
+		if uploaded_bank is None:
+			messages.error(request, 'The uploaded question file has expired, please upload it again.')
+			return HttpResponseRedirect(reverse('schedule_exam_page'))
 	
 	try:
 		# Combine date and time
@@ -564,38 +568,43 @@ def schedule_exam(request):
 			date = timezone.make_aware(naive_date, current_tz)
 		else:
 			date = naive_date
-		duration_minutes = int(freeze_time)
 		
-		# Create Exam
-		exam = Exam.objects.create(
-			title=title,
-			date=date,
-			duration_minutes=duration_minutes,
-			created_by=request.user,
-			sheet_url=sheet_url,
-			description=f"Warning Limit: {warning_limit}"
-		)
+		if uploaded_bank is not None:
+			# Uploaded files are already parsed, so import them right away
+			exam, question_count = import_exam_questions({
+				'title': title,
+				'date': date,
+				'duration_minutes': int(freeze_time),
+				'created_by': request.user,
+				'description': f"Warning Limit: {warning_limit}"
+			}, uploaded_bank.questions)
+			messages.success(request, f'Exam "{title}" scheduled successfully with {question_count} questions!')
+			return HttpResponseRedirect(reverse('faculty_exams'))
 		
-		# Extract and save questions
-		questions = get_questions_from_sheet(sheet_url)
-		for q in questions:
-			Question.objects.create(
-				exam=exam,
-				text=q.get('Questions', ''),
-				option_a=q.get('Option A', ''),
-				option_b=q.get('Option B', ''),
-				option_c=q.get('Option C', ''),
-				option_d=q.get('Option D', ''),
-				answer=q.get('Answer', '')
-			)
+		job = enqueue_exam_import(request.user, title, date, int(freeze_time), warning_limit, sheet_url,
+			sheet_hash)
 		
-		messages.success(request, f'Exam "{title}" scheduled successfully with {len(questions)} questions!')
+		messages.success(request, f'Exam "{title}" is being created (import job #{job.id}). Questions are imported in the background.')
 		return HttpResponseRedirect(reverse('faculty_exams'))
 		
+	except QuestionImportError as e:
+		messages.error(request, "Error scheduling exam:\n" + "\n".join(e.errors))
+		return HttpResponseRedirect(reverse('schedule_exam_page'))
 	except Exception as e:
 		messages.error(request, f'Error scheduling exam: {str(e)}')
 		return HttpResponseRedirect(reverse('schedule_exam_page'))
 
+@login_required
+def exam_import_status(request, job_id):
+	"""Lightweight progress endpoint polled by the faculty exams page"""
+	if request.user.role != 'Faculty':
+		return JsonResponse({'error': 'Unauthorized'}, status=403)
+	try:
+		job = ExamImportJob.objects.get(id=job_id, created_by=request.user)
+	except ExamImportJob.DoesNotExist:
+		return JsonResponse({'error': 'Import job not found'}, status=404)
+	return JsonResponse(job.to_status_dict())
+
 @login_required
 def schedule_exam_preview(request):
 	if request.method != 'POST':
@@ -609,18 +618,30 @@ def schedule_exam_preview(request):
 	exam_time = request.POST.get('examTime')
 	freeze_time = request.POST.get('freezeTime')
 	sheet_url = request.POST.get('sheetUrl')
-	# Validate and fetch questions
+	question_file = request.FILES.get('questionFile')
+	# Validate and fetch questions, or read them from the uploaded file
 	from .Modules.ExamValidationModule import validate_exam_data
-	validation_result = validate_exam_data(title, exam_date, exam_time, freeze_time, sheet_url)
+	from .Modules.QuestionFileModule import parse_question_file
+	uploaded_bank = None
+	if question_file:
+		try:
+			uploaded_bank = parse_question_file(question_file, request.user)
+		except ValueError as e:
+			messages.error(request, f'Error reading question file: {str(e)}')
+			return redirect('schedule_exam_page')
+		sheet_url = ''
+	validation_result = validate_exam_data(title, exam_date, exam_time, freeze_time, sheet_url,
+		question_bank=uploaded_bank)
 	if not validation_result['is_valid']:
 		error_message = "Validation failed:\n" + "\n".join(validation_result['errors'])
 		if validation_result['warnings']:
 			error_message += "\n\nWarnings:\n" + "\n".join(validation_result['warnings'])
 		messages.error(request, error_message)
 		return redirect('schedule_exam_page')
-	# Fetch questions for preview
+	# Preview the questions that were fetched during validation
 	try:
-		questions = get_questions_from_sheet(sheet_url)
+		question_bank = validation_result['question_bank']
+		questions = question_bank.questions
 		# Normalize keys for template-safe access
 		normalized_questions = []
 		for q in questions:
@@ -645,6 +666,9 @@ def schedule_exam_preview(request):
 			'exam_time': exam_time,
 			'duration': freeze_time,
 			'sheet_url': sheet_url,
+			'upload_name': question_file.name if question_file else '',
+			'upload_hash': uploaded_bank.content_hash if uploaded_bank else '',
+			'sheet_hash': '' if uploaded_bank else question_bank.content_hash,
 			'questions': normalized_questions,
 			'marks': marks,
 			'question_count': len(questions)
@@ -660,6 +684,34 @@ def delete_exam(request, exam_id):
 	messages.success(request, 'Exam deleted successfully!')
 	return HttpResponseRedirect(reverse('faculty_exams'))
 
+@login_required
+@require_POST
+def resync_exam(request, exam_id):
+	"""Re-read the exam's sheet and apply only the question rows that changed"""
+	exam = Exam.objects.get(id=exam_id)
+	if request.user != exam.created_by:
+		return JsonResponse({'error': 'Unauthorized'}, status=403)
+	if not exam.sheet_url:
+		messages.error(request, 'This exam was not created from a Google Sheet.')
+		return HttpResponseRedirect(reverse('faculty_exams'))
+	
+	from .Modules.SheetManagerModule import fetch_question_bank
+	from .Modules.QuestionImportModule import resync_exam_questions, QuestionImportError
+	try:
+		question_bank = fetch_question_bank(exam.sheet_url)
+		changes = resync_exam_questions(exam, question_bank.questions, content_hash=question_bank.content_hash)
+	except QuestionImportError as e:
+		messages.error(request, "Re-sync failed, no questions were changed:\n" + "\n".join(e.errors))
+		return HttpResponseRedirect(reverse('faculty_exams'))
+	except Exception as e:
+		messages.error(request, f'Error re-syncing exam: {str(e)}')
+		return HttpResponseRedirect(reverse('faculty_exams'))
+	
+	messages.success(request, f'Exam "{exam.title}" re-synced: {changes["updated"]} updated, '
+		f'{changes["inserted"]} added, {changes["deleted"]} removed, {changes["moved"]} moved, '
+		f'{changes["unchanged"]} unchanged.')
+	return HttpResponseRedirect(reverse('faculty_exams'))
+
 @login_required
 def student_dashboard(request):
 	user = request.user
@@ -691,9 +743,15 @@ def faculty_exams(request):
 	if user.role != 'Faculty':
 		return redirect('student_dashboard')
 	exams_created = Exam.objects.filter(created_by=user).order_by('-date')
+	# Imports still running, and failed ones from the last day so their errors can be read
+	import_jobs = ExamImportJob.objects.filter(created_by=user).filter(
+		Q(status__in=['queued', 'running']) |
+		Q(status='failed', finished_at__gte=timezone.now() - timezone.timedelta(days=1))
+	).order_by('-created_at')
 	return render(request, 'faculty_exams.html', {
 		'faculty': user,
-		'exams_created': exams_created
+		'exams_created': exams_created,
+		'import_jobs': import_jobs
 	})
 
 @login_required
@@ -855,7 +913,7 @@ def mcq_exam(request, exam_id):
 	
 	try:
 		exam = Exam.objects.get(id=exam_id)
-		questions = Question.objects.filter(exam=exam).order_by('id')
+		questions = Question.objects.filter(exam=exam).order_by('position', 'id')
 		
 		# Check exam status
 		current_time = timezone.now()
@@ -912,7 +970,7 @@ def start_mcq_exam(request, exam_id):
 	try:
 		import json
 		exam = Exam.objects.get(id=exam_id)
-		questions = Question.objects.filter(exam=exam).order_by('id')
+		questions = Question.objects.filter(exam=exam).order_by('position', 'id')
 		
 		# Final validation before starting exam
 		current_time = timezone.now()
@@ -51,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'core.session_middleware.SessionSecurityMiddleware',  # Enhanced session security (after auth)
     'core.session_middleware.ExamSessionMiddleware',  # Exam-specific session handling
+    'core.session_middleware.UserSessionRegistryMiddleware',  # Indexed session registry for monitoring
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.LoginRequiredMiddleware',  # Existing middleware
@@ -59,19 +60,20 @@ MIDDLEWARE = [
     'core.admin_middleware.AdminAuditMiddleware',  # Admin audit logging
     'core.admin_middleware.AdminIPWhitelistMiddleware',  # Admin IP whitelist
     'core.admin_middleware.AdminMaintenanceModeMiddleware',  # Admin maintenance mode
-    'core.session_middleware.SessionCleanupMiddleware',  # Session cleanup
 ]
 
 
 # Session Settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 1800  # 30 minutes in seconds
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False  # Sessions are saved when modified; see SESSION_ACTIVITY_GRANULARITY
+SESSION_ACTIVITY_GRANULARITY = 60  # Seconds between writes of last_activity to the session and registry
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_COOKIE_HTTPONLY = True  # Prevent XSS attacks
 SESSION_COOKIE_SAMESITE = 'Lax'  # CSRF protection
 SESSION_COOKIE_NAME = 'proctorsessionid'  # Custom session cookie name
+SESSION_MONITOR_CACHE_SECONDS = 10  # How long the admin session monitor reuses its snapshot
 
 # CSRF Settings
 CSRF_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -123,6 +125,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Kept in the database so every web and worker process shares it (admin rate
+# limits, the session monitor snapshot); the core migrations create the table.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'proctor_cache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -166,3 +181,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Login URL for @login_required decorator
 LOGIN_URL = 'login'
+
+# Proctoring telemetry (per-frame metrics written by the distraction detector)
+PROCTOR_TELEMETRY_ROOT = BASE_DIR / 'telemetry'
+
+# Outgoing email: SMTP messages per second per provider host ('default' for the rest)
+PROCTOR_SMTP_RATE_LIMITS = {'default': 10}
+
+# Seconds between checks whether cached credential files changed on disk
+PROCTOR_CONFIG_CHECK_INTERVAL = 5